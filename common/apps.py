@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class CommonConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "common"
+
+    def ready(self) -> None:
+        from common import instrumentation, metrics, profiling, slow_queries
+
+        instrumentation.install()
+        metrics.install()
+        profiling.install()
+        slow_queries.install()
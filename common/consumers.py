@@ -1,25 +1,125 @@
-import json
+import asyncio
+import collections
+import itertools
+import time
+import typing
 
 from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
+
+from common.metrics import WEBSOCKET_CONNECTIONS
+from common.protocol import WireCodec, choose_protocol
+
+REPLY = "reply"
 
 
 class CommonConsumer(AsyncWebsocketConsumer):
-    user_id: int | None
-    group_name: str | None
+    user_id: int | None = None
+    group_name: str | None = None
+    is_staff: bool = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.outbound: typing.OrderedDict[typing.Hashable, dict] = collections.OrderedDict()
+        self.outbound_keys = itertools.count()
+        self.outbound_task: asyncio.Task | None = None
+        self.outbound_allowance = float(settings.WEBSOCKET_OUTBOUND_BURST)
+        self.outbound_checked = time.monotonic()
+        self.codec = WireCodec()
+
+    async def accept(self, subprotocol: str | None = None, headers: list | None = None) -> None:
+        subprotocol = subprotocol or choose_protocol(self.scope.get("subprotocols", ()))
+        self.codec = WireCodec(subprotocol)
+        await super().accept(subprotocol, headers)
+
+    async def websocket_connect(self, message: dict) -> None:
+        WEBSOCKET_CONNECTIONS.labels(type(self).__name__).inc()
+        await super().websocket_connect(message)
+
+    async def websocket_disconnect(self, message: dict) -> None:
+        WEBSOCKET_CONNECTIONS.labels(type(self).__name__).dec()
+        if self.outbound_task:
+            self.outbound_task.cancel()
+        await super().websocket_disconnect(message)
 
     async def authenticate(self, token: str, user_id: int):
-        token = await database_sync_to_async(self.check_token)(token)
-        if token:
+        is_staff = await database_sync_to_async(self.check_token)(token)
+        if is_staff is not None:
+            self.is_staff = is_staff
             await self.create_group(user_id)
-            await self.send(text_data=json.dumps({"authenticated": True}))
+            await self.send_payload({"authenticated": True})
         else:
-            await self.send(text_data=json.dumps({"authenticated": False}))
+            await self.send_payload({"authenticated": False})
+
+    def check_token(self, token: str) -> bool | None:
+        """Returns whether the token owner is staff, None for unknown token."""
 
-    def check_token(self, token: str):
         from rest_framework.authtoken.models import Token
 
-        return Token.objects.filter(key=token).exists()  # noqa
+        return Token.objects.filter(key=token).values_list("user__is_staff", flat=True).first()  # noqa
 
     async def create_group(self, user_id: int):
         raise NotImplementedError()
+
+    async def send_payload(self, payload: dict) -> None:
+        """Queues a direct reply behind pending events, so no event sent earlier is overtaken by it."""
+
+        self.enqueue((REPLY, next(self.outbound_keys)), payload)
+
+    def decode_payload(self, text_data: str | None, bytes_data: bytes | None) -> dict | None:
+        return self.codec.decode(text_data, bytes_data)
+
+    async def send_event(self, payload: dict, coalesce_key: typing.Optional[str] = None) -> None:
+        """
+        Queues channel layer event for the client, so a slow client never blocks the consumer.
+        A pending event with the same `coalesce_key` is replaced in place. When the queue is full,
+        pending events are dropped in favor of a single resync hint per topic, replies are kept.
+
+        The server gives no backpressure signal (daphne hands frames to the transport at once), so
+        the queue is drained at `WEBSOCKET_OUTBOUND_RATE` frames per second with bursts up to
+        `WEBSOCKET_OUTBOUND_BURST`, and fills up when events arrive faster than that.
+        """
+
+        if coalesce_key not in self.outbound and len(self.outbound) >= settings.WEBSOCKET_OUTBOUND_QUEUE_SIZE:
+            pending = [*self.outbound.items(), (coalesce_key, payload)]
+            topics = dict.fromkeys(event.get("topic") for key, event in pending if not is_reply_key(key))
+            self.outbound = collections.OrderedDict((key, reply) for key, reply in pending if is_reply_key(key))
+            for topic in topics:
+                hint = {"type": "resync"} if topic is None else {"type": "resync", "topic": topic}
+                self.outbound[("resync", topic)] = hint
+            return
+
+        self.enqueue(coalesce_key or next(self.outbound_keys), payload)
+
+    def enqueue(self, key: typing.Hashable, payload: dict) -> None:
+        self.outbound[key] = payload
+        if not self.outbound_task:
+            self.outbound_task = asyncio.create_task(self.flush_outbound())
+
+    async def flush_outbound(self) -> None:
+        try:
+            while self.outbound:
+                await self.wait_outbound_allowance()
+                _, payload = self.outbound.popitem(last=False)
+                await self.send(**self.codec.encode(payload))
+        finally:
+            self.outbound_task = None
+
+    async def wait_outbound_allowance(self) -> None:
+        """Token bucket of the connection, events keep coalescing in the queue while it waits."""
+
+        now = time.monotonic()
+        self.outbound_allowance = min(
+            float(settings.WEBSOCKET_OUTBOUND_BURST),
+            self.outbound_allowance + (now - self.outbound_checked) * settings.WEBSOCKET_OUTBOUND_RATE,
+        )
+        self.outbound_checked = now
+        if self.outbound_allowance < 1:
+            await asyncio.sleep((1 - self.outbound_allowance) / settings.WEBSOCKET_OUTBOUND_RATE)
+            self.outbound_allowance, self.outbound_checked = 1.0, time.monotonic()
+        self.outbound_allowance -= 1
+
+
+def is_reply_key(key: typing.Hashable) -> bool:
+    return isinstance(key, tuple) and key[0] == REPLY
@@ -0,0 +1,182 @@
+import collections
+import contextlib
+import contextvars
+import functools
+import os
+import re
+import time
+import traceback
+import typing
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache
+from django.db import connections
+from rest_framework import serializers
+
+CACHE_MISS = object()
+IGNORED_CALLERS_FILES = {__file__, os.path.join(os.path.dirname(__file__), "slow_queries.py")}
+installed = False
+SQL_IN_PARAMS_PATTERN = re.compile(r"\((?:%s,\s*)+%s\)")
+
+current_metrics: contextvars.ContextVar[typing.Optional["RequestMetrics"]] = contextvars.ContextVar(
+    "current_metrics", default=None
+)
+
+
+class RequestMetrics:
+    """SQL, serializers and cache usage of one sampled request."""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.serializer_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.query_shapes: typing.Counter[str] = collections.Counter()
+        self.query_callers: typing.Dict[str, typing.Tuple[typing.Optional[str], str]] = {}
+        self.serializers: typing.List[str] = []
+
+    @property
+    def total_time(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    def record_query(self, sql: str, duration: float) -> None:
+        shape = SQL_IN_PARAMS_PATTERN.sub("(...)", sql)
+        self.queries += 1
+        self.sql_time += duration
+        self.query_shapes[shape] += 1
+        if shape not in self.query_callers:
+            self.query_callers[shape] = self.serializers[-1] if self.serializers else None, get_caller()
+
+    def get_repeated_queries(self, threshold: int) -> typing.List[typing.Dict[str, typing.Any]]:
+        return [
+            {
+                "sql": shape,
+                "count": count,
+                "serializer": self.query_callers[shape][0],
+                "caller": self.query_callers[shape][1],
+            }
+            for shape, count in self.query_shapes.most_common()
+            if count >= threshold
+        ]
+
+    def get_server_timing(self) -> str:
+        return ", ".join(
+            (
+                f'sql;dur={self.sql_time * 1000:.1f};desc="{self.queries} queries"',
+                f"serializer;dur={self.serializer_time * 1000:.1f}",
+                f'cache;desc="{self.cache_hits} hits, {self.cache_misses} misses"',
+                f"total;dur={self.total_time * 1000:.1f}",
+            )
+        )
+
+
+def get_caller() -> str:
+    """Returns the innermost project frame, skipping libraries and database execute wrappers."""
+
+    for frame in reversed(traceback.extract_stack()):
+        if (
+            frame.filename.startswith(str(settings.BASE_DIR))
+            and "site-packages" not in frame.filename
+            and frame.filename not in IGNORED_CALLERS_FILES
+        ):
+            return f"{frame.filename}:{frame.lineno} in {frame.name}"
+    return "unknown"
+
+
+@contextlib.contextmanager
+def collect_metrics() -> typing.Iterator[RequestMetrics]:
+    metrics = RequestMetrics()
+    token = current_metrics.set(metrics)
+
+    def execute_wrapper(
+        execute: typing.Callable, sql: str, params: typing.Optional[typing.Sequence], many: bool, context: dict
+    ) -> object:
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            metrics.record_query(sql, time.perf_counter() - start)
+
+    try:
+        with contextlib.ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(execute_wrapper))
+            yield metrics
+    finally:
+        current_metrics.reset(token)
+
+
+def instrument_serializer_data(data: property) -> property:
+    @functools.wraps(data.fget)
+    def wrapper(self: serializers.BaseSerializer) -> typing.Union[dict, list]:
+        metrics = current_metrics.get()
+        if metrics is None:
+            return data.fget(self)
+
+        serializer = type(self.child if isinstance(self, serializers.ListSerializer) else self).__name__
+        metrics.serializers.append(serializer)
+        start = time.perf_counter()
+        try:
+            return data.fget(self)
+        finally:
+            metrics.serializers.pop()
+            if not metrics.serializers:
+                metrics.serializer_time += time.perf_counter() - start
+
+    return property(wrapper)
+
+
+def instrument_cache_get(get: typing.Callable) -> typing.Callable:
+    @functools.wraps(get)
+    def wrapper(self: BaseCache, key: str, default: object = None, version: typing.Optional[int] = None) -> object:
+        value = get(self, key, CACHE_MISS, version)
+        if metrics := current_metrics.get():
+            if value is CACHE_MISS:
+                metrics.cache_misses += 1
+            else:
+                metrics.cache_hits += 1
+        return default if value is CACHE_MISS else value
+
+    return wrapper
+
+
+def instrument_cache_get_many(get_many: typing.Callable) -> typing.Callable:
+    @functools.wraps(get_many)
+    def wrapper(self: BaseCache, keys: typing.Iterable[str], version: typing.Optional[int] = None) -> dict:
+        metrics = current_metrics.get()
+        if metrics is None:
+            return get_many(self, keys, version)
+
+        keys = list(keys)
+        token = current_metrics.set(None)  # backends without native get_many call get() for every key
+        try:
+            values = get_many(self, keys, version)
+        finally:
+            current_metrics.reset(token)
+        if keys:  # one round trip, a hit only if every key was found
+            if len(values) == len(keys):
+                metrics.cache_hits += 1
+            else:
+                metrics.cache_misses += 1
+        return values
+
+    return wrapper
+
+
+def install() -> None:
+    """Instruments serializers and configured cache backends. Metrics are only collected inside `collect_metrics`."""
+
+    global installed
+    if installed:
+        return
+    installed = True
+
+    for serializer_class in serializers.Serializer, serializers.ListSerializer:
+        serializer_class.data = instrument_serializer_data(serializer_class.data)
+
+    for cache_class in {type(cache) for cache in caches.all()}:
+        cache_class.get = instrument_cache_get(cache_class.get)
+        cache_class.get_many = instrument_cache_get_many(cache_class.get_many)
@@ -0,0 +1,73 @@
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import connection, connections
+from django.utils import timezone
+
+from common.synthetic import PHASES, SyntheticConfig, generate_phase, get_ids_bases, reset_sequences
+
+DISTRIBUTION_OPTIONS = {
+    "followings": "Mean followings per user.",
+    "posts": "Mean posts per user.",
+    "images": "Mean images per post.",
+    "post_tags": "Mean tags per post.",
+    "likes": "Mean posts likes per user.",
+    "comments": "Mean comments per user.",
+    "saved": "Mean saved posts per user.",
+    "chats": "Mean chats started by user.",
+    "messages": "Mean messages per chat.",
+    "notifications": "Mean notifications per user.",
+    "read_ratio": "Share of read notifications.",
+    "popularity_exponent": "Zipf exponent of users, posts and tags popularity.",
+    "activity_exponent": "Pareto exponent of per user activity, lower is more skewed.",
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates users, follows, posts, images, tags, likes, comments, saved posts, chats, messages and "
+        "notifications for benchmarks. Uses COPY on PostgreSQL, where --processes splits users between processes."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        defaults = SyntheticConfig(users=0)
+        parser.add_argument("users", type=int, help="Users count.")
+        parser.add_argument("--seed", type=int, default=defaults.seed)
+        parser.add_argument("--processes", type=int, default=defaults.processes)
+        parser.add_argument("--batch-size", type=int, default=defaults.batch_size)
+        parser.add_argument("--tags", type=int, default=defaults.tags, help="Tags count.")
+        parser.add_argument("--days", type=int, default=defaults.days, help="Time span of generated content.")
+        parser.add_argument("--password", default=defaults.password, help="Password of every generated user.")
+        for name, help_ in DISTRIBUTION_OPTIONS.items():
+            parser.add_argument(f"--{name.replace('_', '-')}", type=float, default=getattr(defaults, name), help=help_)
+
+    def handle(self, *args, **options) -> None:
+        config = SyntheticConfig(
+            **{name: options[name] for name in SyntheticConfig._fields if name in options},
+            ids_bases=get_ids_bases(),
+            now=timezone.now(),
+        )
+        if config.processes > 1:
+            if connection.vendor != "postgresql":
+                raise CommandError("Several processes can only write to PostgreSQL.")
+            connections.close_all()  # forked processes must open their own connections
+
+        for phase in PHASES:
+            start = time.perf_counter()
+            if config.processes > 1:
+                with multiprocessing.get_context("fork").Pool(config.processes) as pool:
+                    results = pool.starmap(
+                        generate_phase, ((config, phase, worker) for worker in range(config.processes))
+                    )
+            else:
+                results = [generate_phase(config, phase, 0)]
+
+            counts = {name: sum(result[name] for result in results) for name in results[0]}
+            self.stdout.write(
+                f"{phase:<10} {time.perf_counter() - start:>8.1f}s  "
+                + ", ".join(f"{name}={count}" for name, count in counts.items())
+            )
+
+        reset_sequences()
+        self.stdout.write(self.style.SUCCESS(f"Generated data for {config.users} users with seed {config.seed}."))
@@ -0,0 +1,158 @@
+import atexit
+import functools
+import glob
+import os
+import time
+import typing
+from datetime import datetime
+
+from celery import Task, signals
+from channels.layers import BaseChannelLayer
+from django.conf import settings
+from django.utils.module_loading import import_string
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+from prometheus_client.registry import REGISTRY
+
+if typing.TYPE_CHECKING:
+    from common.consumers import CommonConsumer
+
+UNKNOWN_LABEL = "unknown"
+
+HTTP_REQUEST_DURATION = Histogram(
+    "exwonder_http_request_duration_seconds", "HTTP request latency by view.", ("view", "method", "status")
+)
+CELERY_TASK_DURATION = Histogram(
+    "exwonder_celery_task_duration_seconds", "Celery task runtime.", ("task", "queue", "state")
+)
+CELERY_TASK_QUEUE_WAIT = Histogram(
+    "exwonder_celery_task_queue_wait_seconds", "Time from task publishing to its start.", ("task", "queue")
+)
+WEBSOCKET_MESSAGE_DURATION = Histogram(
+    "exwonder_websocket_message_duration_seconds", "WebSocket message handler latency.", ("consumer", "type")
+)
+WEBSOCKET_CONNECTIONS = Gauge(
+    "exwonder_websocket_connections", "Active WebSocket connections.", ("consumer",), multiprocess_mode="livesum"
+)
+CHANNEL_LAYER_SEND_DURATION = Histogram(
+    "exwonder_channel_layer_send_duration_seconds", "Channel layer send latency.", ("method",)
+)
+
+SLOW_QUERIES = Counter("exwonder_slow_queries", "Queries slower than SLOW_QUERY_THRESHOLD.", ("origin",))
+
+PUBLISHED_AT_HEADER = "published_at"
+
+installed = False
+tasks_started: typing.Dict[str, float] = {}
+
+
+class ServicesCollector:
+    """
+    Merges multiprocess files of all services. The scripts give gunicorn, daphne and celery their own
+    `PROMETHEUS_MULTIPROC_DIR` under `METRICS_MULTIPROC_ROOT`, so each of them clears only its files on start.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def collect(self) -> typing.Iterable:
+        return multiprocess.MultiProcessCollector.merge(glob.glob(os.path.join(self.root, "*", "*.db")))
+
+
+def get_metrics() -> bytes:
+    """
+    Renders metrics in Prometheus text format, aggregated across processes in prometheus_client multiprocess mode.
+    """
+
+    if root := os.environ.get("METRICS_MULTIPROC_ROOT"):
+        registry = CollectorRegistry()
+        registry.register(ServicesCollector(root))
+    elif "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry)
+
+
+def mark_process_dead(**kwargs) -> None:
+    """Removes live gauges of an exiting daphne or celery process, gunicorn workers are marked by its master."""
+
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def observe_websocket_messages(consumer: str, types: typing.Collection[str]) -> typing.Callable:
+    """Measures handler latency by message type. Types out of `types` are labeled unknown."""
+
+    def decorator(handler: typing.Callable) -> typing.Callable:
+        @functools.wraps(handler)
+        async def wrapper(self: "CommonConsumer", data: dict) -> object:
+            type_ = data.get("type")
+            start = time.perf_counter()
+            try:
+                return await handler(self, data)
+            finally:
+                WEBSOCKET_MESSAGE_DURATION.labels(consumer, type_ if type_ in types else UNKNOWN_LABEL).observe(
+                    time.perf_counter() - start
+                )
+
+        return wrapper
+
+    return decorator
+
+
+def instrument_channel_layer_send(send: typing.Callable, method: str) -> typing.Callable:
+    @functools.wraps(send)
+    async def wrapper(self: BaseChannelLayer, *args, **kwargs) -> object:
+        start = time.perf_counter()
+        try:
+            return await send(self, *args, **kwargs)
+        finally:
+            CHANNEL_LAYER_SEND_DURATION.labels(method).observe(time.perf_counter() - start)
+
+    return wrapper
+
+
+def get_task_queue(task: Task) -> str:
+    return (task.request.delivery_info or {}).get("routing_key") or UNKNOWN_LABEL
+
+
+def add_published_at(headers: dict, **kwargs) -> None:
+    headers[PUBLISHED_AT_HEADER] = time.time()
+
+
+def observe_task_start(task_id: str, task: Task, **kwargs) -> None:
+    tasks_started[task_id] = time.perf_counter()
+    if published_at := task.request.get(PUBLISHED_AT_HEADER) or (task.request.headers or {}).get(PUBLISHED_AT_HEADER):
+        if eta := task.request.eta:  # delayed tasks wait in queue since their eta
+            published_at = max(published_at, datetime.fromisoformat(eta).timestamp())
+        CELERY_TASK_QUEUE_WAIT.labels(task.name, get_task_queue(task)).observe(max(time.time() - published_at, 0))
+
+
+def observe_task_end(task_id: str, task: Task, state: typing.Optional[str] = None, **kwargs) -> None:
+    if (started := tasks_started.pop(task_id, None)) is not None:
+        CELERY_TASK_DURATION.labels(task.name, get_task_queue(task), state or UNKNOWN_LABEL).observe(
+            time.perf_counter() - started
+        )
+
+
+def install() -> None:
+    """Instruments the configured channel layer and connects Celery signals."""
+
+    global installed
+    if installed:
+        return
+    installed = True
+
+    for alias in settings.CHANNEL_LAYERS:
+        layer_class = import_string(settings.CHANNEL_LAYERS[alias]["BACKEND"])
+        if not getattr(layer_class, "metrics_installed", False):
+            layer_class.send = instrument_channel_layer_send(layer_class.send, "send")
+            layer_class.group_send = instrument_channel_layer_send(layer_class.group_send, "group_send")
+            layer_class.metrics_installed = True
+
+    signals.before_task_publish.connect(add_published_at, weak=False)
+    signals.task_prerun.connect(observe_task_start, weak=False)
+    signals.task_postrun.connect(observe_task_end, weak=False)
+    signals.worker_process_shutdown.connect(mark_process_dead, weak=False)
+    atexit.register(mark_process_dead)
@@ -0,0 +1,123 @@
+import json
+import logging
+import random
+import time
+import typing
+
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse
+from django.urls import reverse
+
+from common.instrumentation import collect_metrics
+from common.metrics import HTTP_REQUEST_DURATION, UNKNOWN_LABEL
+from common.profiling import profile
+from common.slow_queries import query_origin
+
+logger = logging.getLogger(__name__)
+
+
+def is_staff_request(request: HttpRequest) -> bool:
+    from rest_framework.authtoken.models import Token
+
+    if request.user.is_authenticated:
+        return request.user.is_staff
+
+    keyword, _, key = request.headers.get("Authorization", "").partition(" ")
+    return keyword == "Token" and Token.objects.filter(key=key, user__is_staff=True).exists()  # noqa
+
+
+class InstrumentationMiddleware:
+    """
+    Measures SQL, serializers and cache usage of a sampled share of requests. Results are logged, repeated
+    query shapes are logged as N+1 suspects. Staff users and DEBUG also get them in the `Server-Timing` header.
+    """
+
+    def __init__(self, get_response: typing.Callable[[HttpRequest], HttpResponse]):
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if random.random() >= settings.INSTRUMENTATION_SAMPLE_RATE:
+            return self.get_response(request)
+
+        with collect_metrics() as metrics:
+            response = self.get_response(request)
+
+        match = request.resolver_match
+        view = match.view_name if match else None
+        if settings.DEBUG or is_staff_request(request):
+            response["Server-Timing"] = metrics.get_server_timing()
+        logger.info(
+            json.dumps(
+                {
+                    "event": "request",
+                    "method": request.method,
+                    "path": request.path,
+                    "view": view,
+                    "status": response.status_code,
+                    "queries": metrics.queries,
+                    "sql_ms": round(metrics.sql_time * 1000, 1),
+                    "serializer_ms": round(metrics.serializer_time * 1000, 1),
+                    "cache_hits": metrics.cache_hits,
+                    "cache_misses": metrics.cache_misses,
+                    "total_ms": round(metrics.total_time * 1000, 1),
+                }
+            )
+        )
+        for query in metrics.get_repeated_queries(settings.INSTRUMENTATION_N_PLUS_ONE_THRESHOLD):
+            logger.warning(json.dumps({"event": "n_plus_one", "view": view, **query}))
+        return response
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response: typing.Callable[[HttpRequest], HttpResponse]):
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        start = time.perf_counter()
+        response = self.get_response(request)
+
+        match = request.resolver_match
+        HTTP_REQUEST_DURATION.labels(
+            match.view_name if match else UNKNOWN_LABEL, request.method, response.status_code
+        ).observe(time.perf_counter() - start)
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Profiles requests of staff users sent with `PROFILING_HEADER`. The profile link is returned in the same header.
+    """
+
+    def __init__(self, get_response: typing.Callable[[HttpRequest], HttpResponse]):
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if settings.PROFILING_HEADER not in request.headers or not is_staff_request(request):
+            return self.get_response(request)
+
+        with profile(f"http-{request.method}-{request.path}") as result:
+            response = self.get_response(request)
+
+        response[settings.PROFILING_HEADER] = request.build_absolute_uri(
+            reverse("profile", kwargs={"filename": result["filename"]})
+        )
+        return response
+
+
+class QueryOriginMiddleware:
+    """Marks queries of the request with its view for the slow queries log."""
+
+    def __init__(self, get_response: typing.Callable[[HttpRequest], HttpResponse]):
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        token = query_origin.set(None)
+        try:
+            return self.get_response(request)
+        finally:
+            query_origin.reset(token)
+
+    def process_view(
+        self, request: HttpRequest, view_func: typing.Callable, view_args: tuple, view_kwargs: dict
+    ) -> None:
+        query_origin.set(request.resolver_match.view_name)
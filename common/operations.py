@@ -0,0 +1,103 @@
+import typing
+
+from django.db import NotSupportedError
+from django.db.backends.base.schema import BaseDatabaseSchemaEditor
+from django.db.migrations.operations.base import Operation
+from django.db.migrations.operations.models import AddConstraint
+from django.db.migrations.state import ProjectState
+
+
+class DeleteDuplicates(Operation):
+    """Deletes rows repeating the values of `fields`, the earliest added row of each group is kept."""
+
+    reversible = True
+    reduces_to_sql = True
+
+    def __init__(self, model_name: str, fields: typing.Sequence[str]):
+        self.model_name = model_name
+        self.fields = tuple(fields)
+
+    def deconstruct(self) -> typing.Tuple[str, list, dict]:
+        return self.__class__.__name__, [], {"model_name": self.model_name, "fields": self.fields}
+
+    def state_forwards(self, app_label: str, state: ProjectState) -> None:
+        pass
+
+    def database_forwards(
+        self,
+        app_label: str,
+        schema_editor: BaseDatabaseSchemaEditor,
+        from_state: ProjectState,
+        to_state: ProjectState,
+    ) -> None:
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+
+        quote = schema_editor.quote_name
+        table, pk = quote(model._meta.db_table), quote(model._meta.pk.column)  # noqa
+        columns = ", ".join(quote(model._meta.get_field(field).column) for field in self.fields)  # noqa
+        schema_editor.execute(
+            f"DELETE FROM {table} WHERE {pk} NOT IN (SELECT MIN({pk}) FROM {table} GROUP BY {columns})"
+        )
+
+    def database_backwards(
+        self,
+        app_label: str,
+        schema_editor: BaseDatabaseSchemaEditor,
+        from_state: ProjectState,
+        to_state: ProjectState,
+    ) -> None:
+        pass
+
+    def describe(self) -> str:
+        return f"Delete duplicates of {', '.join(self.fields)} on {self.model_name}"
+
+    @property
+    def migration_name_fragment(self) -> str:
+        return f"delete_{self.model_name.lower()}_duplicates"
+
+
+class AddUniqueConstraintConcurrently(AddConstraint):
+    """
+    On PostgreSQL builds the index of a unique constraint with `CREATE UNIQUE INDEX CONCURRENTLY`, which does not
+    block writes to the table, and then attaches the index as the constraint. A partial index can not back a table
+    constraint, so a constraint with a condition is left as the unique index, the way Django creates it. The
+    migration must set `atomic = False`. Other databases add the constraint as usual.
+    """
+
+    atomic = False
+
+    def database_forwards(
+        self,
+        app_label: str,
+        schema_editor: BaseDatabaseSchemaEditor,
+        from_state: ProjectState,
+        to_state: ProjectState,
+    ) -> None:
+        if schema_editor.connection.vendor != "postgresql":
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        if schema_editor.connection.in_atomic_block:
+            raise NotSupportedError(
+                "The AddUniqueConstraintConcurrently operation cannot be executed inside a transaction "
+                "(set atomic = False on the migration)."
+            )
+
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+
+        quote = schema_editor.quote_name
+        table, name = quote(model._meta.db_table), quote(self.constraint.name)  # noqa
+        columns = ", ".join(quote(model._meta.get_field(field).column) for field in self.constraint.fields)  # noqa
+        condition = self.constraint._get_condition_sql(model, schema_editor)  # noqa
+        # An interrupted concurrent build leaves an invalid index with the same name behind.
+        schema_editor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+        if condition:
+            schema_editor.execute(f"CREATE UNIQUE INDEX CONCURRENTLY {name} ON {table} ({columns}) WHERE {condition}")
+            return
+        schema_editor.execute(f"CREATE UNIQUE INDEX CONCURRENTLY {name} ON {table} ({columns})")
+        schema_editor.execute(f"ALTER TABLE {table} ADD CONSTRAINT {name} UNIQUE USING INDEX {name}")
+
+    def describe(self) -> str:
+        return f"Concurrently create unique constraint {self.constraint.name} on model {self.model_name}"
@@ -0,0 +1,157 @@
+import collections
+import contextlib
+import contextvars
+import functools
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import typing
+import uuid
+
+from celery import Task, signals
+from django.conf import settings
+from django.urls import reverse
+
+if typing.TYPE_CHECKING:
+    from common.consumers import CommonConsumer
+
+logger = logging.getLogger(__name__)
+
+PROFILE_TASK_HEADER = "profile"
+PROFILE_NAME_PATTERN = re.compile(r"[^\w.-]+")
+
+profiling_requested: contextvars.ContextVar[bool] = contextvars.ContextVar("profiling_requested", default=False)
+
+installed = False
+tasks_samplers: typing.Dict[str, typing.Tuple["StackSampler", contextvars.Token]] = {}
+
+
+class StackSampler:
+    """
+    Sampling profiler. A background thread records stacks of the profiled threads every
+    `PROFILING_SAMPLE_INTERVAL` and the result is saved in the collapsed stacks format of flamegraph.pl,
+    which speedscope and most flame graph viewers open as well.
+    """
+
+    def __init__(self, thread_ids: typing.Optional[typing.Collection[int]] = None):
+        self.thread_ids = thread_ids
+        self.stacks: typing.Counter[str] = collections.Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="stack-sampler", daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self) -> None:
+        while not self.stopped.wait(settings.PROFILING_SAMPLE_INTERVAL):
+            threads_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():  # noqa
+                if thread_id == self.thread.ident or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                    continue
+
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(threads_names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def save(self, name: str) -> str:
+        """Saves collapsed stacks to `PROFILING_DIR`. Returns the file name."""
+
+        os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+        filename = (
+            f"{time.strftime('%Y%m%d-%H%M%S')}-{PROFILE_NAME_PATTERN.sub('_', name)}-{uuid.uuid4().hex[:8]}.folded"
+        )
+        with open(os.path.join(settings.PROFILING_DIR, filename), "w") as file:
+            file.writelines(f"{stack} {count}\n" for stack, count in self.stacks.items())
+        return filename
+
+
+@contextlib.contextmanager
+def profile(name: str, all_threads: bool = False) -> typing.Iterator[typing.Dict[str, str]]:
+    """
+    Samples the current thread, or every thread for event loop code which runs sync parts in executors.
+    Yields a dict which gets `filename` of the saved profile on exit.
+    """
+
+    result = {}
+    sampler = StackSampler(None if all_threads else (threading.get_ident(),))
+    token = profiling_requested.set(True)
+    sampler.start()
+    try:
+        yield result
+    finally:
+        sampler.stop()
+        profiling_requested.reset(token)
+        result["filename"] = sampler.save(name)
+
+
+def get_profile_path(filename: str) -> typing.Optional[str]:
+    if PROFILE_NAME_PATTERN.search(filename) or filename.startswith("."):
+        return None
+
+    path = os.path.join(settings.PROFILING_DIR, filename)
+    return path if os.path.isfile(path) else None
+
+
+def profile_websocket_messages(consumer: str) -> typing.Callable:
+    """Profiles a message handler when a staff user sends the message with `"profile": true`."""
+
+    def decorator(handler: typing.Callable) -> typing.Callable:
+        @functools.wraps(handler)
+        async def wrapper(self: "CommonConsumer", data: dict) -> object:
+            if not (data.pop("profile", False) and self.is_staff):
+                return await handler(self, data)
+
+            type_ = data.get("type")
+            with profile(f"ws-{consumer}-{type_}", all_threads=True) as result:
+                response = await handler(self, data)
+            url = reverse("profile", kwargs={"filename": result["filename"]})
+            await self.send_payload({"type": "profile", "message_type": type_, "url": url})
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def add_profile_header(headers: dict, **kwargs) -> None:
+    """Tasks published by a profiled request, task or message handler are profiled as well."""
+
+    if profiling_requested.get():
+        headers[PROFILE_TASK_HEADER] = True
+
+
+def start_task_profiling(task_id: str, task: Task, **kwargs) -> None:
+    if task.request.get(PROFILE_TASK_HEADER) or (task.request.headers or {}).get(PROFILE_TASK_HEADER):
+        sampler = StackSampler((threading.get_ident(),))
+        tasks_samplers[task_id] = sampler, profiling_requested.set(True)
+        sampler.start()
+
+
+def stop_task_profiling(task_id: str, task: Task, **kwargs) -> None:
+    if profiling := tasks_samplers.pop(task_id, None):
+        sampler, token = profiling
+        sampler.stop()
+        profiling_requested.reset(token)
+        logger.info("Task %s[%s] profile saved to %s", task.name, task_id, sampler.save(f"task-{task.name}"))
+
+
+def install() -> None:
+    global installed
+    if installed:
+        return
+    installed = True
+
+    signals.before_task_publish.connect(add_profile_header, weak=False)
+    signals.task_prerun.connect(start_task_profiling, weak=False)
+    signals.task_postrun.connect(stop_task_profiling, weak=False)
@@ -0,0 +1,59 @@
+import json
+import typing
+import zlib
+
+import msgpack
+
+JSON_PROTOCOL = "exwonder.json"
+MSGPACK_PROTOCOL = "exwonder.msgpack"
+MSGPACK_DEFLATE_PROTOCOL = "exwonder.msgpack.deflate"
+
+PROTOCOLS = MSGPACK_DEFLATE_PROTOCOL, MSGPACK_PROTOCOL, JSON_PROTOCOL
+
+DEFLATE_WBITS = -zlib.MAX_WBITS  # raw deflate stream, as in permessage-deflate
+DEFLATE_TAIL = b"\x00\x00\xff\xff"
+
+
+def choose_protocol(offered: typing.Iterable[str]) -> typing.Optional[str]:
+    offered = set(offered)
+    return next((protocol for protocol in PROTOCOLS if protocol in offered), None)
+
+
+class WireCodec:
+    """
+    Encodes WebSocket frames for the negotiated subprotocol. Without a subprotocol, frames are JSON text.
+
+    Deflate frames follow permessage-deflate with context takeover: every message is flushed with
+    Z_SYNC_FLUSH into one per-connection stream and the trailing 00 00 ff ff is stripped.
+    """
+
+    def __init__(self, protocol: typing.Optional[str] = None):
+        self.protocol = protocol or JSON_PROTOCOL
+        self.compressor = zlib.compressobj(wbits=DEFLATE_WBITS)
+        self.decompressor = zlib.decompressobj(wbits=DEFLATE_WBITS)
+
+    @property
+    def is_binary(self) -> bool:
+        return self.protocol != JSON_PROTOCOL
+
+    def encode(self, payload: dict) -> typing.Dict[str, typing.Union[str, bytes]]:
+        if not self.is_binary:
+            return {"text_data": json.dumps(payload)}
+
+        frame = msgpack.packb(payload, use_bin_type=True)
+        if self.protocol == MSGPACK_DEFLATE_PROTOCOL:
+            frame = self.compressor.compress(frame) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+            frame = frame[: -len(DEFLATE_TAIL)]
+        return {"bytes_data": frame}
+
+    def decode(self, text_data: typing.Optional[str], bytes_data: typing.Optional[bytes]) -> typing.Optional[dict]:
+        """Decodes client frame. Returns None for raw binary frames of the JSON protocol."""
+
+        if text_data is not None:
+            return json.loads(text_data)
+        if not self.is_binary:
+            return None
+
+        if self.protocol == MSGPACK_DEFLATE_PROTOCOL:
+            bytes_data = self.decompressor.decompress(bytes_data + DEFLATE_TAIL)
+        return msgpack.unpackb(bytes_data, raw=False, strict_map_key=False)
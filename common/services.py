@@ -1,9 +1,15 @@
+import base64
+import binascii
 import typing
 from datetime import datetime
 
 import pytz
+from django.db import models
+from django.db.models.constants import OnConflict
 from django.utils.timesince import timesince
 
+CURSOR_SEP = "|"
+
 
 def datetime_to_timezone(
     dt: datetime, timezone: str, attribute_name: typing.Optional[str] = "time_added", to_timesince: bool = True
@@ -11,3 +17,45 @@ def datetime_to_timezone(
     dt = pytz.timezone(timezone).localize(datetime(dt.year, dt.month, dt.day, dt.hour, dt.minute, dt.second))
     time = timesince(dt + dt.utcoffset()) if to_timesince else (dt + dt.utcoffset()).strftime("%H:%M %d.%m.%Y")
     return {attribute_name: time, "timezone": timezone}
+
+
+def get_page_size(requested: typing.Union[int, str, None], default: int, maximum: int) -> int:
+    try:
+        return max(1, min(int(requested), maximum))
+    except (TypeError, ValueError):
+        return default
+
+
+def encode_cursor(dt: datetime, pk: int) -> str:
+    return base64.urlsafe_b64encode(f"{dt.isoformat()}{CURSOR_SEP}{pk}".encode()).decode()
+
+
+def decode_cursor(cursor: typing.Optional[str]) -> typing.Optional[typing.Tuple[datetime, int]]:
+    if not cursor:
+        return None
+
+    try:
+        dt, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split(CURSOR_SEP)
+        return datetime.fromisoformat(dt), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def create_or_get(instance: models.Model, unique_fields: typing.Sequence[str]) -> models.Model:
+    """
+    Saves a new instance with `INSERT ... ON CONFLICT DO NOTHING RETURNING id`, so a repeated write neither locks
+    nor rewrites the existing row. Nothing is returned on a conflict, only then the stored row is fetched.
+    """
+
+    model = type(instance)
+    meta = model._meta  # noqa
+    fields = [field for field in meta.local_concrete_fields if field is not meta.auto_field]
+    (returned,) = model._default_manager._insert(  # noqa
+        [instance], fields=fields, returning_fields=[meta.pk], on_conflict=OnConflict.IGNORE
+    )
+    if returned is None:
+        return model._default_manager.get(**{field: getattr(instance, field) for field in unique_fields})  # noqa
+
+    instance.pk = returned[0]
+    instance._state.adding, instance._state.db = False, model._default_manager.db  # noqa
+    return instance
@@ -0,0 +1,241 @@
+import collections
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import traceback
+import typing
+from logging.handlers import RotatingFileHandler
+
+from celery import Task, signals
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.backends.signals import connection_created
+from django.utils import timezone
+
+from common.instrumentation import SQL_IN_PARAMS_PATTERN
+from common.metrics import SLOW_QUERIES, UNKNOWN_LABEL
+
+TAIL_BLOCK_SIZE = 64 * 1024
+SQL_LOCKING_PATTERN = re.compile(r"\bFOR\s+(NO\s+KEY\s+UPDATE|UPDATE|KEY\s+SHARE|SHARE)\b", re.IGNORECASE)
+
+query_origin: contextvars.ContextVar[typing.Optional[str]] = contextvars.ContextVar("query_origin", default=None)
+explaining: contextvars.ContextVar[bool] = contextvars.ContextVar("explaining", default=False)
+
+installed = False
+log_handler: typing.Optional[RotatingFileHandler] = None
+log_handler_lock = threading.Lock()
+tasks_origins_tokens: typing.Dict[str, contextvars.Token] = {}
+
+
+def get_logs() -> typing.Dict[int, typing.List[str]]:
+    """Returns log files by process id, the current file first, then rotated copies from the latest."""
+
+    directory, name = os.path.split(os.path.abspath(settings.SLOW_QUERIES_LOG_FILE))
+    if not os.path.isdir(directory):
+        return {}
+
+    pattern = re.compile(rf"{re.escape(name)}\.(\d+)(?:\.(\d+))?")
+    logs = collections.defaultdict(list)
+    for entry in os.scandir(directory):
+        if match := pattern.fullmatch(entry.name):
+            logs[int(match[1])].append((int(match[2] or 0), entry.path))
+    return {pid: [path for _, path in sorted(paths)] for pid, paths in logs.items()}
+
+
+def is_process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # process of another user
+        return True
+    return True
+
+
+def remove_dead_processes_logs() -> None:
+    for pid, paths in get_logs().items():
+        if not is_process_alive(pid):
+            for path in paths:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(path)
+
+
+def get_log_handler() -> RotatingFileHandler:
+    """
+    Every gunicorn, daphne and celery process writes its own log rotated by size, so processes never rotate
+    a file another one appends to. A forked process gets a new log, logs of dead processes are removed then.
+    """
+
+    global log_handler
+    path = os.path.abspath(f"{settings.SLOW_QUERIES_LOG_FILE}.{os.getpid()}")
+    with log_handler_lock:
+        if log_handler is None or log_handler.baseFilename != path:
+            if log_handler is not None:
+                log_handler.close()
+            remove_dead_processes_logs()
+            log_handler = RotatingFileHandler(
+                path,
+                maxBytes=settings.SLOW_QUERIES_LOG_MAX_BYTES,
+                backupCount=settings.SLOW_QUERIES_LOG_BACKUP_COUNT,
+                delay=True,
+            )
+        return log_handler
+
+
+def is_explainable(sql: str) -> bool:
+    """EXPLAIN ANALYZE executes the query again, so only plain reads are explained."""
+
+    return sql.lstrip()[:6].upper() == "SELECT" and not SQL_LOCKING_PATTERN.search(sql)
+
+
+def explain(
+    connection: BaseDatabaseWrapper, sql: str, params: typing.Optional[typing.Sequence]
+) -> typing.Optional[str]:
+    """
+    Explains the query in a savepoint which is always rolled back, so a failed EXPLAIN does not abort
+    the transaction of the request.
+    """
+
+    options = {"analyze": True, "buffers": True} if connection.vendor == "postgresql" else {}
+    token = explaining.set(True)
+    try:
+        with transaction.atomic(using=connection.alias, savepoint=True):
+            with connection.cursor() as cursor:
+                cursor.execute(f"{connection.ops.explain_query_prefix(**options)} {sql}", params)
+                plan = "\n".join(" ".join(str(column) for column in row) for row in cursor.fetchall())
+            transaction.set_rollback(True, using=connection.alias)
+        return plan
+    except Exception as error:  # noqa
+        return f"EXPLAIN failed: {error}"
+    finally:
+        explaining.reset(token)
+
+
+def record_slow_queries(
+    execute: typing.Callable, sql: str, params: typing.Optional[typing.Sequence], many: bool, context: dict
+) -> object:
+    """Database execute wrapper which logs queries slower than `SLOW_QUERY_THRESHOLD` seconds."""
+
+    if explaining.get():
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration = time.perf_counter() - start
+    if duration < settings.SLOW_QUERY_THRESHOLD:
+        return result
+
+    origin = query_origin.get() or UNKNOWN_LABEL
+    SLOW_QUERIES.labels(origin).inc()
+
+    plan = None
+    if not many and is_explainable(sql) and random.random() < settings.SLOW_QUERY_EXPLAIN_SAMPLE_RATE:
+        plan = explain(context["connection"], sql, params)
+
+    record = {
+        "time": timezone.now().isoformat(),
+        "duration": round(duration, 4),
+        "origin": origin,
+        "sql": sql,
+        "params": None if many else [repr(param) for param in params or ()],
+        "stack": [
+            f"{frame.filename}:{frame.lineno} in {frame.name}"
+            for frame in traceback.extract_stack()[:-1]
+            if frame.filename.startswith(str(settings.BASE_DIR)) and "site-packages" not in frame.filename
+        ],
+        "plan": plan,
+    }
+    get_log_handler().handle(logging.makeLogRecord({"msg": json.dumps(record), "levelno": logging.WARNING}))
+    return result
+
+
+def read_last_lines(path: str, limit: int) -> typing.List[str]:
+    """Reads the file backwards by blocks until `limit` whole lines are found."""
+
+    blocks, lines = [], 0
+    with open(path, "rb") as file:
+        position = file.seek(0, os.SEEK_END)
+        while position and lines <= limit:
+            size = min(TAIL_BLOCK_SIZE, position)
+            position -= size
+            file.seek(position)
+            blocks.append(file.read(size))
+            lines += blocks[-1].count(b"\n")
+    return b"".join(reversed(blocks)).decode(errors="replace").splitlines()[-limit:]
+
+
+def get_slow_queries(limit: int) -> typing.List[dict]:
+    """Returns the latest slow queries of all processes logs, newest first. Only the tails of the logs are read."""
+
+    queries = []
+    for paths in get_logs().values():
+        remaining = limit
+        for path in paths:
+            try:
+                lines = read_last_lines(path, remaining)
+            except FileNotFoundError:  # rotated or removed meanwhile
+                continue
+            for line in lines:
+                try:
+                    queries.append(json.loads(line))
+                except ValueError:
+                    continue
+            remaining -= len(lines)
+            if remaining <= 0:
+                break
+    return sorted(queries, key=lambda query: query["time"], reverse=True)[:limit]
+
+
+def group_slow_queries(queries: typing.Iterable[dict]) -> typing.List[dict]:
+    """Groups queries by shape, slowest groups first. Every group keeps its latest explained plan."""
+
+    groups = {}
+    for query in queries:
+        shape = SQL_IN_PARAMS_PATTERN.sub("(...)", query["sql"])
+        group = groups.setdefault(
+            shape, {"sql": shape, "origins": set(), "count": 0, "total": 0.0, "max": 0.0, "last": query, "plan": None}
+        )
+        group["origins"].add(query["origin"])
+        group["count"] += 1
+        group["total"] += query["duration"]
+        group["max"] = max(group["max"], query["duration"])
+        group["plan"] = group["plan"] or query["plan"]
+
+    for group in groups.values():
+        group["mean"] = group["total"] / group["count"]
+    return sorted(groups.values(), key=lambda group: group["total"], reverse=True)
+
+
+def add_execute_wrapper(connection: BaseDatabaseWrapper, **kwargs) -> None:
+    # first in the list, execute_wrapper() blocks entered before the connection was opened pop the last one on exit
+    if record_slow_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_slow_queries)
+
+
+def set_task_origin(task_id: str, task: Task, **kwargs) -> None:
+    tasks_origins_tokens[task_id] = query_origin.set(f"task:{task.name}")
+
+
+def reset_task_origin(task_id: str, **kwargs) -> None:
+    if token := tasks_origins_tokens.pop(task_id, None):
+        query_origin.reset(token)
+
+
+def install() -> None:
+    """Wraps every database connection of the process and tracks Celery tasks as queries origin."""
+
+    global installed
+    if installed:
+        return
+    installed = True
+
+    connection_created.connect(add_execute_wrapper, weak=False)
+    signals.task_prerun.connect(set_task_origin, weak=False)
+    signals.task_postrun.connect(reset_task_origin, weak=False)
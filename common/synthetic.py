@@ -0,0 +1,434 @@
+"""
+Synthetic data at production scale for benchmarks.
+
+Users are ranked by popularity: followings, likes, chats companions and posts tags are picked with Zipf
+weights, while per user activity (posts, likes, comments...) follows a Pareto distribution. Every value is
+derived from the seed and the user index only, so the same seed gives the same data with any number of
+processes. Rows are written with PostgreSQL COPY or, on other databases, batched bulk_create.
+"""
+
+import bisect
+import io
+import itertools
+import random
+import typing
+from array import array
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, models, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+User = get_user_model()
+
+PHASES = "users", "content", "activity"
+PLACEHOLDER_IMAGES_COUNT = 8
+USERNAME_PREFIX = "syn"
+WORDS = (
+    "photo sunset morning coffee city street friends summer winter travel mountains sea walk weekend light night "
+    "rain garden books music dinner family road sky clouds forest river bridge market home"
+).split()
+
+
+class SyntheticConfig(typing.NamedTuple):
+    users: int
+    seed: int = 0
+    followings: float = 50
+    posts: float = 10
+    images: float = 1.5
+    tags: int = 1000
+    post_tags: float = 2
+    likes: float = 100
+    comments: float = 10
+    saved: float = 5
+    chats: float = 5
+    messages: float = 20
+    notifications: float = 20
+    read_ratio: float = 0.8
+    popularity_exponent: float = 1.1
+    activity_exponent: float = 2.0
+    days: int = 365
+    password: str = "password"
+    batch_size: int = 5000
+    processes: int = 1
+    ids_bases: typing.Dict[str, int] = {}
+    now: typing.Optional[datetime] = None
+
+
+class RowsWriter:
+    """Buffers rows of one model and writes them with COPY on PostgreSQL or bulk_create elsewhere."""
+
+    def __init__(self, model: typing.Type[models.Model], fields: typing.Sequence[str], batch_size: int):
+        self.model = model
+        self.fields = [model._meta.get_field(name) for name in fields]  # noqa
+        self.defaults = [
+            (field, get_field_default(field))
+            for field in model._meta.concrete_fields  # noqa
+            if field not in self.fields and not field.primary_key
+        ]
+        self.batch_size = batch_size
+        self.rows = []
+        self.count = 0
+
+    def add(self, *values: object) -> None:
+        self.rows.append(values)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.rows:
+            return
+
+        if connection.vendor == "postgresql":
+            self.copy()
+        else:
+            names = [field.attname for field in self.fields]
+            self.model.objects.bulk_create(  # noqa
+                (self.model(**dict(zip(names, row))) for row in self.rows), batch_size=self.batch_size
+            )
+        self.count += len(self.rows)
+        self.rows = []
+
+    def copy(self) -> None:
+        fields = self.fields + [field for field, _ in self.defaults]
+        defaults = [default for _, default in self.defaults]
+        buffer = io.StringIO()
+        for row in self.rows:
+            values = (field.get_db_prep_save(value, connection) for field, value in zip(fields, (*row, *defaults)))
+            buffer.write("\t".join(map(format_copy_value, values)) + "\n")
+        buffer.seek(0)
+
+        table = connection.ops.quote_name(self.model._meta.db_table)  # noqa
+        columns = ", ".join(connection.ops.quote_name(field.column) for field in fields)
+        with connection.cursor() as cursor:
+            cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN", buffer)
+
+    def __enter__(self) -> "RowsWriter":
+        return self
+
+    def __exit__(self, exc_type: typing.Optional[type], *args) -> None:
+        if exc_type is None:
+            self.flush()
+
+
+def get_field_default(field: models.Field) -> object:
+    if getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False):
+        return timezone.now()
+    return field.get_default()
+
+
+def format_copy_value(value: object) -> str:
+    """Formats a value for COPY text format: NULL is \\N, backslashes and control characters are escaped."""
+
+    if value is None:
+        return r"\N"
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def draw_counts(config: SyntheticConfig, kind: str, size: int, mean: float) -> array:
+    """Pareto distributed counts with the given mean, one per user (or chat)."""
+
+    rng = random.Random(f"{config.seed}:{kind}")
+    exponent = config.activity_exponent
+    scale = mean * (exponent - 1) / exponent
+    return array("q", (int(rng.paretovariate(exponent) * scale + 0.5) for _ in range(size)))
+
+
+def get_offsets(counts: typing.Iterable[int]) -> array:
+    return array("q", itertools.accumulate(counts, initial=0))
+
+
+class SyntheticPlan:
+    """Counts and ids of all generated rows. Cheap to build, so every worker process builds its own."""
+
+    def __init__(self, config: SyntheticConfig):
+        self.config = config
+        self.now = config.now or timezone.now()
+        self.start = self.now - timedelta(days=config.days)
+        self.password = make_password(config.password, salt=f"synthetic{config.seed}")
+
+        users = config.users
+        self.popularity = list(
+            itertools.accumulate(1 / rank**config.popularity_exponent for rank in range(1, users + 1))
+        )
+        self.tags_popularity = list(
+            itertools.accumulate(1 / rank**config.popularity_exponent for rank in range(1, config.tags + 1))
+        )
+        self.posts_counts = draw_counts(config, "posts", users, config.posts)
+        self.posts_offsets = get_offsets(self.posts_counts)
+        self.total_posts = self.posts_offsets[-1]
+
+        # distinct picks are capped, so Zipf sampling without repeats stays fast
+        caps = {
+            "followings": (users - 1) // 2,
+            "likes": self.total_posts // 10,
+            "comments": None,
+            "saved": self.total_posts // 10,
+            "chats": None,
+            "notifications": None,
+        }
+        self.counts = {
+            kind: array(
+                "q",
+                (
+                    count if cap is None else min(count, cap)
+                    for count in draw_counts(config, kind, users, getattr(config, kind))
+                ),
+            )
+            for kind, cap in caps.items()
+        }
+        # chats companions are picked among more popular users, so every pair is generated by one user only
+        self.counts["chats"] = array("q", (min(count, user // 2) for user, count in enumerate(self.counts["chats"])))
+        self.chats_offsets = get_offsets(self.counts["chats"])
+        self.messages_counts = draw_counts(config, "messages", self.chats_offsets[-1], config.messages)
+        self.messages_offsets = get_offsets(self.messages_counts)
+
+    def rng(self, kind: str, index: int) -> random.Random:
+        return random.Random(f"{self.config.seed}:{kind}:{index}")
+
+    def user_id(self, user: int) -> int:
+        return self.config.ids_bases["users"] + user + 1
+
+    def tag_id(self, tag: int) -> int:
+        return self.config.ids_bases["tags"] + tag + 1
+
+    def post_index(self, author: int, number: int) -> int:
+        return self.posts_offsets[author] + number
+
+    def post_id(self, index: int) -> int:
+        return self.config.ids_bases["posts"] + index + 1
+
+    def chat_index(self, user: int, number: int) -> int:
+        return self.chats_offsets[user] + number
+
+    def chat_id(self, index: int) -> int:
+        return self.config.ids_bases["chats"] + index + 1
+
+    def message_id(self, chat: int, number: int) -> int:
+        return self.config.ids_bases["messages"] + self.messages_offsets[chat] + number + 1
+
+    def post_time(self, index: int) -> datetime:
+        return self.start + (self.now - self.start) * (index / max(self.total_posts, 1))
+
+    def pick_popular(self, rng: random.Random, below: typing.Optional[int] = None) -> int:
+        """Picks a user index with Zipf weights, among users more popular than `below` if it's given."""
+
+        total = self.popularity[below - 1] if below is not None else self.popularity[-1]
+        return bisect.bisect(self.popularity, rng.random() * total)
+
+    def pick_tag(self, rng: random.Random) -> int:
+        return bisect.bisect(self.tags_popularity, rng.random() * self.tags_popularity[-1])
+
+    def pick_post(self, rng: random.Random) -> int:
+        """Picks a post index: the author with Zipf weights, then one of their posts uniformly."""
+
+        while True:
+            author = self.pick_popular(rng)
+            if self.posts_counts[author]:
+                return self.post_index(author, rng.randrange(self.posts_counts[author]))
+
+    def pick_distinct(self, count: int, pick: typing.Callable[[], int], exclude: int = -1) -> typing.List[int]:
+        picked = {}
+        while len(picked) < count:
+            if (value := pick()) != exclude:
+                picked[value] = None
+        return list(picked)
+
+    def get_followings(self, user: int) -> typing.List[int]:
+        rng = self.rng("followings", user)
+        return self.pick_distinct(self.counts["followings"][user], lambda: self.pick_popular(rng), exclude=user)
+
+    def get_text(self, rng: random.Random, min_words: int, max_words: int) -> str:
+        return " ".join(rng.choices(WORDS, k=rng.randint(min_words, max_words)))
+
+
+def get_ids_bases() -> typing.Dict[str, int]:
+    """Generated rows with explicit ids go after the existing ones."""
+
+    from messenger.models import Chat, Message
+    from posts.models import Post, Tag
+
+    return {
+        name: model.objects.aggregate(max_id=Max("id"))["max_id"] or 0  # noqa
+        for name, model in (("users", User), ("tags", Tag), ("posts", Post), ("chats", Chat), ("messages", Message))
+    }
+
+
+def ensure_placeholder_images() -> typing.List[str]:
+    """Posts images share a few placeholder files instead of storing one file per image."""
+
+    from PIL import Image
+
+    names = []
+    for index in range(PLACEHOLDER_IMAGES_COUNT):
+        name = f"{settings.POSTS_IMAGES_DIR}/synthetic-{index}.jpg"
+        if not default_storage.exists(name):
+            content = io.BytesIO()
+            Image.new("RGB", (1080, 1080), (index * 30 % 256, 120, 255 - index * 30 % 256)).save(content, "JPEG")
+            default_storage.save(name, ContentFile(content.getvalue()))
+        names.append(name)
+    return names
+
+
+def generate_users(plan: SyntheticPlan, users: range) -> typing.Dict[str, int]:
+    from posts.models import Tag
+
+    config = plan.config
+    with RowsWriter(User, ("id", "username", "password", "email", "date_joined"), config.batch_size) as writer:
+        for user in users:
+            joined = plan.start + (plan.now - plan.start) * (user / config.users) / 2
+            user_id = plan.user_id(user)
+            writer.add(user_id, f"{USERNAME_PREFIX}{user_id:05d}", plan.password, None, joined)
+
+    with RowsWriter(Tag, ("id", "name"), config.batch_size) as tags:
+        if users.start == 0:
+            for tag in range(config.tags):
+                tags.add(plan.tag_id(tag), f"{USERNAME_PREFIX}{plan.tag_id(tag)}")
+    return {"users": writer.count, "tags": tags.count}
+
+
+def generate_content(plan: SyntheticPlan, users: range) -> typing.Dict[str, int]:
+    from posts.models import Post, PostImage
+    from users.models import Follow
+
+    config = plan.config
+    images_names = ensure_placeholder_images()
+    with (
+        RowsWriter(Follow, ("follower_id", "following_id"), config.batch_size) as follows,
+        RowsWriter(Post, ("id", "author_id", "signature", "time_added"), config.batch_size) as posts,
+        RowsWriter(PostImage, ("post_id", "image"), config.batch_size) as images,
+        RowsWriter(Post.tags.through, ("post_id", "tag_id"), config.batch_size) as posts_tags,
+    ):
+        for user in users:
+            user_id = plan.user_id(user)
+            for following in plan.get_followings(user):
+                follows.add(user_id, plan.user_id(following))
+
+            rng = plan.rng("posts", user)
+            for number in range(plan.posts_counts[user]):
+                index = plan.post_index(user, number)
+                post_id = plan.post_id(index)
+                posts.add(post_id, user_id, plan.get_text(rng, 0, 12), plan.post_time(index))
+                for _ in range(max(1, round(rng.expovariate(1 / config.images)))):
+                    images.add(post_id, rng.choice(images_names))
+
+                tags_count = min(round(rng.expovariate(1 / config.post_tags)), config.tags)
+                for tag in plan.pick_distinct(tags_count, lambda: plan.pick_tag(rng)):
+                    posts_tags.add(post_id, plan.tag_id(tag))
+    return {"follows": follows.count, "posts": posts.count, "images": images.count, "posts_tags": posts_tags.count}
+
+
+def generate_activity(plan: SyntheticPlan, users: range) -> typing.Dict[str, int]:
+    from messenger.models import Chat, ChatEvent, ChatMember, Message
+    from notifications.models import Notification
+    from posts.models import Comment, PostLike, Saved
+
+    config = plan.config
+    batch_size = config.batch_size
+    chat_fields = "id", "min_user_id", "max_user_id", "last_message_id", "last_activity_at", "seq", "is_read"
+    message_fields = "id", "chat_id", "sender_id", "receiver_id", "body", "seq", "time_added", "time_updated"
+    notification_fields = "recipient_id", "author_id", "post_id", "is_read", "time_added", "time_updated"
+    with (
+        RowsWriter(PostLike, ("author_id", "post_id"), batch_size) as likes,
+        RowsWriter(Comment, ("author_id", "post_id", "comment", "time_added"), batch_size) as comments,
+        RowsWriter(Saved, ("owner_id", "post_id", "time_added"), batch_size) as saved,
+        RowsWriter(Chat, chat_fields, batch_size) as chats,
+        RowsWriter(
+            ChatMember, ("chat_id", "user_id", "last_read_message_id", "last_activity_at"), batch_size
+        ) as members,
+        RowsWriter(Message, message_fields, batch_size) as messages,
+        RowsWriter(ChatEvent, ("chat_id", "seq", "type", "message_id", "time_added"), batch_size) as events,
+        RowsWriter(Notification, notification_fields, batch_size) as notifications,
+    ):
+        for user in users:
+            user_id = plan.user_id(user)
+            rng = plan.rng("likes", user)
+            for post in plan.pick_distinct(plan.counts["likes"][user], lambda: plan.pick_post(rng)):
+                likes.add(user_id, plan.post_id(post))
+
+            rng = plan.rng("comments", user)
+            for _ in range(plan.counts["comments"][user]):
+                post = plan.pick_post(rng)
+                time_added = plan.post_time(post) + (plan.now - plan.post_time(post)) * rng.random()
+                comments.add(user_id, plan.post_id(post), plan.get_text(rng, 3, 30), time_added)
+
+            rng = plan.rng("saved", user)
+            for post in plan.pick_distinct(plan.counts["saved"][user], lambda: plan.pick_post(rng)):
+                saved.add(user_id, plan.post_id(post), plan.post_time(post) + (plan.now - plan.post_time(post)) / 2)
+
+            rng = plan.rng("chats", user)
+            companions = plan.pick_distinct(plan.counts["chats"][user], lambda: plan.pick_popular(rng, below=user))
+            for number, companion in enumerate(companions):
+                chat = plan.chat_index(user, number)
+                chat_id, companion_id = plan.chat_id(chat), plan.user_id(companion)
+                messages_count = plan.messages_counts[chat]
+                time_added = plan.start + (plan.now - plan.start) * rng.random()
+                for seq in range(1, messages_count + 1):
+                    time_added = min(time_added + timedelta(seconds=rng.expovariate(1 / 600)), plan.now)
+                    sender, receiver = (user_id, companion_id) if rng.random() < 0.5 else (companion_id, user_id)
+                    message_id = plan.message_id(chat, seq - 1)
+                    body = plan.get_text(rng, 1, 20)
+                    messages.add(message_id, chat_id, sender, receiver, body, seq, time_added, time_added)
+                    events.add(chat_id, seq, ChatEvent.EventType.MESSAGE, message_id, time_added)
+
+                last_message_id = plan.message_id(chat, messages_count - 1) if messages_count else None
+                chats.add(chat_id, companion_id, user_id, last_message_id, time_added, messages_count, True)
+                members.add(chat_id, companion_id, last_message_id, time_added)
+                members.add(chat_id, user_id, last_message_id, time_added)
+
+            rng = plan.rng("notifications", user)
+            authors = [author for author in plan.get_followings(user) if plan.posts_counts[author]]
+            unread_authors = set()
+            for _ in range(plan.counts["notifications"][user] if authors else 0):
+                author = rng.choice(authors)
+                post = plan.post_index(author, rng.randrange(plan.posts_counts[author]))
+                # There is a single unread notification per author, the rest are collapsed into it.
+                is_read = rng.random() < config.read_ratio or author in unread_authors
+                if not is_read:
+                    unread_authors.add(author)
+                notifications.add(
+                    user_id,
+                    plan.user_id(author),
+                    plan.post_id(post),
+                    is_read,
+                    plan.post_time(post),
+                    plan.post_time(post),
+                )
+
+    return {
+        "likes": likes.count,
+        "comments": comments.count,
+        "saved": saved.count,
+        "chats": chats.count,
+        "messages": messages.count,
+        "notifications": notifications.count,
+    }
+
+
+def generate_phase(config: SyntheticConfig, phase: str, worker: int) -> typing.Dict[str, int]:
+    """Generates rows of one phase for the users of one worker in a single transaction."""
+
+    generate = {"users": generate_users, "content": generate_content, "activity": generate_activity}[phase]
+    plan = SyntheticPlan(config)
+    users = range(worker * config.users // config.processes, (worker + 1) * config.users // config.processes)
+    with transaction.atomic():
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET CONSTRAINTS ALL DEFERRED")
+        return generate(plan, users)
+
+
+def reset_sequences() -> None:
+    from django.core.management.color import no_style
+
+    from messenger.models import Chat, Message
+    from posts.models import Post, Tag
+
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [User, Tag, Post, Chat, Message]):
+            cursor.execute(sql)
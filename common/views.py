@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.contrib import admin
+from django.http import FileResponse, Http404, HttpRequest, HttpResponse, HttpResponseForbidden
+from django.shortcuts import render
+from prometheus_client import CONTENT_TYPE_LATEST
+from rest_framework import permissions, views
+from rest_framework.request import Request
+
+from common.metrics import get_metrics
+from common.profiling import get_profile_path
+from common.slow_queries import get_slow_queries, group_slow_queries
+
+
+def metrics(request: HttpRequest) -> HttpResponse:
+    if request.META.get("REMOTE_ADDR") not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden()
+    return HttpResponse(get_metrics(), content_type=CONTENT_TYPE_LATEST)
+
+
+class ProfileAPIView(views.APIView):
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request: Request, filename: str) -> FileResponse:
+        if not (path := get_profile_path(filename)):
+            raise Http404()
+        return FileResponse(open(path, "rb"), as_attachment=True, content_type="text/plain")
+
+
+def slow_queries(request: HttpRequest) -> HttpResponse:
+    queries = get_slow_queries(settings.SLOW_QUERIES_PAGE_SIZE)
+    context = {
+        **admin.site.each_context(request),
+        "title": "Slow queries",
+        "threshold": settings.SLOW_QUERY_THRESHOLD,
+        "groups": group_slow_queries(queries),
+        "queries": queries,
+    }
+    return render(request, "admin/slow_queries.html", context)
@@ -2,7 +2,9 @@ import os
 
 from channels.routing import ProtocolTypeRouter, URLRouter
 from django.core.asgi import get_asgi_application
+from django.urls import path
 
+from core.consumers import MultiplexConsumer
 from messenger.routing import websocket_urlpatterns as messenger_urls
 from notifications.routing import websocket_urlpatterns as notifications_urls
 
@@ -11,6 +13,6 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
 application = ProtocolTypeRouter(
     {
         "http": get_asgi_application(),
-        "websocket": URLRouter(notifications_urls + messenger_urls),
+        "websocket": URLRouter([path("ws/", MultiplexConsumer.as_asgi())] + notifications_urls + messenger_urls),
     }
 )
@@ -1,13 +1,14 @@
 import os
 
 from celery import Celery
+from celery.schedules import crontab
 from django.conf import settings
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
 
 app = Celery(
     "eXwonder",
-    include=["users.tasks", "notifications.tasks"],
+    include=["users.tasks", "notifications.tasks", "messenger.tasks"],
     broker=settings.CELERY_BROKER_URL,
     backend=settings.CELERY_RESULT_BACKEND,
 )
@@ -32,6 +33,32 @@ app.conf.task_routes = {
     "users.tasks.send_reset_password_mail": {"queue": "normal_priority"},
     "users.tasks.send_2fa_code_mail_message": {"queue": "normal_priority"},
     "notifications.tasks.send_notifications": {"queue": "low_priority"},
+    "notifications.tasks.send_notifications_chunk": {"queue": "low_priority"},
+    "notifications.tasks.send_notifications_digests": {"queue": "low_priority"},
+    "notifications.tasks.apply_notifications_retention": {"queue": "low_priority"},
+    "messenger.tasks.announce_user_offline": {"queue": "high_priority"},
+    "messenger.tasks.sweep_presence": {"queue": "high_priority"},
+    "messenger.tasks.remove_stale_uploads": {"queue": "low_priority"},
+    "messenger.tasks.apply_chat_events_retention": {"queue": "low_priority"},
+}
+
+app.conf.beat_schedule = {
+    "apply-notifications-retention": {
+        "task": "notifications.tasks.apply_notifications_retention",
+        "schedule": crontab(minute=0),
+    },
+    "apply-chat-events-retention": {
+        "task": "messenger.tasks.apply_chat_events_retention",
+        "schedule": crontab(minute=30),
+    },
+    "remove-stale-uploads": {
+        "task": "messenger.tasks.remove_stale_uploads",
+        "schedule": crontab(minute="*/15"),
+    },
+    "sweep-presence": {
+        "task": "messenger.tasks.sweep_presence",
+        "schedule": settings.PRESENCE_HEARTBEAT_INTERVAL,
+    },
 }
 
 app.autodiscover_tasks()
@@ -0,0 +1,56 @@
+import asyncio
+import typing
+
+from messenger.consumers import MessengerConsumer
+from notifications.consumers import NotificationConsumer
+
+MESSENGER_TOPIC = "messenger"
+NOTIFICATIONS_TOPIC = "notifications"
+
+
+class MultiplexConsumer(MessengerConsumer, NotificationConsumer):
+    """
+    Carries messenger and notifications streams over one connection with a single authentication.
+    Every frame is tagged with `topic`, client frames without it belong to the messenger.
+    """
+
+    notifications_events = ("notify", "notify_digest", "unread_count")
+    topic: str = MESSENGER_TOPIC
+
+    async def dispatch(self, message: dict) -> None:
+        if message["type"] != "websocket.receive":
+            self.topic = NOTIFICATIONS_TOPIC if message["type"] in self.notifications_events else MESSENGER_TOPIC
+        await super().dispatch(message)
+
+    async def disconnect(self, close_code: int) -> None:
+        await asyncio.gather(
+            MessengerConsumer.disconnect(self, close_code), NotificationConsumer.disconnect(self, close_code)
+        )
+
+    async def create_group(self, user_id: int) -> None:
+        await asyncio.gather(
+            MessengerConsumer.create_group(self, user_id), NotificationConsumer.create_group(self, user_id)
+        )
+
+    async def receive(self, text_data: str | None = None, bytes_data: bytes | None = None) -> None:
+        data = self.decode_payload(text_data, bytes_data)
+        if data is None:
+            self.topic = MESSENGER_TOPIC
+            await self.receive_upload_chunk(bytes_data)
+            return
+
+        self.topic = data.pop("topic", MESSENGER_TOPIC)
+        if self.topic == NOTIFICATIONS_TOPIC:
+            await self.receive_notifications(data)
+        else:
+            await self.receive_messenger(data)
+
+    async def send_payload(self, payload: dict) -> None:
+        if "topic" not in payload:
+            payload = {**payload, "topic": self.topic}
+        await super().send_payload(payload)
+
+    async def send_event(self, payload: dict, coalesce_key: typing.Optional[str] = None) -> None:
+        await super().send_event(
+            {**payload, "topic": self.topic}, coalesce_key=f"{self.topic}:{coalesce_key}" if coalesce_key else None
+        )
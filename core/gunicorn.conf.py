@@ -0,0 +1,12 @@
+import typing
+
+if typing.TYPE_CHECKING:
+    from gunicorn.arbiter import Arbiter
+    from gunicorn.workers.base import Worker
+
+
+def child_exit(server: "Arbiter", worker: "Worker") -> None:
+    # Imported here, so the master does not fix prometheus_client value class before PROMETHEUS_MULTIPROC_DIR is read
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -8,6 +8,7 @@
 """
 
 import os
+import tempfile
 from datetime import timedelta
 from pathlib import Path
 
@@ -44,6 +45,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "common.middleware.MetricsMiddleware",
+    "common.middleware.InstrumentationMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -52,6 +55,8 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "common.middleware.ProfilingMiddleware",
+    "common.middleware.QueryOriginMiddleware",
 ]
 
 if not DEBUG:
@@ -109,9 +114,30 @@ DATABASES = {
 LOGGING = {
     "version": 1,
     "handlers": {"console": {"class": "logging.StreamHandler"}},
-    "loggers": {"django.db.backends": {"handlers": ["console"], "level": env("DJANGO_LOG_LEVEL", default="DEBUG")}},
+    "loggers": {
+        "django.db.backends": {"handlers": ["console"], "level": env("DJANGO_LOG_LEVEL", default="INFO")},
+        "common.middleware": {"handlers": ["console"], "level": "INFO"},
+    },
 }
 
+INSTRUMENTATION_SAMPLE_RATE = float(env("INSTRUMENTATION_SAMPLE_RATE", default=1.0 if DEBUG else 0.01))
+INSTRUMENTATION_N_PLUS_ONE_THRESHOLD = 5
+
+METRICS_ALLOWED_IPS = env("METRICS_ALLOWED_IPS", default="127.0.0.1, ::1").split(", ")
+
+PROFILING_HEADER = "X-Profile"
+PROFILING_DIR = env("PROFILING_DIR", default=os.path.join(tempfile.gettempdir(), "exwonder-profiles"))
+PROFILING_SAMPLE_INTERVAL = 0.001  # seconds
+
+SLOW_QUERY_THRESHOLD = float(env("SLOW_QUERY_THRESHOLD", default=0.2))  # seconds
+SLOW_QUERY_EXPLAIN_SAMPLE_RATE = float(env("SLOW_QUERY_EXPLAIN_SAMPLE_RATE", default=0.1))
+SLOW_QUERIES_LOG_FILE = env(
+    "SLOW_QUERIES_LOG_FILE", default=os.path.join(tempfile.gettempdir(), "exwonder-slow-queries.log")
+)
+SLOW_QUERIES_LOG_MAX_BYTES = 10 * 1024 * 1024  # per process, processes log to <file>.<pid>
+SLOW_QUERIES_LOG_BACKUP_COUNT = 3  # rotated copies per process, <file>.<pid>.1 is the latest
+SLOW_QUERIES_PAGE_SIZE = 500
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -143,8 +169,54 @@ USER_POSTS_CACHE_NAME = "posts"
 POSTS_LIKED_TOP_CACHE_NAME = "posts:liked"
 POSTS_RECENT_TOP_CACHE_NAME = "posts:recent"
 
+PRESENCE_CONNECTIONS_CACHE_NAME = "presence:connections"
+PRESENCE_USERS_CACHE_NAME = "presence:users"
+PRESENCE_ANNOUNCED_CACHE_NAME = "presence:announced"
+MESSENGER_UPLOADS_CACHE_NAME = "messenger:uploads"
+MESSENGER_UPLOAD_LOCKS_CACHE_NAME = "messenger:uploads:locks"
+NOTIFICATIONS_DIGEST_CACHE_NAME = "notifications:digest"
+NOTIFICATIONS_UNREAD_COUNT_CACHE_NAME = "notifications:unread"
+NOTIFICATIONS_UNREAD_COUNT_VERSION_CACHE_NAME = "notifications:unread:version"
+
 USER_UPDATES_CACHE_TIME = 60 * 10
 POSTS_RECENT_TOP_CACHE_TIME = 60 * 60
+PRESENCE_ANNOUNCED_CACHE_TIME = 60 * 60 * 24
+MESSENGER_UPLOAD_CACHE_TIME = 60 * 60
+MESSENGER_UPLOAD_LOCK_CACHE_TIME = 30
+NOTIFICATIONS_UNREAD_COUNT_CACHE_TIME = 60 * 60 * 24
+NOTIFICATIONS_UNREAD_COUNT_VERSION_CACHE_TIME = 60 * 5  # longer than counting in the database
+
+PRESENCE_HEARTBEAT_INTERVAL = 30  # seconds
+PRESENCE_TTL = PRESENCE_HEARTBEAT_INTERVAL * 3  # seconds
+PRESENCE_OFFLINE_DEBOUNCE = 10  # seconds
+PRESENCE_SUBSCRIPTIONS_LIMIT = 256
+
+WEBSOCKET_OUTBOUND_QUEUE_SIZE = 256
+WEBSOCKET_OUTBOUND_RATE = 50  # frames per second of one connection
+WEBSOCKET_OUTBOUND_BURST = 100  # frames
+
+NOTIFICATIONS_FANOUT_CHUNK_SIZE = 1000
+NOTIFICATIONS_BULK_CREATE_BATCH_SIZE = 500
+NOTIFICATIONS_GROUP_SEND_CONCURRENCY = 100
+NOTIFICATIONS_COALESCE_WINDOW = 60 * 60  # seconds
+NOTIFICATIONS_DIGEST_INTERVAL = 60 * 15  # seconds
+NOTIFICATIONS_PAGE_SIZE = 30
+NOTIFICATIONS_MAX_PAGE_SIZE = 100
+NOTIFICATIONS_RETENTION_DAYS = 30
+NOTIFICATIONS_ARCHIVE_RETENTION_DAYS = 365
+NOTIFICATIONS_ARCHIVE_BATCH_SIZE = 5000
+NOTIFICATIONS_ARCHIVE_MAX_BATCHES = 100
+
+MESSENGER_CHATS_PAGE_SIZE = 30
+MESSENGER_HISTORY_PAGE_SIZE = 50
+MESSENGER_MAX_PAGE_SIZE = 100
+MESSENGER_SYNC_EVENTS_LIMIT = 500
+MESSENGER_CHAT_EVENTS_RETENTION_DAYS = 30
+MESSENGER_CHAT_EVENTS_RETENTION_BATCH_SIZE = 5000
+MESSENGER_CHAT_EVENTS_RETENTION_MAX_BATCHES = 100
+MESSENGER_UPLOAD_CHUNK_SIZE = 256 * 1024  # bytes
+MESSENGER_UPLOAD_MAX_SIZE = 50 * 1024 * 1024  # bytes
+MESSENGER_UPLOADS_TEMP_DIR = os.path.join(tempfile.gettempdir(), "exwonder-uploads")
 
 REST_FRAMEWORK = {
     "DEFAULT_RENDERER_CLASSES": [
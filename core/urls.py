@@ -4,12 +4,18 @@ from django.contrib import admin
 from django.urls import include, path
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 
+from common.views import ProfileAPIView, metrics, slow_queries
+
 urlpatterns = [
+    path("admin/slow-queries/", admin.site.admin_view(slow_queries), name="admin-slow-queries"),
     path("admin/", admin.site.urls),
     path("api/v1/account/", include("users.urls")),
     path("api/v1/posts/", include("posts.urls")),
+    path("api/v1/notifications/", include("notifications.urls")),
     path("api/v1/schema/", SpectacularAPIView.as_view(), name="schema"),
     path("api/v1/schema/docs/", SpectacularSwaggerView.as_view(url_name="schema"), name="schema-docs"),
+    path("metrics/", metrics, name="metrics"),
+    path("profiles/<str:filename>/", ProfileAPIView.as_view(), name="profile"),
 ]
 
 urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
@@ -1,171 +1,361 @@
+import asyncio
 import base64
-import json
+import struct
 import typing
 
+from asgiref.sync import sync_to_async
 from channels.db import database_sync_to_async
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
 
 from common.consumers import CommonConsumer
+from common.metrics import observe_websocket_messages
+from common.profiling import profile_websocket_messages
+from common.services import encode_cursor, get_page_size
+from messenger import uploads
 from messenger.services import (
     create_chat,
     create_message,
     edit_message,
     get_chat,
+    get_chat_events,
+    get_chat_members_ids,
     get_chats,
     get_current_user,
     get_message,
     get_messages_in_chat,
     get_new_chat_entity,
+    get_resync_chats,
     mark_chat,
     mark_message,
-    set_user_offline,
+    read_chat,
+)
+from messenger.tasks import announce_user_offline
+from users import presence
+from users.services import get_presence_visible_users
+
+if typing.TYPE_CHECKING:
+    from users.models import ExwonderUser as User
+
+MESSENGER_MESSAGE_TYPES = frozenset(
+    (
+        "authenticate",
+        "heartbeat",
+        "subscribe_presence",
+        "connect_to_chats",
+        "get_chat_history",
+        "sync",
+        "upload_start",
+        "upload_chunk",
+        "start_chat",
+        "send_message",
+        "read_chat",
+        "delete_message",
+        "edit_message",
+        "delete_chat",
+    )
 )
 
 
 class MessengerConsumer(CommonConsumer):
-    chats: typing.List[str]
+    presence_subscriptions: typing.Set[int]
+    presence_task: asyncio.Task | None = None
     user: "User"
 
     async def connect(self):
-        self.chats = []
+        self.presence_subscriptions = set()
         await self.accept()
 
     async def disconnect(self, close_code):
-        from users.serializers import UserDefaultSerializer
-
         if not hasattr(self, "user"):
             return
 
-        self.user = await database_sync_to_async(set_user_offline)(self.user)
-        for chat in self.chats:
-            await self.channel_layer.group_send(
-                chat, {"type": "user_offline", "user": UserDefaultSerializer(instance=self.user).data}
+        if self.presence_task:
+            self.presence_task.cancel()
+        await asyncio.gather(
+            self.channel_layer.group_discard(f"user_{self.user.id}_messenger", self.channel_name),
+            *(
+                self.channel_layer.group_discard(presence.get_presence_group_name(user_id), self.channel_name)
+                for user_id in self.presence_subscriptions
+            ),
+        )
+
+        if await sync_to_async(presence.disconnect)(self.user.id, self.channel_name):
+            await sync_to_async(announce_user_offline.apply_async)(
+                args=[self.user.id], countdown=settings.PRESENCE_OFFLINE_DEBOUNCE, queue="high_priority"
             )
-            await self.channel_layer.group_discard(chat, self.channel_name)
 
     async def create_group(self, user_id: int):
-        self.user = await database_sync_to_async(get_current_user)(user_id, True)
+        self.user = await database_sync_to_async(get_current_user)(user_id)
+        await self.refresh_presence()
         await self.channel_layer.group_add(f"user_{self.user.id}_messenger", self.channel_name)
 
+        if not self.presence_task:
+            self.presence_task = asyncio.create_task(self.keep_presence())
+
+    async def keep_presence(self) -> None:
+        """Refreshes presence of the connection until disconnect, clients do not have to send heartbeats."""
+
+        while True:
+            await asyncio.sleep(settings.PRESENCE_HEARTBEAT_INTERVAL)
+            await self.refresh_presence()
+
+    async def refresh_presence(self) -> None:
+        """Refreshes the connection, a user announced offline by the sweep meanwhile is announced online again."""
+
+        await sync_to_async(presence.connect)(self.user.id, self.channel_name)
+        await self.announce_online()
+
+    async def announce_online(self) -> None:
+        from users.serializers import UserDefaultSerializer
+
+        if await sync_to_async(presence.set_announced_status)(self.user.id, True):
+            user = await sync_to_async(lambda: UserDefaultSerializer(instance=self.user).data)()
+            await self.channel_layer.group_send(
+                presence.get_presence_group_name(self.user.id), {"type": "user_online", "user": user}
+            )
+
     async def receive(self, text_data=None, bytes_data=None):
-        data = json.loads(text_data)
+        data = self.decode_payload(text_data, bytes_data)
+        if data is None:
+            await self.receive_upload_chunk(bytes_data)
+        else:
+            await self.receive_messenger(data)
+
+    @profile_websocket_messages("messenger")
+    @observe_websocket_messages("messenger", MESSENGER_MESSAGE_TYPES)
+    async def receive_messenger(self, data: dict) -> None:
         type_ = data.get("type")
 
         match type_:
             case "authenticate":
                 await self.authenticate(data.get("token"), data.get("user_id"))
+            case "heartbeat" if hasattr(self, "user"):
+                await self.refresh_presence()
+            case "subscribe_presence" if hasattr(self, "user"):
+                await self.subscribe_presence(data)
             case "connect_to_chats":
-                await self.connect_to_chats()
+                await self.connect_to_chats(data)
             case "get_chat_history":
                 await self.get_chat_history(data)
+            case "sync":
+                await self.sync(data)
+            case "upload_start":
+                await self.start_upload(data)
+            case "upload_chunk":
+                await self.receive_encoded_upload_chunk(data)
             case "start_chat":
                 await self.start_chat(data)
             case "send_message":
                 await self.send_message(data)
             case "read_chat":
-                chat = await self.mark_as(data, mark_chat, is_read=True)
-                await self.channel_layer.group_send(
-                    f"chat_{chat.pk}",  # noqa
-                    {
-                        "type": "send_read_chat",
-                        "chat": chat.id,
-                    },
-                )
+                chat = await database_sync_to_async(read_chat)(data["id"], self.user)
+                if chat:
+                    await self.send_to_chat_members(
+                        await database_sync_to_async(get_chat_members_ids)(chat.id),
+                        {
+                            "type": "send_read_chat",
+                            "chat": chat.id,
+                            "user": self.user.id,
+                            "seq": chat.seq,
+                        },
+                    )
             case "delete_message":
                 message = await self.mark_as(data, mark_message, is_delete=True)
-                await self.send(text_data=json.dumps({"success": True}))
-                await self.channel_layer.group_send(
-                    f"chat_{message.chat.pk}",  # noqa
-                    {
-                        "type": "send_delete_message",
-                        "message": message.id,
-                    },
-                )
+                await self.send_payload({"success": True})
+                if message.event_seq is not None:
+                    await self.send_to_chat_members(
+                        (message.sender_id, message.receiver_id),
+                        {
+                            "type": "send_delete_message",
+                            "message": message.id,
+                            "seq": message.event_seq,
+                            "chat": await self.get_chat_broadcast(message.id),
+                        },
+                    )
             case "edit_message":
                 message = await self.edit_message(data)
-                await self.send(text_data=json.dumps({"success": True}))
-                await self.channel_layer.group_send(
-                    f"chat_{message.chat.id}", {"type": "send_edit_message", "message": message.id}
+                await self.send_payload({"success": True})
+                await self.send_to_chat_members(
+                    (message.sender_id, message.receiver_id),
+                    {
+                        "type": "send_edit_message",
+                        "message": await self.get_message_broadcast(message.id),
+                        "seq": message.event_seq,
+                    },
                 )
             case "delete_chat":
                 chat = await self.mark_as(data, mark_chat, is_delete=True)
-                await self.send(text_data=json.dumps({"success": True}))
-                await self.channel_layer.group_send(
-                    f"chat_{chat.pk}",  # noqa
+                await self.send_payload({"success": True})
+                await self.send_to_chat_members(
+                    await database_sync_to_async(get_chat_members_ids)(chat.id),
                     {
                         "type": "send_delete_chat",
                         "chat": chat.id,
+                        "seq": chat.seq,
                     },
                 )
 
+    async def send_to_chat_members(self, members: typing.Iterable[int], event: dict) -> None:
+        await asyncio.gather(
+            *(self.channel_layer.group_send(f"user_{member}_messenger", event) for member in set(members))
+        )
+
     async def send_read_chat(self, event):
-        await self.send(text_data=json.dumps({"type": "send_read_chat", "chat": event["chat"]}))
+        await self.send_event(
+            {"type": "send_read_chat", "chat": event["chat"], "user": event["user"], "seq": event["seq"]},
+            coalesce_key=f"read_chat:{event['chat']}:{event['user']}",
+        )
+
+    async def get_message_broadcast(self, pk: int) -> dict:
+        from messenger.serializers import serialize_message_broadcast
+
+        message = await database_sync_to_async(get_message)(pk)
+        return await sync_to_async(serialize_message_broadcast)(
+            message, (message.sender.timezone, message.receiver.timezone)
+        )
+
+    async def get_chat_broadcast(self, message_pk: int) -> dict:
+        from messenger.serializers import serialize_chat_broadcast
+
+        chat = await database_sync_to_async(get_new_chat_entity)(message_pk, self.user)
+        return await sync_to_async(serialize_chat_broadcast)(chat, self.user)
 
     async def send_delete_message(self, event):
-        from messenger.serializers import ChatSerializer
+        from messenger.serializers import localize_chat_broadcast
 
-        new_chat_entity = await database_sync_to_async(get_new_chat_entity)(event["message"])
-        await self.send(
-            text_data=json.dumps(
-                {
-                    "type": "send_delete_message",
-                    "message": event["message"],
-                    "chat": await database_sync_to_async(
-                        lambda: ChatSerializer(instance=new_chat_entity, context={"user": self.user}).data
-                    )(),
-                }
-            )
+        await self.send_event(
+            {
+                "type": "send_delete_message",
+                "message": event["message"],
+                "seq": event["seq"],
+                "chat": localize_chat_broadcast(event["chat"], self.user),
+            },
+            coalesce_key=f"send_delete_message:{event['message']}",
         )
 
     async def send_edit_message(self, event):
-        from messenger.serializers import MessageSerializer
+        from messenger.serializers import localize_message_broadcast
 
-        message = await database_sync_to_async(get_message)(event["message"])
-        await self.send(
-            text_data=json.dumps(
-                {
-                    "type": "send_edit_message",
-                    "message": MessageSerializer(instance=message, context={"user": self.user}).data,
-                }
-            )
+        payload = localize_message_broadcast(event["message"], self.user.timezone)
+        await self.send_event(
+            {"type": "send_edit_message", "message": payload, "seq": event["seq"]},
+            coalesce_key=f"send_edit_message:{payload['id']}",
         )
 
     async def send_delete_chat(self, event):
-        await self.send(text_data=json.dumps({"type": "send_delete_chat", "chat": event["chat"]}))
+        await self.send_event(
+            {"type": "send_delete_chat", "chat": event["chat"], "seq": event["seq"]},
+            coalesce_key=f"send_delete_chat:{event['chat']}",
+        )
 
-    async def connect_to_chats(self):
+    async def connect_to_chats(self, data: dict) -> None:
         from messenger.serializers import ChatSerializer
-        from users.serializers import UserDefaultSerializer
-
-        chats = await database_sync_to_async(get_chats)(self.user)
-
-        for chat in chats:
-            self.chats.append(f"chat_{chat.id}")
-            await self.channel_layer.group_add(f"chat_{chat.id}", self.channel_name)
-            await self.channel_layer.group_send(
-                f"chat_{chat.id}", {"type": "user_online", "user": UserDefaultSerializer(instance=self.user).data}
-            )
 
+        limit = get_page_size(data.get("limit"), settings.MESSENGER_CHATS_PAGE_SIZE, settings.MESSENGER_MAX_PAGE_SIZE)
+        chats = await database_sync_to_async(get_chats)(self.user, data.get("cursor"), limit)
         payload = await database_sync_to_async(
             lambda: ChatSerializer(chats, many=True, context={"user": self.user}).data
         )()
+        cursor = encode_cursor(chats[-1].member_activity_at, chats[-1].id) if len(chats) == limit else None
+
+        await self.send_payload({"type": "connect_to_chats", "payload": payload, "cursor": cursor})
+
+    async def subscribe_presence(self, data: dict) -> None:
+        users = {int(user_id) for user_id in data.get("users", [])[: settings.PRESENCE_SUBSCRIPTIONS_LIMIT]}
+        users = await database_sync_to_async(get_presence_visible_users)(self.user.id, users)
+        subscribed, unsubscribed = users - self.presence_subscriptions, self.presence_subscriptions - users
+        self.presence_subscriptions = users
+
+        await asyncio.gather(
+            *(
+                self.channel_layer.group_add(presence.get_presence_group_name(user_id), self.channel_name)
+                for user_id in subscribed
+            ),
+            *(
+                self.channel_layer.group_discard(presence.get_presence_group_name(user_id), self.channel_name)
+                for user_id in unsubscribed
+            ),
+        )
 
-        await self.send(text_data=json.dumps({"type": "connect_to_chats", "payload": payload}))
+        statuses = await sync_to_async(presence.get_users_online_statuses)(users)
+        await self.send_payload({"type": "presence", "users": statuses})
 
     async def user_online(self, event):
         if self.user.id != event["user"]["id"]:
-            await self.send(text_data=json.dumps({"type": "user_online", "user": event["user"]}))
+            await self.send_event(
+                {"type": "user_online", "user": event["user"]}, coalesce_key=f"presence:{event['user']['id']}"
+            )
 
     async def user_offline(self, event):
         if self.user.id != event["user"]["id"]:
-            await self.send(text_data=json.dumps({"type": "user_offline", "user": event["user"]}))
+            await self.send_event(
+                {"type": "user_offline", "user": event["user"]}, coalesce_key=f"presence:{event['user']['id']}"
+            )
 
     async def get_chat_history(self, data: dict):
         from messenger.serializers import MessageSerializer
 
         chat = data["chat"]
-        messages = await database_sync_to_async(get_messages_in_chat)(chat)
-        payload = MessageSerializer(messages, many=True, context={"user": self.user}).data
-        await self.send(text_data=json.dumps({"type": "get_chat_history", "chat": chat, "payload": payload}))
+        limit = get_page_size(data.get("limit"), settings.MESSENGER_HISTORY_PAGE_SIZE, settings.MESSENGER_MAX_PAGE_SIZE)
+        messages = await database_sync_to_async(get_messages_in_chat)(
+            chat, data.get("before"), data.get("after"), limit
+        )
+        payload = await database_sync_to_async(
+            lambda: MessageSerializer(messages, many=True, context={"user": self.user}).data
+        )()
+
+        await self.send_payload(
+            {
+                "type": "get_chat_history",
+                "chat": chat,
+                "payload": payload,
+                "before": encode_cursor(messages[-1].time_added, messages[-1].id) if messages else None,
+                "after": encode_cursor(messages[0].time_added, messages[0].id) if messages else None,
+                "has_more": len(messages) == limit,
+            }
+        )
+
+    async def sync(self, data: dict) -> None:
+        from messenger.models import ChatEvent
+        from messenger.serializers import MessageSerializer
+
+        try:
+            chats = {int(chat): int(seq) for chat, seq in data.get("chats", {}).items()}
+        except (AttributeError, TypeError, ValueError):
+            await self.send_payload({"type": "sync_error", "chats": data.get("chats")})
+            return
+
+        resync = await database_sync_to_async(get_resync_chats)(self.user, chats)
+        for chat in resync:
+            del chats[chat]
+        limit = settings.MESSENGER_SYNC_EVENTS_LIMIT
+        events = await database_sync_to_async(get_chat_events)(self.user, chats, limit)
+        # Deleted messages are sent as their ids only, like the delete events are.
+        messages = [
+            event.message
+            for event in events
+            if event.type in (ChatEvent.EventType.MESSAGE, ChatEvent.EventType.EDIT) and not event.message.is_delete
+        ]
+        serialized_messages = await database_sync_to_async(
+            lambda: MessageSerializer(messages, many=True, context={"user": self.user}).data
+        )()
+        serialized_messages = iter(serialized_messages)
+
+        payload = []
+        for event in events:
+            item = {"type": event.type, "chat": event.chat_id, "seq": event.seq}
+            match event.type:
+                case ChatEvent.EventType.MESSAGE | ChatEvent.EventType.EDIT if not event.message.is_delete:
+                    item["message"] = next(serialized_messages)
+                case ChatEvent.EventType.MESSAGE | ChatEvent.EventType.EDIT | ChatEvent.EventType.DELETE:
+                    item["message"] = event.message_id
+                case ChatEvent.EventType.READ:
+                    item["user"], item["message"] = event.user_id, event.message_id
+            payload.append(item)
+
+        await self.send_payload({"type": "sync", "events": payload, "has_more": len(events) == limit, "resync": resync})
 
     async def start_chat(self, data: dict):
         from messenger.serializers import ChatSerializer
@@ -173,60 +363,120 @@ class MessengerConsumer(CommonConsumer):
         chat, receiver = await database_sync_to_async(create_chat)(data["receiver"], self.user)
 
         if not chat and not receiver:
-            await self.send(
-                text_data=json.dumps({"type": "chat_started", "payload": {"error_get_user": data["receiver"]}})
-            )
+            await self.send_payload({"type": "chat_started", "payload": {"error_get_user": data["receiver"]}})
             return
 
-        self.chats.append(f"chat_{chat.id}")
-        await self.channel_layer.group_add(f"chat_{chat.id}", self.channel_name)
         await self.channel_layer.group_send(
             f"user_{receiver.id}_messenger", {"type": "connect_to_chat", "chat": chat.id}
         )
+        chat = await database_sync_to_async(get_chat)(chat.id, self.user)
         payload = await database_sync_to_async(
             lambda: ChatSerializer(instance=chat, context={"user": self.user}).data
         )()
-        await self.send(text_data=json.dumps({"type": "chat_started", "payload": payload}))
+        await self.send_payload({"type": "chat_started", "payload": payload})
 
     async def connect_to_chat(self, event):
         from messenger.serializers import ChatSerializer
 
-        chat = event["chat"]
-        self.chats.append(f"chat_{chat}")
-        await self.channel_layer.group_add(f"chat_{chat}", self.channel_name)
-        chat = await database_sync_to_async(get_chat)(chat)
+        chat = await database_sync_to_async(get_chat)(event["chat"], self.user)
         payload = await database_sync_to_async(lambda: ChatSerializer(chat, context={"user": self.user}).data)()
-        await self.send(text_data=json.dumps({"type": "connect_to_chat", "payload": payload}))
+        await self.send_event(
+            {"type": "connect_to_chat", "payload": payload}, coalesce_key=f"connect_to_chat:{chat.id}"
+        )
 
     async def send_message(self, data: dict):
         chat_id = data["chat_id"]
         receiver = data["receiver"]
         body = data.get("body", None)
-        attachment = base64.b64decode(data["attachment"]) if data.get("attachment", None) else None
-        name = data.get("attachment_name", None)
-        message = await database_sync_to_async(create_message)(chat_id, receiver, body, attachment, name, self.user)
-        await self.send(text_data=json.dumps({"success": True}))
-        await self.channel_layer.group_send(
-            f"chat_{chat_id}",
+        attachment = await self.get_attachment(data)
+        message = await database_sync_to_async(create_message)(chat_id, receiver, body, attachment, self.user)
+        if attachment:
+            attachment.close()
+        await self.send_payload({"success": True})
+        await self.send_to_chat_members(
+            (message.sender_id, message.receiver_id),
             {
                 "type": "on_message",
-                "message": message.id,
+                "message": await self.get_message_broadcast(message.id),
             },
         )
 
     async def edit_message(self, data: dict):
         message = data["message"]
         body = data["body"]
-        attachment = base64.b64decode(data["attachment"]) if data.get("attachment", None) else None
-        name = data.get("attachment_name", None)
-        return await database_sync_to_async(edit_message)(message, body, attachment, name)
+        attachment = await self.get_attachment(data)
+        message = await database_sync_to_async(edit_message)(message, body, attachment)
+        if attachment:
+            attachment.close()
+        return message
+
+    async def get_attachment(self, data: dict) -> File | None:
+        if upload_id := data.get("upload_id"):
+            return await sync_to_async(uploads.pop_upload_file)(self.user.id, upload_id)
+        if data.get("attachment") and data.get("attachment_name"):
+            return await sync_to_async(
+                lambda: ContentFile(base64.b64decode(data["attachment"]), name=data["attachment_name"])
+            )()
+        return None
+
+    async def start_upload(self, data: dict) -> None:
+        upload = await sync_to_async(uploads.start_upload)(
+            self.user.id, data.get("name"), int(data.get("size", 0)), data.get("upload_id")
+        )
+        if not upload:
+            await self.send_payload({"type": "upload_error", "upload_id": data.get("upload_id")})
+            return
+
+        await self.send_payload(
+            {
+                "type": "upload_started",
+                "upload_id": upload["id"],
+                "offset": upload["offset"],
+                "chunk_size": settings.MESSENGER_UPLOAD_CHUNK_SIZE,
+            }
+        )
+
+    async def receive_upload_chunk(self, frame: bytes) -> None:
+        try:
+            upload_id, offset, chunk = uploads.parse_chunk(frame)
+        except struct.error:
+            await self.send_payload({"type": "upload_error", "upload_id": None})
+            return
+        await self.write_upload_chunk(upload_id, offset, chunk)
+
+    async def receive_encoded_upload_chunk(self, data: dict) -> None:
+        """Chunk sent as a message, its `data` is bytes under msgpack and base64 under JSON."""
+
+        upload_id, offset, chunk = data.get("upload_id"), data.get("offset"), data.get("data")
+        try:
+            offset = int(offset)
+            chunk = base64.b64decode(chunk, validate=True) if isinstance(chunk, str) else chunk
+        except (TypeError, ValueError):
+            offset = chunk = None
+        if not isinstance(upload_id, str) or offset is None or not isinstance(chunk, bytes):
+            await self.send_payload({"type": "upload_error", "upload_id": upload_id})
+            return
+        await self.write_upload_chunk(upload_id, offset, chunk)
+
+    async def write_upload_chunk(self, upload_id: str, offset: int, chunk: bytes) -> None:
+        upload = await sync_to_async(uploads.write_chunk)(self.user.id, upload_id, offset, chunk)
+        if not upload:
+            await self.send_payload({"type": "upload_error", "upload_id": upload_id})
+            return
+
+        await self.send_payload(
+            {
+                "type": "upload_complete" if uploads.is_upload_complete(upload) else "upload_progress",
+                "upload_id": upload_id,
+                "offset": upload["offset"],
+            }
+        )
 
     async def on_message(self, event: dict):
-        from messenger.serializers import MessageSerializer
+        from messenger.serializers import localize_message_broadcast
 
-        message = await database_sync_to_async(get_message)(event["message"])
-        payload = MessageSerializer(instance=message, context={"user": self.user}).data
-        await self.send(text_data=json.dumps({"type": "on_message", "payload": payload}))
+        payload = localize_message_broadcast(event["message"], self.user.timezone)
+        await self.send_event({"type": "on_message", "payload": payload})
 
     async def mark_as(self, data: dict, callback: typing.Callable, **kwargs):
         pk = data["id"]
@@ -0,0 +1,48 @@
+# Generated by Django 5.1.1 on 2026-10-19 01:43
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.backends.base.schema import BaseDatabaseSchemaEditor
+from django.db.migrations.state import StateApps
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce, Now
+
+
+def fill_chats_last_message(apps: StateApps, schema_editor: BaseDatabaseSchemaEditor) -> None:
+    Chat = apps.get_model("messenger", "Chat")
+    Message = apps.get_model("messenger", "Message")
+
+    last_message = Message.objects.filter(chat=OuterRef("pk"), is_delete=False).order_by("-time_added", "-id")
+    Chat.objects.update(
+        last_message=Subquery(last_message.values("pk")[:1]),
+        last_activity_at=Coalesce(Subquery(last_message.values("time_added")[:1]), Now()),
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("messenger", "0003_message_is_edit"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="chat",
+            name="last_activity_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name="chat",
+            name="last_message",
+            field=models.ForeignKey(
+                null=True, on_delete=django.db.models.deletion.SET_NULL, related_name="+", to="messenger.message"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="chat",
+            index=models.Index(fields=["-last_activity_at", "-id"], name="chats_last_activity_index"),
+        ),
+        migrations.RunPython(fill_chats_last_message, migrations.RunPython.noop),
+    ]
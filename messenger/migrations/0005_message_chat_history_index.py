@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-19 01:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("messenger", "0004_chat_last_message_last_activity_at"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(fields=["chat", "is_delete", "-time_added", "-id"], name="messages_chat_history_index"),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.1.1 on 2026-10-19 01:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("messenger", "0005_message_chat_history_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="chat",
+            name="seq",
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="message",
+            name="seq",
+            field=models.PositiveBigIntegerField(null=True),
+        ),
+        migrations.CreateModel(
+            name="ChatEvent",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("seq", models.PositiveBigIntegerField()),
+                (
+                    "type",
+                    models.CharField(
+                        choices=[
+                            ("message", "Message"),
+                            ("edit", "Edit message"),
+                            ("delete", "Delete message"),
+                            ("read", "Read chat"),
+                            ("delete_chat", "Delete chat"),
+                        ],
+                        max_length=16,
+                    ),
+                ),
+                ("time_added", models.DateTimeField(auto_now_add=True)),
+                (
+                    "chat",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="events", to="messenger.chat"
+                    ),
+                ),
+                (
+                    "message",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="events",
+                        to="messenger.message",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Chat event",
+                "verbose_name_plural": "Chats events",
+                "db_table": "chats_events",
+                "ordering": ("chat", "seq"),
+                "constraints": [models.UniqueConstraint(fields=("chat", "seq"), name="chat_event_seq_unique")],
+            },
+        ),
+    ]
@@ -0,0 +1,101 @@
+# Generated by Django 5.1.1 on 2026-10-19 01:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.backends.base.schema import BaseDatabaseSchemaEditor
+from django.db.migrations.state import StateApps
+from django.db.models import Count, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_chats_members_read_watermarks(apps: StateApps, schema_editor: BaseDatabaseSchemaEditor) -> None:
+    ChatMember = apps.get_model("messenger", "ChatMember")
+    Message = apps.get_model("messenger", "Message")
+
+    messages = Message.objects.filter(chat=OuterRef("chat_id")).order_by().values("chat")
+    ChatMember.objects.update(
+        last_read_message=Subquery(
+            messages.filter(Q(sender=OuterRef("user_id")) | Q(is_read=True)).annotate(last=Max("pk")).values("last")
+        ),
+        unread_count=Coalesce(
+            Subquery(
+                messages.filter(receiver=OuterRef("user_id"), is_read=False, is_delete=False)
+                .annotate(count=Count("pk"))
+                .values("count")
+            ),
+            0,
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("messenger", "0006_chat_seq_chatevent"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name="ChatMember",
+                    fields=[
+                        (
+                            "id",
+                            models.BigAutoField(
+                                auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                            ),
+                        ),
+                        (
+                            "chat",
+                            models.ForeignKey(
+                                on_delete=django.db.models.deletion.CASCADE,
+                                related_name="memberships",
+                                to="messenger.chat",
+                            ),
+                        ),
+                        (
+                            "user",
+                            models.ForeignKey(
+                                db_column="exwonderuser_id",
+                                on_delete=django.db.models.deletion.CASCADE,
+                                related_name="chats_memberships",
+                                to=settings.AUTH_USER_MODEL,
+                            ),
+                        ),
+                    ],
+                    options={
+                        "verbose_name": "Chat member",
+                        "verbose_name_plural": "Chats members",
+                        "db_table": "chats_members",
+                        "unique_together": {("chat", "user")},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name="chat",
+                    name="members",
+                    field=models.ManyToManyField(
+                        related_name="chats", through="messenger.ChatMember", to=settings.AUTH_USER_MODEL
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="chatmember",
+            name="last_read_message",
+            field=models.ForeignKey(
+                null=True, on_delete=django.db.models.deletion.SET_NULL, related_name="+", to="messenger.message"
+            ),
+        ),
+        migrations.AddField(
+            model_name="chatmember",
+            name="unread_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_chats_members_read_watermarks, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name="message",
+            name="is_read",
+        ),
+    ]
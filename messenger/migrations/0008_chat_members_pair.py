@@ -0,0 +1,57 @@
+# Generated by Django 5.1.1 on 2026-10-19 02:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.backends.base.schema import BaseDatabaseSchemaEditor
+from django.db.migrations.state import StateApps
+from django.db.models import Count, Max, Min
+
+
+def fill_chats_members_pairs(apps: StateApps, schema_editor: BaseDatabaseSchemaEditor) -> None:
+    Chat = apps.get_model("messenger", "Chat")
+
+    chats = (
+        Chat.objects.annotate(low=Min("memberships__user_id"), high=Max("memberships__user_id"))
+        .filter(low__isnull=False)
+        .annotate(members_count=Count("memberships"))
+        .filter(members_count=2)
+        .order_by("id")
+    )
+    pairs = {}
+    for chat in chats.iterator():
+        # Duplicated chats of the same members keep no pair, only the oldest one is found by start chat.
+        pairs.setdefault((chat.low, chat.high), chat)
+
+    for (low, high), chat in pairs.items():
+        chat.min_user_id, chat.max_user_id = low, high
+    Chat.objects.bulk_update(pairs.values(), ["min_user", "max_user"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("messenger", "0007_chatmember_read_watermarks"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="chat",
+            name="max_user",
+            field=models.ForeignKey(
+                null=True, on_delete=django.db.models.deletion.CASCADE, related_name="+", to=settings.AUTH_USER_MODEL
+            ),
+        ),
+        migrations.AddField(
+            model_name="chat",
+            name="min_user",
+            field=models.ForeignKey(
+                null=True, on_delete=django.db.models.deletion.CASCADE, related_name="+", to=settings.AUTH_USER_MODEL
+            ),
+        ),
+        migrations.RunPython(fill_chats_members_pairs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="chat",
+            constraint=models.UniqueConstraint(fields=("min_user", "max_user"), name="chat_members_pair_unique"),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.1 on 2026-10-19 03:51
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.backends.base.schema import BaseDatabaseSchemaEditor
+from django.db.migrations.state import StateApps
+from django.db.models import OuterRef, Subquery
+
+
+def fill_members_last_activity_at(apps: StateApps, schema_editor: BaseDatabaseSchemaEditor) -> None:
+    Chat = apps.get_model("messenger", "Chat")
+    ChatMember = apps.get_model("messenger", "ChatMember")
+
+    chat = Chat.objects.filter(pk=OuterRef("chat_id"))
+    ChatMember.objects.update(last_activity_at=Subquery(chat.values("last_activity_at")[:1]))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("messenger", "0008_chat_members_pair"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="chat",
+            name="chats_last_activity_index",
+        ),
+        migrations.AddField(
+            model_name="chatmember",
+            name="last_activity_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(fill_members_last_activity_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="chatmember",
+            index=models.Index(fields=["user", "-last_activity_at", "-chat"], name="chats_members_activity_index"),
+        ),
+    ]
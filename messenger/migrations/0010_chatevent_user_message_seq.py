@@ -0,0 +1,63 @@
+# Generated by Django 5.1.1 on 2026-10-19 05:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Messages sent before the events log have no seq. They are numbered 1..n in their chat by time, and seqs of
+# the chat events, messages and chat are shifted by n. Two steps keep the events seqs unique on every row.
+FILL_MESSAGES_SEQ = (
+    """
+    CREATE TEMPORARY TABLE messages_seq_shifts ON COMMIT DROP AS
+    SELECT chat_id, COUNT(*) AS shift FROM messages WHERE seq IS NULL GROUP BY chat_id
+    """,
+    """
+    UPDATE chats_events SET seq = chats_events.seq + shifts.shift + chats.seq
+    FROM messages_seq_shifts shifts JOIN chats ON chats.id = shifts.chat_id
+    WHERE chats_events.chat_id = shifts.chat_id
+    """,
+    """
+    UPDATE chats_events SET seq = chats_events.seq - chats.seq
+    FROM messages_seq_shifts shifts JOIN chats ON chats.id = shifts.chat_id
+    WHERE chats_events.chat_id = shifts.chat_id
+    """,
+    """
+    UPDATE messages SET seq = messages.seq + shifts.shift
+    FROM messages_seq_shifts shifts
+    WHERE messages.chat_id = shifts.chat_id AND messages.seq IS NOT NULL
+    """,
+    """
+    UPDATE chats SET seq = chats.seq + shifts.shift
+    FROM messages_seq_shifts shifts
+    WHERE chats.id = shifts.chat_id
+    """,
+    """
+    UPDATE messages SET seq = numbered.seq
+    FROM (
+        SELECT id, ROW_NUMBER() OVER (PARTITION BY chat_id ORDER BY time_added, id) AS seq
+        FROM messages WHERE seq IS NULL
+    ) numbered
+    WHERE messages.id = numbered.id
+    """,
+)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("messenger", "0009_chatmember_last_activity_at"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="chatevent",
+            name="user",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.RunSQL(sql=FILL_MESSAGES_SEQ, reverse_sql=migrations.RunSQL.noop),
+    ]
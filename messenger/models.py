@@ -1,8 +1,8 @@
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.core.exceptions import ValidationError
 from django.db import models
 from django.db.models import Q
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 User = get_user_model()
@@ -13,7 +13,12 @@ def message_attachments_upload(instance: "Message", filename: str) -> str:
 
 
 class Chat(models.Model):
-    members = models.ManyToManyField(User, related_name="chats")
+    members = models.ManyToManyField(User, related_name="chats", through="ChatMember")
+    min_user = models.ForeignKey(User, related_name="+", null=True, on_delete=models.CASCADE)
+    max_user = models.ForeignKey(User, related_name="+", null=True, on_delete=models.CASCADE)
+    last_message = models.ForeignKey("Message", related_name="+", null=True, on_delete=models.SET_NULL)
+    last_activity_at = models.DateTimeField(default=timezone.now)
+    seq = models.PositiveBigIntegerField(default=0)
     is_read = models.BooleanField(default=False)
     is_delete = models.BooleanField(default=False)
 
@@ -23,14 +28,13 @@ class Chat(models.Model):
 
         db_table = "chats"
 
+        constraints = [
+            models.UniqueConstraint(fields=("min_user", "max_user"), name="chat_members_pair_unique"),
+        ]
+
     def __str__(self) -> str:
         return f"{self.id} chat"  # noqa
 
-    def save(self, *args, **kwargs):
-        if self.id and self.members.count() > 2:  # noqa
-            raise ValidationError(_("A chat can have no more than 2 members."))
-        super().save(*args, **kwargs)
-
 
 class Message(models.Model):
     chat = models.ForeignKey(Chat, related_name="messages", on_delete=models.CASCADE)
@@ -38,10 +42,10 @@ class Message(models.Model):
     receiver = models.ForeignKey(User, related_name="recieved_messages", on_delete=models.CASCADE)
     body = models.TextField(max_length=4096, null=True)
     attachment = models.FileField(upload_to=message_attachments_upload, null=True)
+    seq = models.PositiveBigIntegerField(null=True)
     time_added = models.DateTimeField(auto_now_add=True)
     time_updated = models.DateTimeField(auto_now=True)
     is_edit = models.BooleanField(default=False)
-    is_read = models.BooleanField(default=False)
     is_delete = models.BooleanField(default=False)
 
     class Meta:
@@ -51,6 +55,9 @@ class Message(models.Model):
 
         db_table = "messages"
 
+        indexes = (
+            models.Index(fields=("chat", "is_delete", "-time_added", "-id"), name="messages_chat_history_index"),
+        )
         constraints = [
             models.CheckConstraint(
                 check=Q(body__isnull=False) | Q(attachment__isnull=False), name="body_or_attachment_required"
@@ -59,3 +66,55 @@ class Message(models.Model):
 
     def __str__(self) -> str:
         return f"{self.sender} message to {self.receiver} at {self.time_added}"
+
+
+class ChatMember(models.Model):
+    chat = models.ForeignKey(Chat, related_name="memberships", on_delete=models.CASCADE)
+    user = models.ForeignKey(
+        User, related_name="chats_memberships", db_column="exwonderuser_id", on_delete=models.CASCADE
+    )
+    last_read_message = models.ForeignKey(Message, related_name="+", null=True, on_delete=models.SET_NULL)
+    unread_count = models.PositiveIntegerField(default=0)
+    last_activity_at = models.DateTimeField(default=timezone.now)  # copy of the chat one, to list chats of a member
+
+    class Meta:
+        verbose_name = _("Chat member")
+        verbose_name_plural = _("Chats members")
+
+        db_table = "chats_members"
+
+        indexes = (models.Index(fields=("user", "-last_activity_at", "-chat"), name="chats_members_activity_index"),)
+        unique_together = ("chat", "user")
+
+    def __str__(self) -> str:
+        return f"{self.user_id} member of {self.chat_id} chat"  # noqa
+
+
+class ChatEvent(models.Model):
+    class EventType(models.TextChoices):
+        MESSAGE = "message", _("Message")
+        EDIT = "edit", _("Edit message")
+        DELETE = "delete", _("Delete message")
+        READ = "read", _("Read chat")
+        DELETE_CHAT = "delete_chat", _("Delete chat")
+
+    chat = models.ForeignKey(Chat, related_name="events", on_delete=models.CASCADE)
+    seq = models.PositiveBigIntegerField()
+    type = models.CharField(choices=EventType.choices, max_length=16)
+    message = models.ForeignKey(Message, related_name="events", null=True, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, related_name="+", null=True, on_delete=models.CASCADE)  # reader of READ events
+    time_added = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = "chat", "seq"
+        verbose_name = _("Chat event")
+        verbose_name_plural = _("Chats events")
+
+        db_table = "chats_events"
+
+        constraints = [
+            models.UniqueConstraint(fields=("chat", "seq"), name="chat_event_seq_unique"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.type} event {self.seq} in {self.chat_id} chat"  # noqa
@@ -1,12 +1,21 @@
 import os
+import typing
 import urllib.parse
+from datetime import datetime
 
 from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import models
 from rest_framework import serializers
 
 from common.services import datetime_to_timezone
 from messenger.models import Chat, Message
-from users.serializers import UserDefaultSerializer
+from messenger.services import get_read_watermarks
+from users.serializers import PresenceListSerializer, PresenceSerializerMixin, UserDefaultSerializer
+
+User = get_user_model()
+
+MESSAGE_TIME_FIELDS = "time_added", "time_updated"
 
 
 class FileField(serializers.FileField):
@@ -17,15 +26,28 @@ class FileField(serializers.FileField):
         return {"link": urllib.parse.urljoin(media_url, str(value)), "name": os.path.basename(str(value))}
 
 
-class MessageSerializer(serializers.ModelSerializer):
+class MessageListSerializer(PresenceListSerializer):
+    def to_representation(self, data: typing.Union[models.manager.BaseManager, typing.Iterable[models.Model]]) -> list:
+        instances = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        self.context.setdefault("read_watermarks", {}).update(
+            get_read_watermarks({instance.chat_id for instance in instances})
+        )
+        return super().to_representation(instances)
+
+
+class MessageSerializer(PresenceSerializerMixin, serializers.ModelSerializer):
     sender = UserDefaultSerializer()
     receiver = UserDefaultSerializer()
     time_added = serializers.SerializerMethodField()
     time_updated = serializers.SerializerMethodField()
     attachment = FileField()
+    is_read = serializers.SerializerMethodField()
+
+    presence_user_fields = "sender_id", "receiver_id"
 
     class Meta:
         model = Message
+        list_serializer_class = MessageListSerializer
         fields = (
             "id",
             "chat",
@@ -37,6 +59,7 @@ class MessageSerializer(serializers.ModelSerializer):
             "time_updated",
             "is_edit",
             "is_read",
+            "seq",
         )
 
     def get_time_added(self, instance: Message) -> dict:
@@ -47,19 +70,118 @@ class MessageSerializer(serializers.ModelSerializer):
             instance.time_updated, self.context["user"].timezone, attribute_name="time_updated", to_timesince=False
         )
 
+    def get_is_read(self, instance: Message) -> bool:
+        watermarks = self.context.setdefault("read_watermarks", {})
+        if (instance.chat_id, instance.receiver_id) not in watermarks:
+            watermarks.update(get_read_watermarks([instance.chat_id]))
+        return instance.id <= (watermarks.get((instance.chat_id, instance.receiver_id)) or 0)
+
 
-class ChatSerializer(serializers.ModelSerializer):
+class ChatSerializer(PresenceSerializerMixin, serializers.ModelSerializer):
     user = serializers.SerializerMethodField()
     last_message = serializers.SerializerMethodField()
+    unread_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Chat
-        fields = "id", "user", "last_message", "is_read"
+        fields = "id", "user", "last_message", "is_read", "unread_count", "seq"
+        list_serializer_class = PresenceListSerializer
+
+    def get_presence_user_ids(self, instance: Chat) -> list[int]:
+        return [instance.companion_pk]
 
     def get_user(self, instance: Chat) -> dict:
-        user = instance.members.exclude(id=self.context["user"].id)[0]
-        return UserDefaultSerializer(instance=user).data
+        user = User(id=instance.companion_pk, username=instance.companion_username, avatar=instance.companion_avatar)
+        return UserDefaultSerializer(instance=user, context=self.context).data
 
     def get_last_message(self, instance: Chat) -> dict:
-        message = instance.messages.filter(is_delete=False).order_by("-time_added").first()  # noqa
-        return MessageSerializer(instance=message, context=self.context).data
+        self.context.setdefault("read_watermarks", {}).update(
+            get_chat_read_watermarks(instance, self.context["user"].id)
+        )
+        return MessageSerializer(instance=instance.last_message, context=self.context).data
+
+
+def get_chat_read_watermarks(chat: Chat, user_id: int) -> dict[tuple[int, int], int | None]:
+    return {
+        (chat.id, user_id): chat.last_read_message_id,
+        (chat.id, chat.companion_pk): chat.companion_last_read_message_id,
+    }
+
+
+def get_message_times(time_added: datetime, time_updated: datetime, timezone: str) -> dict:
+    return {
+        "time_added": datetime_to_timezone(time_added, timezone, to_timesince=False),
+        "time_updated": datetime_to_timezone(time_updated, timezone, attribute_name="time_updated", to_timesince=False),
+    }
+
+
+def serialize_message_broadcast(
+    message: Message, timezones: typing.Iterable[str], read_watermarks: typing.Optional[dict] = None
+) -> dict:
+    """
+    Serializes message once for all chat members. Only the time fields depend on the viewer,
+    so they are rendered for every given timezone and merged in by `localize_message_broadcast`.
+    """
+
+    context = {"user": message.sender, "read_watermarks": dict(read_watermarks or {})}
+    payload = dict(MessageSerializer(instance=message, context=context).data)
+    for field in MESSAGE_TIME_FIELDS:
+        payload.pop(field)
+
+    return {
+        "payload": payload,
+        "time_added": message.time_added.isoformat(),
+        "time_updated": message.time_updated.isoformat(),
+        "times": {
+            timezone: get_message_times(message.time_added, message.time_updated, timezone)
+            for timezone in set(timezones)
+        },
+    }
+
+
+def localize_message_broadcast(broadcast: dict, timezone: str) -> dict:
+    times = broadcast["times"].get(timezone) or get_message_times(
+        datetime.fromisoformat(broadcast["time_added"]), datetime.fromisoformat(broadcast["time_updated"]), timezone
+    )
+    return {**broadcast["payload"], **times}
+
+
+def serialize_chat_broadcast(chat: Chat, user: User) -> dict:
+    """Serializes chat annotated for `user` once, so every member can render it as its own chat entity."""
+
+    companion = User(id=chat.companion_pk, username=chat.companion_username, avatar=chat.companion_avatar)
+    users = UserDefaultSerializer([user, companion], many=True).data
+    last_message = chat.last_message
+
+    return {
+        "id": chat.id,
+        "is_read": chat.is_read,
+        "seq": chat.seq,
+        "users": {str(member["id"]): member for member in users},
+        "unread_counts": {str(user.id): chat.unread_count, str(chat.companion_pk): chat.companion_unread_count},
+        "last_message": (
+            serialize_message_broadcast(
+                last_message,
+                (last_message.sender.timezone, last_message.receiver.timezone),
+                get_chat_read_watermarks(chat, user.id),
+            )
+            if last_message
+            else None
+        ),
+    }
+
+
+def localize_chat_broadcast(broadcast: dict, user: User) -> dict:
+    last_message = broadcast["last_message"]
+    return {
+        "id": broadcast["id"],
+        "user": next(member for pk, member in broadcast["users"].items() if pk != str(user.id)),
+        "last_message": (
+            localize_message_broadcast(last_message, user.timezone)
+            if last_message
+            else MessageSerializer(context={"user": user}).data
+        ),
+        "is_read": broadcast["is_read"],
+        "unread_count": broadcast["unread_counts"][str(user.id)],
+        "seq": broadcast["seq"],
+    }
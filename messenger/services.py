@@ -1,25 +1,23 @@
 import typing
+from datetime import datetime, timedelta
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.core.files.base import ContentFile
-from django.db.models import Q
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Exists, F, FilteredRelation, OuterRef, Q, QuerySet, Subquery
+from django.utils import timezone
 
+from common.services import decode_cursor
 
-def get_current_user(user_id: int, set_online: bool = False) -> "User":
-    User = get_user_model()
-    user = User.objects.get(pk=user_id)
-    if set_online:
-        user.is_online = True
-        user.save()
-    return user
+if typing.TYPE_CHECKING:
+    from messenger.models import Chat, ChatEvent, Message
+    from users.models import ExwonderUser as User
 
 
-def set_user_offline(user: "User") -> "User":
+def get_current_user(user_id: int) -> "User":
     User = get_user_model()
-    user = User.objects.get(pk=user.id)
-    user.is_online = False
-    user.save()
-    return user
+    return User.objects.get(pk=user_id)
 
 
 def get_message(pk: int) -> "Message":
@@ -28,102 +26,299 @@ def get_message(pk: int) -> "Message":
     return Message.objects.select_related("chat", "sender", "receiver").get(pk=pk)  # noqa
 
 
-def get_new_chat_entity(message_pk: int) -> "Chat":
-    from messenger.models import Message
+def annotate_chats_queryset(queryset: QuerySet, user: "User") -> QuerySet:
+    return (
+        queryset.annotate(
+            membership=FilteredRelation("memberships", condition=Q(memberships__user_id=user.id)),
+            companion=FilteredRelation("memberships", condition=~Q(memberships__user_id=user.id)),
+            companion_user=FilteredRelation("companion__user"),
+        )
+        .filter(membership__isnull=False, companion__isnull=False)
+        .annotate(
+            unread_count=F("membership__unread_count"),
+            last_read_message_id=F("membership__last_read_message_id"),
+            companion_pk=F("companion__user_id"),
+            companion_username=F("companion_user__username"),
+            companion_avatar=F("companion_user__avatar"),
+            companion_last_read_message_id=F("companion__last_read_message_id"),
+            companion_unread_count=F("companion__unread_count"),
+        )
+        .select_related("last_message__sender", "last_message__receiver")
+    )
 
-    return Message.objects.select_related("chat").prefetch_related("chat__members").get(pk=message_pk).chat  # noqa
 
+def get_new_chat_entity(message_pk: int, user: "User") -> "Chat":
+    from messenger.models import Chat
 
-def get_chats(user: "User") -> list["Chat"]:
-    return list(user.chats.prefetch_related("members", "messages").filter(is_delete=False))
+    return annotate_chats_queryset(Chat.objects.filter(messages__id=message_pk), user).get()  # noqa
 
 
-def get_chat(pk: int) -> "Chat":
+def get_chats(user: "User", cursor: str | None, limit: int) -> list["Chat"]:
+    """Chats of the user by last activity, paged on `chats_members_activity_index` of the user memberships."""
+
     from messenger.models import Chat
 
-    return Chat.objects.prefetch_related("members", "messages").get(pk=pk)  # noqa
+    queryset = annotate_chats_queryset(Chat.objects.filter(is_delete=False), user)  # noqa
+    if position := decode_cursor(cursor):
+        last_activity_at, pk = position
+        queryset = queryset.filter(
+            Q(membership__last_activity_at__lt=last_activity_at)
+            | Q(membership__last_activity_at=last_activity_at, membership__chat_id__lt=pk)
+        )
+
+    queryset = queryset.annotate(member_activity_at=F("membership__last_activity_at"))
+    return list(queryset.order_by("-membership__last_activity_at", "-membership__chat_id")[:limit])
 
 
-def get_messages_in_chat(chat: int) -> list["Messages"]:
+def get_chat(pk: int, user: "User") -> "Chat":
     from messenger.models import Chat
 
-    return list(Chat.objects.get(pk=chat).messages.select_related("sender", "receiver").filter(is_delete=False))  # noqa
+    return annotate_chats_queryset(Chat.objects.filter(pk=pk), user).get()  # noqa
+
+
+def get_chat_members_ids(pk: int) -> list[int]:
+    from messenger.models import ChatMember
+
+    return list(ChatMember.objects.filter(chat_id=pk).values_list("user_id", flat=True))  # noqa
+
+
+def get_read_watermarks(chats: typing.Iterable[int]) -> dict[tuple[int, int], int | None]:
+    from messenger.models import ChatMember
+
+    memberships = ChatMember.objects.filter(chat_id__in=set(chats))  # noqa
+    return {
+        (chat, user): last_read_message
+        for chat, user, last_read_message in memberships.values_list("chat_id", "user_id", "last_read_message_id")
+    }
+
+
+def get_messages_in_chat(chat: int, before: str | None, after: str | None, limit: int) -> list["Message"]:
+    from messenger.models import Message
+
+    queryset = Message.objects.select_related("sender", "receiver").filter(chat_id=chat, is_delete=False)  # noqa
+
+    if position := decode_cursor(after):
+        time_added, pk = position
+        queryset = queryset.filter(Q(time_added__gt=time_added) | Q(time_added=time_added, id__gt=pk))
+        return list(reversed(queryset.order_by("time_added", "id")[:limit]))
+
+    if position := decode_cursor(before):
+        time_added, pk = position
+        queryset = queryset.filter(Q(time_added__lt=time_added) | Q(time_added=time_added, id__lt=pk))
+    return list(queryset.order_by("-time_added", "-id")[:limit])
 
 
 def create_chat(receiver: int | str, user: "User") -> tuple["Chat", "User"]:
     from messenger.models import Chat
 
     User = get_user_model()  # noqa
-    second_member = User.objects.filter(**{"pk" if isinstance(receiver, int) else "username": receiver})
+    second_member = User.objects.filter(**{"pk" if isinstance(receiver, int) else "username": receiver}).first()
 
-    if not len(second_member):
+    if not second_member or second_member.id == user.id:
         return None, None
 
-    second_member = second_member[0]
+    min_user, max_user = sorted((user.id, second_member.id))
 
-    removed_chat = Chat.objects.filter(Q(members__id=second_member.id) & Q(members__id=user.id))  # noqa
+    with transaction.atomic():
+        chat, created = Chat.objects.get_or_create(min_user_id=min_user, max_user_id=max_user)  # noqa
+        if created:
+            chat.members.add(user, second_member, through_defaults={"last_activity_at": chat.last_activity_at})
+        elif chat.is_delete:
+            Chat.objects.filter(pk=chat.pk).update(is_delete=False)  # noqa
+    return chat, second_member
 
-    if removed_chat.exists():
-        chat = removed_chat[0]
-        chat.is_delete = False
-        chat.save()
-        return chat
 
-    chat = Chat.objects.create()  # noqa
-    members = User.objects.filter(pk__in={second_member.id, user.id})
-    chat.members.add(*list(members))
-    return chat, second_member
+def next_chat_seq(chat: int, **chat_fields) -> int:
+    from messenger.models import Chat, ChatMember
 
+    Chat.objects.filter(pk=chat).update(seq=F("seq") + 1, **chat_fields)  # noqa
+    if "last_activity_at" in chat_fields:
+        ChatMember.objects.filter(chat_id=chat).update(last_activity_at=chat_fields["last_activity_at"])  # noqa
+    return Chat.objects.filter(pk=chat).values_list("seq", flat=True).get()  # noqa
 
-def create_message(
-    chat: int, receiver: int, body: str | None, attachment: typing.Any, attachment_name: str | None, user: "User"
-) -> "Message":
-    from messenger.models import Chat, Message
 
-    file = ContentFile(attachment, name=attachment_name) if attachment else None
+def record_chat_event(chat: int, type_: str, message: int | None = None, user: int | None = None, **chat_fields) -> int:
+    """Records the event with the next seq of the chat. READ events keep the reader and its new watermark."""
 
-    chat = Chat.objects.get(pk=chat)
-    chat.is_read = False
-    chat.save()
-    return Message.objects.create(  # noqa
-        chat=chat, sender=user, receiver_id=receiver, body=body, attachment=file
-    )
+    from messenger.models import ChatEvent
 
+    seq = next_chat_seq(chat, **chat_fields)
+    ChatEvent.objects.create(chat_id=chat, seq=seq, type=type_, message_id=message, user_id=user)  # noqa
+    return seq
 
-def mark_message(pk: int, **kwargs) -> "Message":
-    from messenger.models import Message
 
-    message = Message.objects.select_related("chat").prefetch_related("chat__messages").get(pk=pk)  # noqa
-    for key, value in kwargs.items():
-        setattr(message, key, value)
-    message.save()
-    if "is_delete" in kwargs:
-        new_last_message = message.chat.messages.filter(is_delete=False).order_by("-time_added").first()
-        message.chat.is_read = new_last_message.is_read if new_last_message else True
-        message.chat.save()
+def create_message(chat: int, receiver: int, body: str | None, attachment: File | None, user: "User") -> "Message":
+    from messenger.models import Chat, ChatEvent, ChatMember, Message
 
+    with transaction.atomic():
+        seq = next_chat_seq(chat, is_read=False)
+        message = Message.objects.create(  # noqa
+            chat_id=chat, sender=user, receiver_id=receiver, body=body, attachment=attachment, seq=seq
+        )
+        Chat.objects.filter(pk=chat).update(last_message=message, last_activity_at=message.time_added)  # noqa
+        ChatMember.objects.filter(chat_id=chat, user_id=user.id).update(  # noqa
+            last_read_message=message, unread_count=0, last_activity_at=message.time_added
+        )
+        ChatMember.objects.filter(chat_id=chat, user_id=receiver).update(  # noqa
+            unread_count=F("unread_count") + 1, last_activity_at=message.time_added
+        )
+        ChatEvent.objects.create(chat_id=chat, seq=seq, type=ChatEvent.EventType.MESSAGE, message=message)  # noqa
     return message
 
 
-def mark_chat(pk: int, **kwargs) -> "Chat":
-    from messenger.models import Chat
+def mark_message(pk: int, **kwargs) -> "Message":
+    """
+    Updates the message and records a DELETE event. The message row is locked, a message which already has
+    the values is returned as is with `event_seq` None, so a repeated delete produces no event.
+    """
+
+    from messenger.models import ChatEvent, ChatMember, Message
+
+    with transaction.atomic():
+        message = Message.objects.select_related("chat").select_for_update(of=("self",)).get(pk=pk)  # noqa
+        if all(getattr(message, key) == value for key, value in kwargs.items()):
+            message.event_seq = None
+            return message
+
+        for key, value in kwargs.items():
+            setattr(message, key, value)
+        message.save()
+
+        receiver_membership = ChatMember.objects.filter(chat_id=message.chat_id, user_id=message.receiver_id)  # noqa
+        last_read_message = receiver_membership.values_list("last_read_message_id", flat=True).first() or 0
+        if kwargs.get("is_delete") and message.id > last_read_message:
+            receiver_membership.filter(unread_count__gt=0).update(unread_count=F("unread_count") - 1)
+
+        chat_fields = {}
+        if "is_delete" in kwargs and message.chat.last_message_id == message.id:
+            new_last_message = (
+                Message.objects.filter(chat_id=message.chat_id, is_delete=False).order_by("-time_added", "-id").first()  # noqa
+            )
+            chat_fields = {
+                "last_message": new_last_message,
+                "is_read": new_last_message.id <= last_read_message if new_last_message else True,
+            }
+        message.event_seq = record_chat_event(message.chat_id, ChatEvent.EventType.DELETE, message.id, **chat_fields)
+
+    return message
+
+
+def read_chat(pk: int, user: "User") -> typing.Optional["Chat"]:
+    """
+    Moves the read watermark of the user forward to the last message of the chat. The chat row is locked, so
+    a message created meanwhile can not be counted as read. Returns None if the watermark is already there or
+    past it, e.g. after the newest message was deleted.
+    """
+
+    from messenger.models import Chat, ChatEvent, ChatMember
 
-    chat = Chat.objects.get(pk=pk)  # noqa
-    chat.messages.update(**kwargs)
-    for key, value in kwargs.items():
-        setattr(chat, key, value)
-    chat.save()
+    with transaction.atomic():
+        chat = Chat.objects.select_for_update().get(pk=pk)  # noqa
+        if chat.last_message_id is None:
+            return None
+
+        updated = (
+            ChatMember.objects.filter(chat_id=pk, user_id=user.id)  # noqa
+            .filter(Q(last_read_message__isnull=True) | Q(last_read_message_id__lt=chat.last_message_id))
+            .update(last_read_message_id=chat.last_message_id, unread_count=0)
+        )
+        if not updated:
+            return None
+
+        chat.is_read = True
+        chat.seq = record_chat_event(pk, ChatEvent.EventType.READ, chat.last_message_id, user.id, is_read=True)
     return chat
 
 
-def edit_message(message: int, body: str, attachment: typing.Any, attachment_name: str | None) -> "Message":
-    from messenger.models import Message
+def mark_chat(pk: int, **kwargs) -> "Chat":
+    """Deletes the chat with its messages, so a chat restored by `create_chat` starts without them."""
+
+    from messenger.models import Chat, ChatEvent, ChatMember
+
+    with transaction.atomic():
+        chat = Chat.objects.get(pk=pk)  # noqa
+        chat.messages.update(**kwargs)
+        ChatMember.objects.filter(chat_id=pk).update(unread_count=0)  # noqa
+        for key, value in kwargs.items():
+            setattr(chat, key, value)
+        chat.last_message = None
+        chat.seq = record_chat_event(chat.pk, ChatEvent.EventType.DELETE_CHAT, last_message=None, **kwargs)
+    return chat
+
 
-    message = Message.objects.select_related("chat").get(pk=message)  # noqa
-    message.body = body
-    if attachment and attachment_name:
-        file = ContentFile(attachment, name=attachment_name)
-        message.attachment = file
-    message.is_edit = True
-    message.save()
+def get_chat_events(user: "User", chats: typing.Mapping[int, int], limit: int) -> list["ChatEvent"]:
+    from messenger.models import ChatEvent, ChatMember
+
+    condition = Q()
+    for chat, seq in chats.items():
+        condition |= Q(chat_id=chat, seq__gt=seq)
+    if not condition:
+        return []
+
+    membership = ChatMember.objects.filter(chat_id=OuterRef("chat_id"), user_id=user.id)  # noqa
+    return list(
+        ChatEvent.objects.filter(condition)  # noqa
+        .filter(Exists(membership))
+        .select_related("message__sender", "message__receiver")
+        .order_by("chat_id", "seq")[:limit]
+    )
+
+
+def get_resync_chats(user: "User", chats: typing.Mapping[int, int]) -> list[int]:
+    """Returns chats of `user` whose events after the client's seq were partly dropped by the retention."""
+
+    from messenger.models import Chat, ChatEvent
+
+    first_seq = ChatEvent.objects.filter(chat_id=OuterRef("pk")).order_by("seq").values("seq")[:1]
+    rows = (
+        Chat.objects.filter(pk__in=chats, memberships__user_id=user.id)  # noqa
+        .annotate(first_seq=Subquery(first_seq))
+        .values_list("pk", "seq", "first_seq")
+    )
+    return [pk for pk, seq, first in rows if seq > chats[pk] and (first is None or first > chats[pk] + 1)]
+
+
+def delete_expired_chat_events_batch(older_than: datetime, batch_size: int) -> int:
+    from messenger.models import ChatEvent
+
+    ids = list(
+        ChatEvent.objects.filter(time_added__lt=older_than)  # noqa
+        .order_by("pk")
+        .values_list("id", flat=True)[:batch_size]
+    )
+    if ids:
+        ChatEvent.objects.filter(pk__in=ids).delete()  # noqa
+    return len(ids)
+
+
+def apply_chat_events_retention() -> int:
+    """
+    Deletes chat events older than `MESSENGER_CHAT_EVENTS_RETENTION_DAYS`, at most
+    `MESSENGER_CHAT_EVENTS_RETENTION_MAX_BATCHES` batches per run. Clients behind the kept events get a resync.
+    Returns deleted rows count.
+    """
+
+    older_than = timezone.now() - timedelta(days=settings.MESSENGER_CHAT_EVENTS_RETENTION_DAYS)
+    count = 0
+    for _ in range(settings.MESSENGER_CHAT_EVENTS_RETENTION_MAX_BATCHES):
+        batch_count = delete_expired_chat_events_batch(older_than, settings.MESSENGER_CHAT_EVENTS_RETENTION_BATCH_SIZE)
+        count += batch_count
+        if batch_count < settings.MESSENGER_CHAT_EVENTS_RETENTION_BATCH_SIZE:
+            break
+    return count
+
+
+def edit_message(message: int, body: str, attachment: File | None) -> "Message":
+    from messenger.models import ChatEvent, Message
+
+    with transaction.atomic():
+        message = Message.objects.select_related("chat").get(pk=message)  # noqa
+        message.body = body
+        if attachment:
+            message.attachment = attachment
+        message.is_edit = True
+        message.save()
+
+        chat_fields = {"last_activity_at": message.time_updated} if message.chat.last_message_id == message.id else {}
+        message.event_seq = record_chat_event(message.chat_id, ChatEvent.EventType.EDIT, message.id, **chat_fields)
     return message
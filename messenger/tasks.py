@@ -0,0 +1,41 @@
+from asgiref.sync import async_to_sync
+from celery import shared_task
+from channels.layers import get_channel_layer
+from django.contrib.auth import get_user_model
+
+from messenger import services, uploads
+from users.presence import get_presence_group_name, is_user_online, pop_expired_users, set_announced_status
+from users.serializers import UserDefaultSerializer
+
+User = get_user_model()
+
+
+@shared_task
+def announce_user_offline(user_id: int) -> None:
+    if is_user_online(user_id) or not set_announced_status(user_id, False):
+        return
+
+    user = User.objects.filter(pk=user_id).first()
+    if user is None:
+        return
+
+    payload = UserDefaultSerializer(instance=user).data
+    async_to_sync(get_channel_layer().group_send)(
+        get_presence_group_name(user_id), {"type": "user_offline", "user": payload}
+    )
+
+
+@shared_task
+def sweep_presence() -> None:
+    for user_id in pop_expired_users():
+        announce_user_offline(user_id)
+
+
+@shared_task
+def remove_stale_uploads() -> None:
+    uploads.remove_stale_uploads()
+
+
+@shared_task
+def apply_chat_events_retention() -> None:
+    services.apply_chat_events_retention()
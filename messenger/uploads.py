@@ -0,0 +1,124 @@
+import os
+import struct
+import time
+import typing
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files import File
+
+CHUNK_HEADER = struct.Struct("!16sQ")  # upload id bytes, chunk offset
+
+
+class UploadedAttachment(File):
+    """Finished upload. File system storage moves it into place instead of copying it chunk by chunk."""
+
+    def temporary_file_path(self) -> str:
+        return self.file.name
+
+
+def _upload_key(upload_id: str) -> str:
+    return f"{settings.MESSENGER_UPLOADS_CACHE_NAME}{settings.USER_RELATED_CACHE_NAME_SEP}{upload_id}"
+
+
+def _upload_lock_key(upload_id: str) -> str:
+    return f"{settings.MESSENGER_UPLOAD_LOCKS_CACHE_NAME}{settings.USER_RELATED_CACHE_NAME_SEP}{upload_id}"
+
+
+def _upload_path(upload_id: str) -> str:
+    return os.path.join(settings.MESSENGER_UPLOADS_TEMP_DIR, upload_id)
+
+
+def get_upload(user_id: int, upload_id: str) -> typing.Optional[typing.Dict]:
+    upload = cache.get(_upload_key(upload_id))
+    if not upload or upload["user"] != user_id:
+        return None
+    return upload
+
+
+def start_upload(
+    user_id: int, name: str, size: int, upload_id: typing.Optional[str] = None
+) -> typing.Optional[typing.Dict]:
+    """Starts new upload, or returns state of the unfinished one, so the client can resume it from its offset."""
+
+    if upload_id:
+        return get_upload(user_id, upload_id)
+
+    if not name or not 0 < size <= settings.MESSENGER_UPLOAD_MAX_SIZE:
+        return None
+
+    upload = {"id": uuid.uuid4().hex, "user": user_id, "name": os.path.basename(name), "size": size, "offset": 0}
+    os.makedirs(settings.MESSENGER_UPLOADS_TEMP_DIR, exist_ok=True)
+    open(_upload_path(upload["id"]), "wb").close()
+    cache.set(_upload_key(upload["id"]), upload, settings.MESSENGER_UPLOAD_CACHE_TIME)
+    return upload
+
+
+def parse_chunk(frame: bytes) -> typing.Tuple[str, int, bytes]:
+    upload_id, offset = CHUNK_HEADER.unpack_from(frame)
+    return uuid.UUID(bytes=upload_id).hex, offset, frame[CHUNK_HEADER.size :]
+
+
+def write_chunk(user_id: int, upload_id: str, offset: int, data: bytes) -> typing.Optional[typing.Dict]:
+    """
+    Appends chunk to the upload temp file. Chunks not matching the current offset (duplicates after
+    reconnect, reordered frames) are ignored, the returned state tells the client where to continue.
+    Chunks longer than `MESSENGER_UPLOAD_CHUNK_SIZE` or going past the declared size are rejected.
+    The upload is locked while the chunk is written, so concurrent connections of the user
+    can't both accept a chunk at the same offset; a chunk arriving meanwhile is ignored.
+    """
+
+    upload = get_upload(user_id, upload_id)
+    if not upload or len(data) > settings.MESSENGER_UPLOAD_CHUNK_SIZE or offset + len(data) > upload["size"]:
+        return None
+
+    lock_key = _upload_lock_key(upload_id)
+    if offset != upload["offset"] or not cache.add(lock_key, True, settings.MESSENGER_UPLOAD_LOCK_CACHE_TIME):
+        return upload
+
+    try:
+        upload = get_upload(user_id, upload_id)
+        if not upload or offset != upload["offset"]:
+            return upload
+
+        with open(_upload_path(upload_id), "r+b") as file:
+            file.seek(offset)
+            file.write(data)
+
+        upload["offset"] = offset + len(data)
+        cache.set(_upload_key(upload_id), upload, settings.MESSENGER_UPLOAD_CACHE_TIME)
+        return upload
+    finally:
+        cache.delete(lock_key)
+
+
+def is_upload_complete(upload: typing.Dict) -> bool:
+    return upload["offset"] == upload["size"]
+
+
+def pop_upload_file(user_id: int, upload_id: str) -> typing.Optional[UploadedAttachment]:
+    upload = get_upload(user_id, upload_id)
+    if not upload or not is_upload_complete(upload):
+        return None
+
+    cache.delete(_upload_key(upload_id))
+    return UploadedAttachment(open(_upload_path(upload_id), "rb"), name=upload["name"])
+
+
+def remove_stale_uploads() -> int:
+    """Removes temp files of uploads abandoned by clients. Returns the number of removed files."""
+
+    if not os.path.isdir(settings.MESSENGER_UPLOADS_TEMP_DIR):
+        return 0
+
+    removed = 0
+    expired_before = time.time() - settings.MESSENGER_UPLOAD_CACHE_TIME
+    for entry in os.scandir(settings.MESSENGER_UPLOADS_TEMP_DIR):
+        if entry.stat().st_mtime < expired_before and not cache.get(_upload_key(entry.name)):
+            try:
+                os.remove(entry.path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
@@ -1,11 +1,20 @@
 from django.contrib import admin
 
-from notifications.models import Notification
+from notifications.models import ArchivedNotification, Notification
 
 
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
-    list_display = "recipient", "post", "time_added"
+    list_display = "recipient", "post", "posts_count", "time_added", "time_updated"
+    list_display_links = "recipient", "post"
+    list_per_page = 50
+    ordering = ("-time_added",)
+    search_fields = "recipient__username", "post__id"
+
+
+@admin.register(ArchivedNotification)
+class ArchivedNotificationAdmin(admin.ModelAdmin):
+    list_display = "recipient", "post", "posts_count", "time_added", "time_archived"
     list_display_links = "recipient", "post"
     list_per_page = 50
     ordering = ("-time_added",)
@@ -1,8 +1,20 @@
-import json
-
 from channels.db import database_sync_to_async
+from django.conf import settings
 
 from common.consumers import CommonConsumer
+from common.metrics import observe_websocket_messages
+from common.profiling import profile_websocket_messages
+from common.services import encode_cursor, get_page_size
+from notifications.services import (
+    get_unread_notifications,
+    get_unread_notifications_count,
+    mark_all_notifications_read,
+    mark_notification_read,
+)
+
+NOTIFICATIONS_MESSAGE_TYPES = frozenset(
+    ("authenticate", "get_unreaded_notifications", "get_unread_count", "mark_read", "mark_all_read")
+)
 
 
 class NotificationConsumer(CommonConsumer):
@@ -19,52 +31,58 @@ class NotificationConsumer(CommonConsumer):
         await self.channel_layer.group_add(self.group_name, self.channel_name)
 
     async def receive(self, text_data=None, bytes_data=None):
-        data = json.loads(text_data)
+        await self.receive_notifications(self.decode_payload(text_data, bytes_data))
+
+    @profile_websocket_messages("notifications")
+    @observe_websocket_messages("notifications", NOTIFICATIONS_MESSAGE_TYPES)
+    async def receive_notifications(self, data: dict) -> None:
         type_ = data.get("type")
 
         match type_:
             case "authenticate":
                 await self.authenticate(data.get("token"), data.get("user_id"))
             case "get_unreaded_notifications":
-                await self.return_unreaded_notifications()
+                await self.return_unreaded_notifications(data)
+            case "get_unread_count":
+                count = await database_sync_to_async(get_unread_notifications_count)(self.user_id)
+                await self.send_payload({"type": "unread_count", "unread_count": count})
             case "mark_read":
-                await database_sync_to_async(self.mark_read)(data.get("id"))
+                if pk := data.get("id"):
+                    count = await database_sync_to_async(mark_notification_read)(self.user_id, pk)
+                    await self.announce_unread_count(count)
             case "mark_all_read":
-                await database_sync_to_async(self.mark_all_read)()
+                count = await database_sync_to_async(mark_all_notifications_read)(self.user_id)
+                await self.announce_unread_count(count)
 
-    async def return_unreaded_notifications(self):
-        payload = []
-        notifications = await database_sync_to_async(self.get_unreaded_notifications)()
-        if len(notifications):
-            from notifications.serializers import NotificationSerializer
+    async def return_unreaded_notifications(self, data: dict) -> None:
+        from notifications.serializers import NotificationSerializer
 
-            payload = NotificationSerializer(notifications, many=True).data
-
-        await self.send(text_data=json.dumps({"type": "get_unreaded_notifications", "payload": payload}))
-
-    def mark_read(self, pk: int):
-        if pk:
-            from notifications.models import Notification
+        limit = get_page_size(data.get("limit"), settings.NOTIFICATIONS_PAGE_SIZE, settings.NOTIFICATIONS_MAX_PAGE_SIZE)
+        notifications = await database_sync_to_async(get_unread_notifications)(self.user_id, data.get("cursor"), limit)
+        payload = await database_sync_to_async(lambda: NotificationSerializer(notifications, many=True).data)()
+        cursor = (
+            encode_cursor(notifications[-1].time_updated, notifications[-1].id) if len(notifications) == limit else None
+        )
 
-            Notification.objects.select_related("recipient").filter(recipient__id=self.user_id, pk=pk).update(
-                is_read=True
-            )
+        await self.send_payload({"type": "get_unreaded_notifications", "payload": payload, "cursor": cursor})
 
-    def mark_all_read(self):
-        from notifications.models import Notification
+    async def announce_unread_count(self, count: int) -> None:
+        if self.group_name:
+            await self.channel_layer.group_send(self.group_name, {"type": "unread_count", "unread_count": count})
 
-        Notification.objects.select_related("recipient").filter(recipient__id=self.user_id, is_read=False).update(
-            is_read=True
+    async def notify(self, event):
+        await self.send_event(
+            {"type": "notify", "payload": event["payload"], "unread_count": event.get("unread_count")},
+            coalesce_key=f"notify:{event['payload']['id']}",
         )
 
-    def get_unreaded_notifications(self):
-        from notifications.models import Notification
-
-        return list(
-            Notification.objects.select_related("recipient", "post__author").filter(
-                recipient__id=self.user_id, is_read=False
-            )
+    async def notify_digest(self, event: dict) -> None:
+        await self.send_event(
+            {"type": "notify_digest", "payload": event["payload"], "unread_count": event.get("unread_count")},
+            coalesce_key="notify_digest",
         )
 
-    async def notify(self, event):
-        await self.send(text_data=json.dumps({"type": "notify", "payload": event["payload"]}))
+    async def unread_count(self, event: dict) -> None:
+        await self.send_event(
+            {"type": "unread_count", "unread_count": event["unread_count"]}, coalesce_key="unread_count"
+        )
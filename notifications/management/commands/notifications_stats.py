@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from notifications.retention import get_notifications_rows_stats, get_notifications_tables_stats
+
+
+class Command(BaseCommand):
+    help = "Reports notifications rows counts and, on PostgreSQL, tables sizes and bloat."
+
+    def handle(self, *args, **options) -> None:
+        for name, count in get_notifications_rows_stats().items():
+            self.stdout.write(f"{name:<12} {count}")
+
+        for table in get_notifications_tables_stats():
+            rows = table["live_rows"] + table["dead_rows"]
+            bloat = table["dead_rows"] / rows if rows else 0
+            self.stdout.write(
+                f"\n{table['table']}\n"
+                f"  live rows    {table['live_rows']}\n"
+                f"  dead rows    {table['dead_rows']} ({bloat:.1%})\n"
+                f"  total size   {filesizeformat(table['total_size'])}\n"
+                f"  indexes size {filesizeformat(table['indexes_size'])}\n"
+                f"  autovacuum   {table['last_autovacuum'] or 'never'}"
+            )
@@ -0,0 +1,54 @@
+# Generated by Django 5.1.1 on 2026-10-19 02:21
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.backends.base.schema import BaseDatabaseSchemaEditor
+from django.db.migrations.state import StateApps
+from django.db.models import F, OuterRef, Subquery
+
+
+def fill_notifications_authors(apps: StateApps, schema_editor: BaseDatabaseSchemaEditor) -> None:
+    Notification = apps.get_model("notifications", "Notification")
+    Post = apps.get_model("posts", "Post")
+
+    Notification.objects.update(
+        author_id=Subquery(Post.objects.filter(pk=OuterRef("post_id")).values("author_id")[:1]),
+        time_updated=F("time_added"),
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("notifications", "0002_alter_notification_options_notification_is_read"),
+        ("posts", "0013_post_pinned"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="notification",
+            name="author",
+            field=models.ForeignKey(
+                null=True, on_delete=django.db.models.deletion.CASCADE, related_name="+", to=settings.AUTH_USER_MODEL
+            ),
+        ),
+        migrations.AddField(
+            model_name="notification",
+            name="posts_count",
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name="notification",
+            name="time_updated",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(fill_notifications_authors, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["recipient", "author", "is_read", "-time_updated"], name="notifications_coalesce_index"
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.1 on 2026-10-19 02:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("notifications", "0003_notification_coalescing"),
+        ("posts", "0013_post_pinned"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["recipient", "is_read", "-time_added", "-id"], name="notifications_unread_index"
+            ),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.1.1 on 2026-10-19 02:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("notifications", "0004_notification_unread_index"),
+        ("posts", "0013_post_pinned"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedNotification",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("posts_count", models.PositiveIntegerField(default=1)),
+                ("time_added", models.DateTimeField()),
+                ("time_updated", models.DateTimeField()),
+                ("time_archived", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name": "Archived notification",
+                "verbose_name_plural": "Archived notifications",
+                "ordering": ("-time_added",),
+            },
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                condition=models.Q(("is_read", True)), fields=["time_updated"], name="notifications_read_index"
+            ),
+        ),
+        migrations.AddField(
+            model_name="archivednotification",
+            name="author",
+            field=models.ForeignKey(
+                null=True, on_delete=django.db.models.deletion.CASCADE, related_name="+", to=settings.AUTH_USER_MODEL
+            ),
+        ),
+        migrations.AddField(
+            model_name="archivednotification",
+            name="post",
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="+", to="posts.post"),
+        ),
+        migrations.AddField(
+            model_name="archivednotification",
+            name="recipient",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE, related_name="+", to=settings.AUTH_USER_MODEL
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="archivednotification",
+            index=models.Index(fields=["time_archived"], name="notifications_archived_index"),
+        ),
+    ]
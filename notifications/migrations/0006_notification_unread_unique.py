@@ -0,0 +1,53 @@
+# Generated by Django 5.1.1 on 2026-10-19 05:10
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import migrations, models
+from django.db.backends.base.schema import BaseDatabaseSchemaEditor
+from django.db.migrations.state import StateApps
+
+from common.operations import AddUniqueConstraintConcurrently
+
+MARK_DUPLICATES_READ_SQL = (
+    "UPDATE notifications_notification SET is_read = true WHERE NOT is_read AND id NOT IN "
+    "(SELECT MAX(id) FROM notifications_notification WHERE NOT is_read GROUP BY recipient_id, author_id) "
+    "RETURNING recipient_id"
+)
+
+
+def mark_duplicates_read(apps: StateApps, schema_editor: BaseDatabaseSchemaEditor) -> None:
+    """Keeps the latest unread notification per author, cached unread counters of the recipients are dropped."""
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(MARK_DUPLICATES_READ_SQL)
+        recipients = {recipient for (recipient,) in cursor.fetchall()}
+    cache.delete_many(
+        [
+            f"{settings.NOTIFICATIONS_UNREAD_COUNT_CACHE_NAME}{settings.USER_RELATED_CACHE_NAME_SEP}{recipient}"
+            for recipient in recipients
+        ]
+    )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("notifications", "0005_notification_retention"),
+    ]
+
+    operations = [
+        migrations.RunPython(mark_duplicates_read, migrations.RunPython.noop),
+        AddUniqueConstraintConcurrently(
+            model_name="notification",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("is_read", False)),
+                fields=("recipient", "author"),
+                name="notifications_unread_unique",
+            ),
+        ),
+        migrations.RemoveIndex(
+            model_name="notification",
+            name="notifications_coalesce_index",
+        ),
+    ]
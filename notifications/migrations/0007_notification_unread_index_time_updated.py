@@ -0,0 +1,25 @@
+# Generated by Django 5.1.1 on 2026-10-19 05:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("notifications", "0006_notification_unread_unique"),
+        ("posts", "0014_likes_saved_unique"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="notification",
+            name="notifications_unread_index",
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["recipient", "is_read", "-time_updated", "-id"], name="notifications_unread_index"
+            ),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from posts.models import Post
@@ -8,15 +9,55 @@ User = get_user_model()
 
 
 class Notification(models.Model):
+    """
+    Notification about new posts of one author. A recipient has a single unread notification per author,
+    posts published while it is unread are collapsed into it: `post` is the latest one and `posts_count`
+    is the number of posts.
+    """
+
     recipient = models.ForeignKey(User, related_name="notifications", on_delete=models.CASCADE)
+    author = models.ForeignKey(User, related_name="+", on_delete=models.CASCADE, null=True)
     post = models.ForeignKey(Post, related_name="notifications", on_delete=models.CASCADE)
+    posts_count = models.PositiveIntegerField(default=1)
     is_read = models.BooleanField(default=False)
     time_added = models.DateTimeField(auto_now_add=True)
+    time_updated = models.DateTimeField(default=timezone.now)
 
     class Meta:
         ordering = ("-time_added",)
         verbose_name = _("Notification")
         verbose_name_plural = _("Notifications")
+        indexes = (
+            models.Index(fields=("recipient", "is_read", "-time_updated", "-id"), name="notifications_unread_index"),
+            models.Index(fields=("time_updated",), condition=models.Q(is_read=True), name="notifications_read_index"),
+        )
+        constraints = (
+            models.UniqueConstraint(
+                fields=("recipient", "author"), condition=models.Q(is_read=False), name="notifications_unread_unique"
+            ),
+        )
 
     def __str__(self):
         return f"{self.recipient} notification about {self.post} post (read={self.is_read})"
+
+
+class ArchivedNotification(models.Model):
+    """Read notification moved out of the hot `Notification` table after `NOTIFICATIONS_RETENTION_DAYS`."""
+
+    id = models.BigIntegerField(primary_key=True)
+    recipient = models.ForeignKey(User, related_name="+", on_delete=models.CASCADE)
+    author = models.ForeignKey(User, related_name="+", on_delete=models.CASCADE, null=True)
+    post = models.ForeignKey(Post, related_name="+", on_delete=models.CASCADE)
+    posts_count = models.PositiveIntegerField(default=1)
+    time_added = models.DateTimeField()
+    time_updated = models.DateTimeField()
+    time_archived = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ("-time_added",)
+        verbose_name = _("Archived notification")
+        verbose_name_plural = _("Archived notifications")
+        indexes = (models.Index(fields=("time_archived",), name="notifications_archived_index"),)
+
+    def __str__(self):
+        return f"{self.recipient} archived notification about {self.post} post"
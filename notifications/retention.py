@@ -0,0 +1,109 @@
+import typing
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+ARCHIVED_FIELDS = "id", "recipient_id", "author_id", "post_id", "posts_count", "time_added", "time_updated"
+
+
+def archive_read_notifications_batch(older_than: datetime, batch_size: int) -> int:
+    """
+    Moves one batch of read notifications updated before `older_than` to the archive table.
+    Every batch is its own short transaction, so locks are held for one batch only.
+    """
+
+    from notifications.models import ArchivedNotification, Notification
+
+    with transaction.atomic():
+        notifications = list(
+            Notification.objects.select_for_update(skip_locked=True)  # noqa
+            .filter(is_read=True, time_updated__lt=older_than)
+            .order_by()
+            .values(*ARCHIVED_FIELDS)[:batch_size]
+        )
+        if not notifications:
+            return 0
+
+        now = timezone.now()
+        ArchivedNotification.objects.bulk_create(  # noqa
+            (ArchivedNotification(**notification, time_archived=now) for notification in notifications),
+            ignore_conflicts=True,
+        )
+        Notification.objects.filter(pk__in=[notification["id"] for notification in notifications]).delete()  # noqa
+    return len(notifications)
+
+
+def purge_archived_notifications_batch(older_than: datetime, batch_size: int) -> int:
+    from notifications.models import ArchivedNotification
+
+    ids = list(
+        ArchivedNotification.objects.filter(time_archived__lt=older_than)  # noqa
+        .order_by()
+        .values_list("id", flat=True)[:batch_size]
+    )
+    if ids:
+        ArchivedNotification.objects.filter(pk__in=ids).delete()  # noqa
+    return len(ids)
+
+
+def apply_notifications_retention() -> typing.Tuple[int, int]:
+    """
+    Archives read notifications older than `NOTIFICATIONS_RETENTION_DAYS` and purges archived ones older than
+    `NOTIFICATIONS_ARCHIVE_RETENTION_DAYS`, at most `NOTIFICATIONS_ARCHIVE_MAX_BATCHES` batches of each per run.
+    Returns archived and purged rows counts.
+    """
+
+    now = timezone.now()
+    counts = []
+    for run_batch, older_than in (
+        (archive_read_notifications_batch, now - timedelta(days=settings.NOTIFICATIONS_RETENTION_DAYS)),
+        (purge_archived_notifications_batch, now - timedelta(days=settings.NOTIFICATIONS_ARCHIVE_RETENTION_DAYS)),
+    ):
+        count = 0
+        for _ in range(settings.NOTIFICATIONS_ARCHIVE_MAX_BATCHES):
+            batch_count = run_batch(older_than, settings.NOTIFICATIONS_ARCHIVE_BATCH_SIZE)
+            count += batch_count
+            if batch_count < settings.NOTIFICATIONS_ARCHIVE_BATCH_SIZE:
+                break
+        counts.append(count)
+    return counts[0], counts[1]
+
+
+def get_notifications_rows_stats() -> typing.Dict[str, int]:
+    from notifications.models import ArchivedNotification, Notification
+
+    older_than = timezone.now() - timedelta(days=settings.NOTIFICATIONS_RETENTION_DAYS)
+    stats = Notification.objects.order_by().aggregate(  # noqa
+        total=Count("id"),
+        unread=Count("id", filter=Q(is_read=False)),
+        archivable=Count("id", filter=Q(is_read=True, time_updated__lt=older_than)),
+    )
+    stats["archived"] = ArchivedNotification.objects.count()  # noqa
+    return stats
+
+
+def get_notifications_tables_stats() -> typing.List[typing.Dict[str, typing.Any]]:
+    """Returns size and dead tuples of the notifications tables. Available on PostgreSQL only."""
+
+    from notifications.models import ArchivedNotification, Notification
+
+    if connection.vendor != "postgresql":
+        return []
+
+    tables = [Notification._meta.db_table, ArchivedNotification._meta.db_table]  # noqa
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT relname, n_live_tup, n_dead_tup, pg_total_relation_size(relid), pg_indexes_size(relid),
+                   last_autovacuum
+            FROM pg_stat_user_tables
+            WHERE relname = ANY(%s)
+            ORDER BY relname
+            """,
+            [tables],
+        )
+        columns = "table", "live_rows", "dead_rows", "total_size", "indexes_size", "last_autovacuum"
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
@@ -1,21 +1,75 @@
+import typing
+from datetime import datetime
+
 from rest_framework import serializers
 
 from common.services import datetime_to_timezone
 from notifications.models import Notification
-from users.serializers import UserDefaultSerializer
+from posts.models import Post
+from users.serializers import PresenceListSerializer, PresenceSerializerMixin, UserDefaultSerializer
 
 
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(PresenceSerializerMixin, serializers.ModelSerializer):
     receiver = serializers.SerializerMethodField()
     time_added = serializers.SerializerMethodField()
+    time_updated = serializers.SerializerMethodField()
+
+    presence_user_fields = ("post.author_id",)
 
     class Meta:
         model = Notification
-        fields = "id", "receiver", "is_read", "time_added"
-        read_only_fields = "receiver", "is_read", "time_added"
+        fields = "id", "receiver", "post", "posts_count", "is_read", "time_added", "time_updated"
+        read_only_fields = "receiver", "post", "posts_count", "is_read", "time_added", "time_updated"
+        list_serializer_class = PresenceListSerializer
 
     def get_receiver(self, instance: Notification) -> dict:
-        return UserDefaultSerializer(instance=instance.post.author).data
+        return UserDefaultSerializer(instance=instance.post.author, context=self.context).data
 
     def get_time_added(self, instance: Notification) -> dict:
         return datetime_to_timezone(instance.time_added, instance.recipient.timezone)
+
+    def get_time_updated(self, instance: Notification) -> dict:
+        return datetime_to_timezone(instance.time_updated, instance.recipient.timezone, "time_updated")
+
+
+class UnreadNotificationsCountSerializer(serializers.Serializer):
+    unread_count = serializers.IntegerField()
+
+
+class NotificationsPageSerializer(UnreadNotificationsCountSerializer):
+    results = NotificationSerializer(many=True)
+    cursor = serializers.CharField(allow_null=True)
+
+
+def serialize_notifications_broadcast(
+    post: Post, notifications: typing.Iterable[Notification], timezones: typing.Mapping[int, str]
+) -> typing.List[dict]:
+    """
+    Serializes notifications about one post in the `NotificationSerializer` shape. The post author is
+    serialized once and every time is rendered once per recipients timezone, not once per notification.
+    """
+
+    receiver = UserDefaultSerializer(instance=post.author).data
+    times = {}
+
+    def get_time(value: datetime, timezone: str, attribute_name: str) -> dict:
+        key = value.replace(microsecond=0), timezone, attribute_name
+        if key not in times:
+            times[key] = datetime_to_timezone(value, timezone, attribute_name)
+        return times[key]
+
+    payloads = []
+    for notification in notifications:
+        timezone = timezones[notification.recipient_id]
+        payloads.append(
+            {
+                "id": notification.id,
+                "receiver": receiver,
+                "post": post.id,
+                "posts_count": notification.posts_count,
+                "is_read": notification.is_read,
+                "time_added": get_time(notification.time_added, timezone, "time_added"),
+                "time_updated": get_time(notification.time_updated, timezone, "time_updated"),
+            }
+        )
+    return payloads
@@ -0,0 +1,317 @@
+import asyncio
+import typing
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from common.services import decode_cursor
+
+if typing.TYPE_CHECKING:
+    from notifications.models import Notification
+    from posts.models import Post
+
+# KEYS are counters followed by their versions. A missed counter is left to be counted on read,
+# its version is bumped instead, so a count which started before this change is not cached.
+INCREMENT_EXISTING_COUNTERS_SCRIPT = """
+local count = #KEYS / 2
+for index = 1, count do
+    if redis.call("EXISTS", KEYS[index]) == 0 or redis.call("INCRBY", KEYS[index], ARGV[1]) < 0 then
+        redis.call("DEL", KEYS[index])
+        redis.call("INCR", KEYS[count + index])
+        redis.call("EXPIRE", KEYS[count + index], ARGV[2])
+    end
+end
+"""
+# KEYS are counters followed by their versions, ARGV are the timeout, counts and versions read before counting.
+CACHE_COUNTERS_SCRIPT = """
+local count = #KEYS / 2
+for index = 1, count do
+    if (redis.call("GET", KEYS[count + index]) or "") == ARGV[1 + count + index] then
+        redis.call("SET", KEYS[index], ARGV[1 + index], "EX", ARGV[1], "NX")
+    end
+end
+"""
+
+
+def _notifications_key(cache_name: str, user_id: int) -> str:
+    return f"{cache_name}{settings.USER_RELATED_CACHE_NAME_SEP}{user_id}"
+
+
+def get_followers_ranges(author_id: int, chunk_size: int) -> typing.List[typing.Tuple[int, int]]:
+    from users.models import Follow
+
+    followers = list(
+        Follow.objects.filter(following_id=author_id)  # noqa
+        .order_by("follower_id")
+        .values_list("follower_id", flat=True)
+    )
+    return [
+        (followers[index], followers[min(index + chunk_size, len(followers)) - 1])
+        for index in range(0, len(followers), chunk_size)
+    ]
+
+
+def get_followers_preferences(
+    author_id: int, first_follower: int, last_follower: int
+) -> typing.Dict[int, typing.Tuple[str, bool]]:
+    """Returns timezone and digest mode of the author followers in the range by follower id."""
+
+    from users.models import Follow
+
+    followers = Follow.objects.filter(  # noqa
+        following_id=author_id, follower_id__gte=first_follower, follower_id__lte=last_follower
+    ).order_by("follower_id")
+    return {
+        follower: (timezone_, is_digest)
+        for follower, timezone_, is_digest in followers.values_list(
+            "follower_id", "follower__timezone", "follower__is_notifications_digest"
+        )
+    }
+
+
+def create_notifications(
+    post: "Post", recipients: typing.Collection[int]
+) -> typing.Tuple[typing.List["Notification"], typing.List["Notification"]]:
+    """
+    Notifies recipients about the post. The unread notification about the same author updated within
+    `NOTIFICATIONS_COALESCE_WINDOW` is collapsed in place, an older one is marked read and new rows are created
+    for the rest. Collapsing and creation happen in one `INSERT ... ON CONFLICT DO UPDATE` per batch through
+    the `notifications_unread_unique` constraint, so concurrent posts of the author can not create duplicates.
+    Returns created and coalesced notifications.
+    """
+
+    from notifications.models import Notification
+
+    quote = connection.ops.quote_name
+    table = quote(Notification._meta.db_table)  # noqa
+    expire_sql = (
+        f"UPDATE {table} SET is_read = true "
+        "WHERE NOT is_read AND author_id = %s AND recipient_id = ANY(%s) AND time_updated < %s "
+        "RETURNING recipient_id"
+    )
+    sql = (
+        f"INSERT INTO {table} (recipient_id, author_id, post_id, posts_count, is_read, time_added, time_updated) "
+        "SELECT recipient_id, %s, %s, 1, false, %s, %s FROM unnest(%s) AS recipient_id "
+        "ON CONFLICT (recipient_id, author_id) WHERE NOT is_read DO UPDATE SET post_id = EXCLUDED.post_id, "
+        f"posts_count = {table}.posts_count + 1, time_updated = EXCLUDED.time_updated "
+        f"WHERE {table}.time_updated >= %s "
+        "RETURNING id, recipient_id, posts_count, time_added, xmax = 0"
+    )
+
+    now = timezone.now()
+    window_start = now - timedelta(seconds=settings.NOTIFICATIONS_COALESCE_WINDOW)
+    recipients = sorted(recipients)
+    created, coalesced, expired = [], [], set()
+    with connection.cursor() as cursor:
+        for index in range(0, len(recipients), settings.NOTIFICATIONS_BULK_CREATE_BATCH_SIZE):
+            batch = recipients[index : index + settings.NOTIFICATIONS_BULK_CREATE_BATCH_SIZE]
+            with transaction.atomic():
+                cursor.execute(expire_sql, (post.author_id, batch, window_start))
+                expired.update(recipient for (recipient,) in cursor.fetchall())
+                cursor.execute(sql, (post.author_id, post.id, now, now, batch, window_start))
+            for pk, recipient, posts_count, time_added, is_created in cursor.fetchall():
+                notification = Notification(
+                    id=pk,
+                    recipient_id=recipient,
+                    author_id=post.author_id,
+                    post=post,
+                    posts_count=posts_count,
+                    time_added=time_added,
+                    time_updated=now,
+                )
+                (created if is_created else coalesced).append(notification)
+
+    # a notification replacing the expired one keeps the unread count
+    increment_unread_notifications_counts(
+        notification.recipient_id for notification in created if notification.recipient_id not in expired
+    )
+    return created, coalesced
+
+
+def get_unread_notifications(user_id: int, cursor: str | None, limit: int) -> typing.List["Notification"]:
+    from notifications.models import Notification
+
+    queryset = Notification.objects.select_related("recipient", "post__author").filter(  # noqa
+        recipient_id=user_id, is_read=False
+    )
+    if position := decode_cursor(cursor):
+        time_updated, pk = position
+        queryset = queryset.filter(Q(time_updated__lt=time_updated) | Q(time_updated=time_updated, id__lt=pk))
+
+    return list(queryset.order_by("-time_updated", "-id")[:limit])
+
+
+def _unread_counters_keys(user_ids: typing.Iterable[int]) -> typing.List[str]:
+    """Returns cache keys of the users counters followed by keys of their versions."""
+
+    user_ids = list(user_ids)
+    return [
+        cache.make_key(_notifications_key(cache_name, user_id))
+        for cache_name in (
+            settings.NOTIFICATIONS_UNREAD_COUNT_CACHE_NAME,
+            settings.NOTIFICATIONS_UNREAD_COUNT_VERSION_CACHE_NAME,
+        )
+        for user_id in user_ids
+    ]
+
+
+def get_unread_notifications_counts(user_ids: typing.Iterable[int]) -> typing.Dict[int, int]:
+    """
+    Returns unread notifications counters of users. Counters live in cache and are kept up to date
+    incrementally, missed ones are counted with a single query and cached unless they were changed
+    while counting, see `INCREMENT_EXISTING_COUNTERS_SCRIPT`.
+    """
+
+    from notifications.models import Notification
+
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_ids:
+        return {}
+
+    client = cache._cache.get_client(write=True)  # noqa
+    values = client.mget(_unread_counters_keys(user_ids))
+    cached, versions = values[: len(user_ids)], values[len(user_ids) :]
+    counts = {user_id: int(value) for user_id, value in zip(user_ids, cached) if value is not None}
+
+    missed = {user_id: version or b"" for user_id, version in zip(user_ids, versions) if user_id not in counts}
+    if missed:
+        counted = dict(
+            Notification.objects.filter(recipient_id__in=missed, is_read=False)  # noqa
+            .order_by()
+            .values("recipient_id")
+            .annotate(count=Count("id"))
+            .values_list("recipient_id", "count")
+        )
+        missed_counts = {user_id: counted.get(user_id, 0) for user_id in missed}
+        keys = _unread_counters_keys(missed)
+        client.eval(
+            CACHE_COUNTERS_SCRIPT,
+            len(keys),
+            *keys,
+            settings.NOTIFICATIONS_UNREAD_COUNT_CACHE_TIME,
+            *missed_counts.values(),
+            *missed.values(),
+        )
+        counts.update(missed_counts)
+    return counts
+
+
+def get_unread_notifications_count(user_id: int) -> int:
+    return get_unread_notifications_counts([user_id])[user_id]
+
+
+def increment_unread_notifications_counts(user_ids: typing.Iterable[int], delta: int = 1) -> None:
+    """
+    Adjusts cached counters in a single round trip. Missed counters are left as is, they will be counted on
+    the next read, and counters which went negative are dropped.
+    """
+
+    keys = _unread_counters_keys(user_ids)
+    if keys:
+        client = cache._cache.get_client(write=True)  # noqa
+        client.eval(
+            INCREMENT_EXISTING_COUNTERS_SCRIPT,
+            len(keys),
+            *keys,
+            delta,
+            settings.NOTIFICATIONS_UNREAD_COUNT_VERSION_CACHE_TIME,
+        )
+
+
+def mark_notification_read(user_id: int, pk: int) -> int:
+    """Marks the notification read. Returns unread notifications count of the user."""
+
+    from notifications.models import Notification
+
+    if Notification.objects.filter(recipient_id=user_id, pk=pk, is_read=False).update(is_read=True):  # noqa
+        increment_unread_notifications_counts([user_id], -1)
+    return get_unread_notifications_count(user_id)
+
+
+def mark_all_notifications_read(user_id: int) -> int:
+    """Marks all notifications read. Returns unread notifications count of the user."""
+
+    from notifications.models import Notification
+
+    if updated := Notification.objects.filter(recipient_id=user_id, is_read=False).update(is_read=True):  # noqa
+        increment_unread_notifications_counts([user_id], -updated)
+    return get_unread_notifications_count(user_id)
+
+
+def announce_unread_notifications_count(user_id: int, count: int) -> None:
+    """Updates the badge on every connection of the user."""
+
+    async_to_sync(get_channel_layer().group_send)(
+        f"user_{user_id}_notifications", {"type": "unread_count", "unread_count": count}
+    )
+
+
+def schedule_notifications_digests(recipients: typing.Iterable[int], since: datetime) -> typing.List[int]:
+    """
+    Opens digest starting at `since` for every recipient that has no pending one, in a single round trip.
+    Returns recipients with the opened digest, it must be sent to them once the interval is over.
+    """
+
+    recipients = list(recipients)
+    pipeline = cache._cache.get_client(write=True).pipeline(transaction=False)  # noqa
+    for recipient in recipients:
+        key = cache.make_key(_notifications_key(settings.NOTIFICATIONS_DIGEST_CACHE_NAME, recipient))
+        pipeline.set(key, int(since.timestamp()), ex=settings.NOTIFICATIONS_DIGEST_INTERVAL * 2, nx=True)
+    return [recipient for recipient, is_opened in zip(recipients, pipeline.execute()) if is_opened]
+
+
+def pop_notifications_digests(recipient_ids: typing.Iterable[int]) -> typing.Dict[int, typing.List["Notification"]]:
+    """
+    Closes digests of the recipients and returns unread notifications updated since each of them was opened,
+    recipients without an open digest or without such notifications are left out.
+    """
+
+    from notifications.models import Notification
+
+    recipient_ids = list(recipient_ids)
+    keys = [
+        cache.make_key(_notifications_key(settings.NOTIFICATIONS_DIGEST_CACHE_NAME, recipient))
+        for recipient in recipient_ids
+    ]
+    if not keys:
+        return {}
+
+    pipeline = cache._cache.get_client(write=True).pipeline()  # noqa
+    pipeline.mget(keys)
+    pipeline.delete(*keys)
+    opened, _ = pipeline.execute()
+    since = {
+        recipient: datetime.fromtimestamp(int(value), tz=dt_timezone.utc)
+        for recipient, value in zip(recipient_ids, opened)
+        if value is not None
+    }
+    if not since:
+        return {}
+
+    digests = {}
+    for notification in Notification.objects.select_related("recipient", "post__author").filter(  # noqa
+        recipient_id__in=since, is_read=False, time_updated__gte=min(since.values())
+    ):
+        if notification.time_updated >= since[notification.recipient_id]:
+            digests.setdefault(notification.recipient_id, []).append(notification)
+    return digests
+
+
+async def group_send_many(messages: typing.Iterable[typing.Tuple[str, dict]]) -> None:
+    """Sends messages to channel layer groups concurrently instead of one round trip after another."""
+
+    channel_layer = get_channel_layer()
+    semaphore = asyncio.Semaphore(settings.NOTIFICATIONS_GROUP_SEND_CONCURRENCY)
+
+    async def group_send(group: str, message: dict) -> None:
+        async with semaphore:
+            await channel_layer.group_send(group, message)
+
+    await asyncio.gather(*(group_send(group, message) for group, message in messages))
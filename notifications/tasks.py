@@ -1,10 +1,22 @@
+import typing
+
 from asgiref.sync import async_to_sync
-from celery import shared_task
-from channels.layers import get_channel_layer
+from celery import group, shared_task
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
-from notifications.models import Notification
-from notifications.serializers import NotificationSerializer
+from notifications import retention
+from notifications.serializers import NotificationSerializer, serialize_notifications_broadcast
+from notifications.services import (
+    create_notifications,
+    get_followers_preferences,
+    get_followers_ranges,
+    get_unread_notifications_counts,
+    group_send_many,
+    pop_notifications_digests,
+    schedule_notifications_digests,
+)
 from posts.models import Post
 
 User = get_user_model()
@@ -12,22 +24,55 @@ User = get_user_model()
 
 @shared_task
 def send_notifications(post_id: int) -> None:
-    channel_layer = get_channel_layer()
-    post = Post.objects.get(pk=post_id)  # noqa
-    followers = [follow.follower for follow in post.author.followers.select_related("follower").all()]
-    notifications = []
-
-    for follower in followers:
-        notification = Notification(recipient=follower, post=post)
-        notifications.append(notification)
-
-    Notification.objects.bulk_create(notifications)  # noqa
-
-    for notification in notifications:
-        async_to_sync(channel_layer.group_send)(
-            f"user_{notification.recipient.id}_notifications",
-            {  # noqa
-                "type": "notify",
-                "payload": NotificationSerializer(instance=notification).data,
+    author_id = Post.objects.values_list("author_id", flat=True).get(pk=post_id)  # noqa
+    ranges = get_followers_ranges(author_id, settings.NOTIFICATIONS_FANOUT_CHUNK_SIZE)
+    group(send_notifications_chunk.s(post_id, first, last) for first, last in ranges).apply_async()
+
+
+@shared_task
+def send_notifications_chunk(post_id: int, first_follower: int, last_follower: int) -> None:
+    post = Post.objects.select_related("author").get(pk=post_id)  # noqa
+    preferences = get_followers_preferences(post.author_id, first_follower, last_follower)
+    since = timezone.now()
+    created, coalesced = create_notifications(post, preferences.keys())
+
+    digest_recipients = [follower for follower, (_, is_digest) in preferences.items() if is_digest]
+    if scheduled := schedule_notifications_digests(digest_recipients, since):
+        send_notifications_digests.apply_async(args=[scheduled], countdown=settings.NOTIFICATIONS_DIGEST_INTERVAL)
+
+    notifications = [
+        notification for notification in created + coalesced if not preferences[notification.recipient_id][1]
+    ]
+    timezones = {follower: timezone_ for follower, (timezone_, _) in preferences.items()}
+    payloads = serialize_notifications_broadcast(post, notifications, timezones)
+    unread_counts = get_unread_notifications_counts(notification.recipient_id for notification in notifications)
+
+    async_to_sync(group_send_many)(
+        (
+            f"user_{notification.recipient_id}_notifications",
+            {"type": "notify", "payload": payload, "unread_count": unread_counts[notification.recipient_id]},
+        )
+        for notification, payload in zip(notifications, payloads)
+    )
+
+
+@shared_task
+def send_notifications_digests(recipient_ids: typing.List[int]) -> None:
+    digests = pop_notifications_digests(recipient_ids)
+    unread_counts = get_unread_notifications_counts(digests.keys())
+    async_to_sync(group_send_many)(
+        (
+            f"user_{recipient_id}_notifications",
+            {
+                "type": "notify_digest",
+                "payload": NotificationSerializer(notifications, many=True).data,
+                "unread_count": unread_counts[recipient_id],
             },
         )
+        for recipient_id, notifications in digests.items()
+    )
+
+
+@shared_task
+def apply_notifications_retention() -> None:
+    retention.apply_notifications_retention()
@@ -0,0 +1,13 @@
+from django.urls import include, path
+from rest_framework.routers import SimpleRouter
+
+from notifications.views import NotificationViewSet
+
+app_name = "notifications"
+
+router = SimpleRouter()
+router.register(r"notifications", NotificationViewSet, basename="notifications")
+
+urlpatterns = [
+    path("", include(router.urls)),
+]
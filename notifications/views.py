@@ -0,0 +1,85 @@
+from django.conf import settings
+from drf_spectacular.utils import OpenApiParameter, extend_schema, extend_schema_view
+from rest_framework import permissions, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from common.services import encode_cursor, get_page_size
+from notifications.serializers import (
+    NotificationSerializer,
+    NotificationsPageSerializer,
+    UnreadNotificationsCountSerializer,
+)
+from notifications.services import (
+    announce_unread_notifications_count,
+    get_unread_notifications,
+    get_unread_notifications_count,
+    mark_all_notifications_read,
+    mark_notification_read,
+)
+
+
+@extend_schema_view(
+    list=extend_schema(
+        request=None,
+        parameters=[
+            OpenApiParameter(name="cursor", description="Cursor of the next page from the previous one.", type=str),
+            OpenApiParameter(name="limit", description="Page size.", type=int),
+        ],
+        responses={status.HTTP_200_OK: NotificationsPageSerializer},
+        description="Endpoint to get your unread notifications, newest first.",
+    ),
+    unread_count=extend_schema(
+        request=None,
+        responses={status.HTTP_200_OK: UnreadNotificationsCountSerializer},
+        description="Endpoint to get count of your unread notifications.",
+    ),
+    read=extend_schema(
+        request=None,
+        responses={status.HTTP_200_OK: UnreadNotificationsCountSerializer},
+        description="Endpoint to mark your notification read.",
+    ),
+    read_all=extend_schema(
+        request=None,
+        responses={status.HTTP_200_OK: UnreadNotificationsCountSerializer},
+        description="Endpoint to mark all your notifications read.",
+    ),
+)
+class NotificationViewSet(viewsets.GenericViewSet):
+    serializer_class = NotificationSerializer
+    permission_classes = (permissions.IsAuthenticated,)
+    pagination_class = None
+    lookup_value_regex = r"\d+"
+
+    def list(self, request: Request) -> Response:
+        limit = get_page_size(
+            request.query_params.get("limit"), settings.NOTIFICATIONS_PAGE_SIZE, settings.NOTIFICATIONS_MAX_PAGE_SIZE
+        )
+        notifications = get_unread_notifications(request.user.id, request.query_params.get("cursor"), limit)
+        cursor = (
+            encode_cursor(notifications[-1].time_updated, notifications[-1].id) if len(notifications) == limit else None
+        )
+        return Response(
+            {
+                "results": self.get_serializer(notifications, many=True).data,
+                "cursor": cursor,
+                "unread_count": get_unread_notifications_count(request.user.id),
+            }
+        )
+
+    @action(methods=["get"], detail=False, url_path="unread-count", url_name="unread-count")
+    def unread_count(self, request: Request) -> Response:
+        return Response({"unread_count": get_unread_notifications_count(request.user.id)})
+
+    @action(methods=["post"], detail=True, url_name="read")
+    def read(self, request: Request, pk: str) -> Response:
+        count = mark_notification_read(request.user.id, int(pk))
+        announce_unread_notifications_count(request.user.id, count)
+        return Response({"unread_count": count})
+
+    @action(methods=["post"], detail=False, url_path="read-all", url_name="read-all")
+    def read_all(self, request: Request) -> Response:
+        count = mark_all_notifications_read(request.user.id)
+        announce_unread_notifications_count(request.user.id, count)
+        return Response({"unread_count": count})
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.1 on 2026-10-19 03:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+from common.operations import AddUniqueConstraintConcurrently, DeleteDuplicates
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('posts', '0013_post_pinned'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        DeleteDuplicates(model_name='commentlike', fields=('author', 'comment')),
+        AddUniqueConstraintConcurrently(
+            model_name='commentlike',
+            constraint=models.UniqueConstraint(fields=('author', 'comment'), name='comments_likes_unique'),
+        ),
+        DeleteDuplicates(model_name='postlike', fields=('author', 'post')),
+        AddUniqueConstraintConcurrently(
+            model_name='postlike',
+            constraint=models.UniqueConstraint(fields=('author', 'post'), name='posts_likes_unique'),
+        ),
+        DeleteDuplicates(model_name='saved', fields=('owner', 'post')),
+        AddUniqueConstraintConcurrently(
+            model_name='saved',
+            constraint=models.UniqueConstraint(fields=('owner', 'post'), name='saved_posts_unique'),
+        ),
+    ]
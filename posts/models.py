@@ -76,6 +76,7 @@ class PostLike(models.Model):
     class Meta:
         verbose_name = _("Post like")
         verbose_name_plural = _("Posts likes")
+        constraints = (models.UniqueConstraint(fields=("author", "post"), name="posts_likes_unique"),)
 
     def __str__(self):
         return f"{self.author.pk} like for {self.post.pk} post."  # noqa
@@ -103,6 +104,7 @@ class CommentLike(models.Model):
     class Meta:
         verbose_name = _("Comment like")
         verbose_name_plural = _("Comments likes")
+        constraints = (models.UniqueConstraint(fields=("author", "comment"), name="comments_likes_unique"),)
 
     def __str__(self):
         return f"{self.author.pk} like for {self.comment.pk} comment."  # noqa
@@ -117,6 +119,7 @@ class Saved(models.Model):
         ordering = "-time_added", "-id"
         verbose_name = _("Saved post")
         verbose_name_plural = _("Saved posts")
+        constraints = (models.UniqueConstraint(fields=("owner", "post"), name="saved_posts_unique"),)
 
     def __str__(self):
         return f"Saved post {self.post.pk} by {self.owner.pk}"  # noqa
@@ -4,11 +4,11 @@ from django.conf import settings
 from django.db import transaction
 from rest_framework import serializers
 
-from common.services import datetime_to_timezone
+from common.services import create_or_get, datetime_to_timezone
 from notifications.tasks import send_notifications
 from posts.models import Comment, CommentLike, Post, PostImage, PostLike, Saved, Tag
 from posts.services import extract_post_images_from_request_data, get_or_create_tags
-from users.serializers import UserDefaultSerializer
+from users.serializers import PresenceListSerializer, PresenceSerializerMixin, UserDefaultSerializer
 from users.services import PathImageTypeEnum, get_upload_crop_path
 from users.tasks import make_center_crop
 
@@ -64,7 +64,7 @@ class PostRequestSerializer(serializers.ModelSerializer):
 
         return attrs
 
-    def create(self, validated_data):
+    def create(self, validated_data: dict) -> Post:
         tags = self.context["request"].data.get("tags", "")
 
         with transaction.atomic():
@@ -82,7 +82,7 @@ class PostRequestSerializer(serializers.ModelSerializer):
         return post
 
 
-class PostResponseSerializer(serializers.ModelSerializer):
+class PostResponseSerializer(PresenceSerializerMixin, serializers.ModelSerializer):
     author = UserDefaultSerializer(read_only=True)
     images = PostImageSerializer(many=True, read_only=True)
     time_added = serializers.SerializerMethodField(read_only=True)
@@ -96,8 +96,11 @@ class PostResponseSerializer(serializers.ModelSerializer):
 
     tags = TagSerializer(many=True, read_only=True)
 
+    presence_user_fields = ("author_id",)
+
     class Meta:
         model = Post
+        list_serializer_class = PresenceListSerializer
         fields = (
             "id",
             "author",
@@ -124,24 +127,24 @@ class PostLikeSerializer(serializers.ModelSerializer):
         fields = "id", "author", "post"
         read_only_fields = "author", "post"
 
-    def create(self, validated_data):
-        like = PostLike.objects.filter(author=validated_data["author"], post=validated_data["post"])  # noqa
-        if like.exists():
-            return like.first()
-        return super().create(validated_data)
+    def create(self, validated_data: dict) -> PostLike:
+        return create_or_get(PostLike(**validated_data), ("author", "post"))
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(PresenceSerializerMixin, serializers.ModelSerializer):
     author = UserDefaultSerializer(read_only=True)
     time_added = serializers.SerializerMethodField()
 
     likes_count = serializers.IntegerField(read_only=True)
     is_liked = serializers.BooleanField(read_only=True)
 
+    presence_user_fields = ("author_id",)
+
     class Meta:
         model = Comment
         fields = "id", "author", "post", "comment", "time_added", "likes_count", "is_liked"
         read_only_fields = "post", "time_added"
+        list_serializer_class = PresenceListSerializer
 
     def get_time_added(self, comment):
         return datetime_to_timezone(comment.time_added, self.context["request"].user.timezone)
@@ -153,14 +156,11 @@ class CommentLikeSerializer(serializers.ModelSerializer):
         fields = "id", "author", "comment"
         read_only_fields = "author", "comment"
 
-    def create(self, validated_data):
-        like = CommentLike.objects.filter(author=validated_data["author"], comment=validated_data["comment"])  # noqa
-        if like.exists():
-            return like.first()
-        return super().create(validated_data)
+    def create(self, validated_data: dict) -> CommentLike:
+        return create_or_get(CommentLike(**validated_data), ("author", "comment"))
 
 
-class SavedSerializer(serializers.ModelSerializer):
+class SavedSerializer(PresenceSerializerMixin, serializers.ModelSerializer):
     owner = UserDefaultSerializer(read_only=True)
     post = PostResponseSerializer(required=False)
 
@@ -170,8 +170,11 @@ class SavedSerializer(serializers.ModelSerializer):
     is_commented = serializers.BooleanField(read_only=True)
     is_saved = serializers.BooleanField(read_only=True)
 
+    presence_user_fields = "owner_id", "post.author_id"
+
     class Meta:
         model = Saved
+        list_serializer_class = PresenceListSerializer
         fields = (
             "id",
             "owner",
@@ -185,6 +188,9 @@ class SavedSerializer(serializers.ModelSerializer):
         )
         read_only_fields = "post", "time_added"
 
+    def create(self, validated_data: dict) -> Saved:
+        return create_or_get(Saved(**validated_data), ("owner", "post"))
+
     def get_time_added(self, saved):
         return datetime_to_timezone(saved.time_added, self.context["request"].user.timezone)
 
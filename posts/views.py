@@ -262,11 +262,6 @@ class SavedViewSet(CreateModelMixin, mixins.ListModelMixin, mixins.DestroyModelM
         instance.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-    def perform_create(self, request: Request, serializer) -> None:
-        instance = Saved.objects.filter(owner=request.user, post=get_object_or_404(Post, pk=request.data["post_id"]))
-        if not instance.exists():
-            super().perform_create(request, serializer)
-
 
 @extend_schema_view(
     pin=extend_schema(
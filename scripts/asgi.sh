@@ -1 +1,4 @@
+export METRICS_MULTIPROC_ROOT="${METRICS_MULTIPROC_ROOT:-/tmp/exwonder-metrics}"
+export PROMETHEUS_MULTIPROC_DIR="$METRICS_MULTIPROC_ROOT/daphne"
+rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
 uv run daphne -b localhost -p 8001 core.asgi:application
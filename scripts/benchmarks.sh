@@ -0,0 +1 @@
+uv run pytest -s tests/benchmarks/bench_*.py
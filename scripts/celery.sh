@@ -1 +1,4 @@
+export METRICS_MULTIPROC_ROOT="${METRICS_MULTIPROC_ROOT:-/tmp/exwonder-metrics}"
+export PROMETHEUS_MULTIPROC_DIR="$METRICS_MULTIPROC_ROOT/celery"
+rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
 uv run celery -A core.celery_setup worker -E --loglevel=info --hostname=worker.basic --concurrency=3
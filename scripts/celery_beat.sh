@@ -0,0 +1 @@
+uv run celery -A core.celery_setup beat --loglevel=info
@@ -1 +1,4 @@
-gunicorn --bind 0.0.0.0:8000 core.wsgi:application
+export METRICS_MULTIPROC_ROOT="${METRICS_MULTIPROC_ROOT:-/tmp/exwonder-metrics}"
+export PROMETHEUS_MULTIPROC_DIR="$METRICS_MULTIPROC_ROOT/gunicorn"
+rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+gunicorn -c core/gunicorn.conf.py --bind 0.0.0.0:8000 core.wsgi:application
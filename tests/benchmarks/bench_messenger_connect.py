@@ -0,0 +1,76 @@
+"""
+Messenger connect latency against chats count.
+
+Run explicitly: pytest -s tests/benchmarks/bench_messenger_connect.py
+"""
+
+import statistics
+import time
+
+import pytest
+from channels.db import database_sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+
+from messenger.consumers import MessengerConsumer
+from messenger.models import Chat, ChatMember
+
+User = get_user_model()
+
+CHATS_COUNTS = (1, 50, 200, 500)
+ROUNDS = 5
+DEFAULT_TIMEOUT = 60
+
+
+def create_user_with_chats(chats_count: int) -> tuple[User, str]:
+    user = User.objects.create_user(
+        username=f"bench{chats_count}",
+        email="",
+        avatar=settings.DEFAULT_USER_AVATAR_PATH,
+        timezone=settings.DEFAULT_USER_TIMEZONE,
+        password="benchpass",
+    )
+    companions = User.objects.bulk_create(
+        User(username=f"b{chats_count}_{index}", email=None) for index in range(chats_count)
+    )
+    chats = Chat.objects.bulk_create(Chat() for _ in range(chats_count))  # noqa
+    ChatMember.objects.bulk_create(  # noqa
+        member
+        for chat, companion in zip(chats, companions)
+        for member in (ChatMember(chat_id=chat.id, user_id=user.id), ChatMember(chat_id=chat.id, user_id=companion.id))
+    )
+    return user, Token.objects.create(user=user).key  # noqa
+
+
+async def measure_connect(user: User, token: str) -> float:
+    communicator = WebsocketCommunicator(MessengerConsumer.as_asgi(), "messenger/")
+    await communicator.connect(DEFAULT_TIMEOUT)
+
+    start = time.perf_counter()
+    await communicator.send_json_to({"type": "authenticate", "token": token, "user_id": user.id})
+    await communicator.receive_json_from(DEFAULT_TIMEOUT)
+    await communicator.send_json_to({"type": "connect_to_chats"})
+    await communicator.receive_json_from(DEFAULT_TIMEOUT)
+    elapsed = time.perf_counter() - start
+
+    await communicator.disconnect()
+    return elapsed
+
+
+@pytest.mark.django_db
+@override_settings(
+    CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}},
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+)
+@pytest.mark.parametrize("chats_count", CHATS_COUNTS)
+async def test_connect_latency(chats_count: int) -> None:
+    user, token = await database_sync_to_async(create_user_with_chats)(chats_count)
+    timings = [await measure_connect(user, token) for _ in range(ROUNDS)]
+
+    print(
+        f"\nchats={chats_count:<5} median={statistics.median(timings) * 1000:.1f}ms "
+        f"max={max(timings) * 1000:.1f}ms rounds={ROUNDS}"
+    )
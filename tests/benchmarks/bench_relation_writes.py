@@ -0,0 +1,136 @@
+"""
+Likes, saves and follows writes: the previous `exists()` + `create()` check against `INSERT ... ON CONFLICT DO NOTHING`.
+
+Run explicitly: pytest -s tests/benchmarks/bench_relation_writes.py
+
+Each relation gets BENCH_WRITES writes of new pairs and as many repeated writes of the same pairs, reported are
+latency and queries per write. On PostgreSQL BENCH_RACERS threads also write one new pair at once, which shows
+whether the check can be raced. Reads of the relations are compared between branches with bench_rest_feeds.py.
+"""
+
+import os
+import statistics
+import threading
+import time
+import typing
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection, models
+from django.test.utils import CaptureQueriesContext
+
+from common.services import create_or_get
+from posts.models import Comment, CommentLike, Post, PostLike, Saved
+from tests.factories import UserFactory
+from users.models import Follow
+
+User = get_user_model()
+
+WRITES = int(os.environ.get("BENCH_WRITES", 200))
+RACERS = int(os.environ.get("BENCH_RACERS", 8))
+USERNAME_PREFIX = "write"
+
+
+class Relation(typing.NamedTuple):
+    model: typing.Type[models.Model]
+    unique_fields: typing.Tuple[str, str]
+    entities: typing.Callable[[typing.List[User]], typing.List[models.Model]]
+
+
+RELATIONS = {
+    "post_like": Relation(PostLike, ("author", "post"), lambda users: list(Post.objects.filter(author__in=users))),
+    "comment_like": Relation(
+        CommentLike, ("author", "comment"), lambda users: list(Comment.objects.filter(author__in=users))
+    ),
+    "saved": Relation(Saved, ("owner", "post"), lambda users: list(Post.objects.filter(author__in=users))),
+    "follow": Relation(Follow, ("follower", "following"), lambda users: users),
+}
+
+
+def legacy_create(instance: models.Model, unique_fields: typing.Sequence[str]) -> models.Model:
+    existing = type(instance)._default_manager.filter(**{field: getattr(instance, field) for field in unique_fields})
+    if existing.exists():
+        return existing.first()
+    instance.save()
+    return instance
+
+
+STRATEGIES = {"legacy": legacy_create, "upsert": create_or_get}
+
+
+def create_users(count: int) -> typing.List[User]:
+    users = User.objects.bulk_create(
+        UserFactory.build(username=f"{USERNAME_PREFIX}{index}", email=f"{USERNAME_PREFIX}{index}@example.com")
+        for index in range(count)
+    )
+    posts = Post.objects.bulk_create(Post(author=user) for user in users)  # noqa
+    Comment.objects.bulk_create(Comment(author=post.author, post=post, comment="Nice photo, really.") for post in posts)  # noqa
+    return users
+
+
+def percentiles(timings: typing.List[float]) -> str:
+    quantiles = statistics.quantiles(timings, n=100, method="inclusive")
+    return f"p50={quantiles[49] * 1000:.2f}ms p95={quantiles[94] * 1000:.2f}ms"
+
+
+def measure_writes(strategy: typing.Callable, relation: Relation, pairs: list) -> str:
+    timings, queries = [], 0
+    for user, entity in pairs:
+        instance = relation.model(**dict(zip(relation.unique_fields, (user, entity))))
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            assert strategy(instance, relation.unique_fields).pk
+            timings.append(time.perf_counter() - start)
+        queries += len(context)
+    return f"{percentiles(timings)} queries={queries / len(pairs):.1f}"
+
+
+def race(strategy: typing.Callable, relation: Relation, pair: tuple) -> str:
+    barrier, errors = threading.Barrier(RACERS), []
+
+    def write() -> None:
+        barrier.wait()
+        try:
+            strategy(relation.model(**dict(zip(relation.unique_fields, pair))), relation.unique_fields)
+        except IntegrityError:
+            errors.append(1)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=write) for _ in range(RACERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    rows = relation.model.objects.filter(**dict(zip(relation.unique_fields, pair))).count()
+    return f"rows={rows} errors={len(errors)}"
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("relation_name", RELATIONS)
+def test_relation_writes(relation_name: str) -> None:
+    relation = RELATIONS[relation_name]
+    users = create_users(WRITES + 2)
+    entities = relation.entities(users)
+
+    print(f"\n{relation_name} writes={WRITES} database={connection.vendor}")
+    for offset, (name, strategy) in enumerate(STRATEGIES.items(), start=1):
+        pairs = [(users[index], entities[(index + offset) % len(entities)]) for index in range(WRITES)]
+        print(f"  {name:<6} new     {measure_writes(strategy, relation, pairs)}")
+        print(f"  {name:<6} repeat  {measure_writes(strategy, relation, pairs)}")
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize("relation_name", RELATIONS)
+def test_relation_writes_race(relation_name: str) -> None:
+    if connection.vendor != "postgresql":
+        pytest.skip("Concurrent writes need PostgreSQL.")
+
+    relation = RELATIONS[relation_name]
+    users = create_users(len(STRATEGIES) + 1)
+    entities = relation.entities(users)
+
+    print(f"\n{relation_name} racers={RACERS}")
+    for index, (name, strategy) in enumerate(STRATEGIES.items()):
+        print(f"  {name:<6} {race(strategy, relation, (users[index], entities[index + 1]))}")
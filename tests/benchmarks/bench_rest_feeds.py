@@ -0,0 +1,253 @@
+"""
+Latency, queries and scanned rows of the REST feeds on a seeded power-law dataset.
+
+Run explicitly: pytest -s tests/benchmarks/bench_rest_feeds.py
+
+Only the database is needed, cache and channel layer are in-memory.
+
+Dataset size and rounds are configured with BENCH_USERS, BENCH_POSTS, BENCH_COMMENTS, BENCH_LIKES,
+BENCH_TAGS, BENCH_ROUNDS and BENCH_SEED environment variables. Results are written as JSON to
+BENCH_RESULTS (bench_rest_feeds-<branch>.json by default) to compare branches. Rows scanned are only
+available on PostgreSQL.
+"""
+
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import time
+import typing
+
+import faker
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from pytest_django import DjangoDbBlocker
+from rest_framework.test import APIClient
+
+from posts.models import Comment, Post, PostLike, Saved, Tag
+from tests.factories import CommentFactory, PostFactory, UserFactory
+from users.models import Follow
+
+User = get_user_model()
+
+USERS = int(os.environ.get("BENCH_USERS", 300))
+POSTS = int(os.environ.get("BENCH_POSTS", 1500))
+COMMENTS = int(os.environ.get("BENCH_COMMENTS", 2000))
+LIKES = int(os.environ.get("BENCH_LIKES", 10000))
+TAGS = int(os.environ.get("BENCH_TAGS", 100))
+ROUNDS = int(os.environ.get("BENCH_ROUNDS", 20))
+SEED = int(os.environ.get("BENCH_SEED", 42))
+ZIPF_EXPONENT = 1.1
+USERNAME_PREFIX = "feed"
+
+ROWS_SCANNED_SQL = """
+    SELECT COALESCE(SUM(COALESCE(seq_tup_read, 0) + COALESCE(idx_tup_fetch, 0)), 0)
+    FROM pg_stat_xact_user_tables
+"""
+
+
+class Dataset(typing.NamedTuple):
+    viewer: User
+    post: Post
+    search: str
+
+
+def zipf_weights(count: int) -> typing.List[float]:
+    return [1 / rank**ZIPF_EXPONENT for rank in range(1, count + 1)]
+
+
+def sample_distinct(rng: random.Random, population: list, weights: list, count: int) -> set:
+    """Weighted sample without repeats. Popular items are picked first, so the result follows the weights."""
+
+    picked = set()
+    while len(picked) < min(count, len(population)):
+        picked.update(rng.choices(population, weights, k=count - len(picked)))
+    return picked
+
+
+def seed_dataset() -> Dataset:
+    rng = random.Random(SEED)
+    faker.Faker.seed(SEED)
+
+    users = User.objects.bulk_create(
+        UserFactory.build(username=f"{USERNAME_PREFIX}{index}", email=f"{USERNAME_PREFIX}{index}@example.com")
+        for index in range(USERS)
+    )
+    users_weights = zipf_weights(USERS)  # users are ranked by popularity in creation order
+
+    follows = set()
+    for user in users:
+        followings_count = min(int(rng.paretovariate(1.2) * 5), USERS - 1)
+        follows.update(
+            (user.id, following.id)
+            for following in sample_distinct(rng, users, users_weights, followings_count)
+            if following.id != user.id
+        )
+    Follow.objects.bulk_create(Follow(follower_id=follower, following_id=following) for follower, following in follows)
+
+    tags = Tag.objects.bulk_create(Tag(name=f"{USERNAME_PREFIX}tag{index}") for index in range(TAGS))  # noqa
+    posts = Post.objects.bulk_create(  # noqa
+        PostFactory.build(author=author) for author in rng.choices(users, users_weights, k=POSTS)
+    )
+    tags_weights = zipf_weights(TAGS)
+    Post.tags.through.objects.bulk_create(
+        Post.tags.through(post_id=post.id, tag_id=tag.id)
+        for post in posts
+        for tag in sample_distinct(rng, tags, tags_weights, rng.randint(1, 3))
+    )
+
+    posts_weights = zipf_weights(POSTS)
+    shuffled_posts = rng.sample(posts, len(posts))  # popular posts are spread over time
+    likes = set()
+    while len(likes) < min(LIKES, USERS * POSTS):
+        likes.add((rng.choice(users).id, rng.choices(shuffled_posts, posts_weights)[0].id))
+    PostLike.objects.bulk_create(PostLike(author_id=author, post_id=post) for author, post in likes)  # noqa
+
+    commented_posts = rng.choices(shuffled_posts, posts_weights, k=COMMENTS)
+    Comment.objects.bulk_create(  # noqa
+        CommentFactory.build(author=rng.choice(users), post=post) for post in commented_posts
+    )
+
+    viewer = users[USERS // 10]  # popular, but not a celebrity with most of users as followers
+    Saved.objects.bulk_create(  # noqa
+        Saved(owner=viewer, post=post) for post in sample_distinct(rng, shuffled_posts, posts_weights, 200)
+    )
+    return Dataset(viewer=viewer, post=shuffled_posts[0], search=USERNAME_PREFIX[:3])
+
+
+def get_git_revision() -> typing.Dict[str, str]:
+    def git(*args: str) -> str:
+        try:
+            return subprocess.run(("git", *args), capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return "unknown"
+
+    return {"branch": git("rev-parse", "--abbrev-ref", "HEAD"), "commit": git("rev-parse", "--short", "HEAD")}
+
+
+def get_rows_scanned() -> typing.Optional[int]:
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(ROWS_SCANNED_SQL)
+        return int(cursor.fetchone()[0])
+
+
+def percentile(timings: typing.List[float], percent: int) -> float:
+    return statistics.quantiles(timings, n=100, method="inclusive")[percent - 1]
+
+
+@pytest.fixture(scope="module")
+def dataset(django_db_setup: None, django_db_blocker: DjangoDbBlocker) -> typing.Iterator[Dataset]:
+    with (
+        django_db_blocker.unblock(),
+        override_settings(
+            CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}},
+            CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+        ),
+    ):
+        start = time.perf_counter()
+        dataset = seed_dataset()
+        print(f"\nseeded users={USERS} posts={POSTS} in {time.perf_counter() - start:.1f}s")
+        yield dataset
+        User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+        Tag.objects.filter(name__startswith=USERNAME_PREFIX).delete()  # noqa
+
+
+@pytest.fixture(scope="module")
+def results() -> typing.Iterator[list]:
+    results = []
+    yield results
+
+    revision = get_git_revision()
+    path = os.environ.get("BENCH_RESULTS", f"bench_rest_feeds-{revision['branch'].replace('/', '_')}.json")
+    with open(path, "w") as file:
+        json.dump(
+            {
+                **revision,
+                "time": timezone.now().isoformat(),
+                "database": connection.vendor,
+                "python": platform.python_version(),
+                "dataset": {
+                    "users": USERS,
+                    "posts": POSTS,
+                    "comments": COMMENTS,
+                    "likes": LIKES,
+                    "tags": TAGS,
+                    "seed": SEED,
+                },
+                "rounds": ROUNDS,
+                "results": results,
+            },
+            file,
+            indent=2,
+        )
+    print(f"\nresults saved to {path}")
+
+
+ENDPOINTS = {
+    "posts_own": lambda data: (reverse("posts:posts-list"), {}),
+    "posts_user": lambda data: (reverse("posts:posts-list"), {"user": f"{USERNAME_PREFIX}0"}),
+    "posts_top_likes": lambda data: (reverse("posts:posts-list"), {"top": "likes"}),
+    "posts_top_recent": lambda data: (reverse("posts:posts-list"), {"top": "recent"}),
+    "posts_top_updates": lambda data: (reverse("posts:posts-list"), {"top": "updates"}),
+    "posts_top_recommended": lambda data: (reverse("posts:posts-list"), {"top": "recommended"}),
+    "post_retrieve": lambda data: (reverse("posts:posts-detail", kwargs={"id": data.post.id}), {}),
+    "comments": lambda data: (reverse("posts:comments-list"), {"post_id": data.post.id}),
+    "saved": lambda data: (reverse("posts:saved-list"), {}),
+    "users_search": lambda data: (reverse("users:account-list"), {"search": data.search}),
+    "user_info": lambda data: (reverse("users:full-user"), {"username": f"{USERNAME_PREFIX}0", "fields": "all"}),
+    "followers": lambda data: (reverse("users:followers-list"), {}),
+    "followings": lambda data: (reverse("users:followings-user", kwargs={"pk": data.viewer.id}), {}),
+}
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("endpoint", ENDPOINTS)
+def test_rest_feed(endpoint: str, dataset: Dataset, results: list) -> None:
+    url, params = ENDPOINTS[endpoint](dataset)
+    client = APIClient()
+    client.force_authenticate(dataset.viewer)
+    cache.clear()
+
+    timings, queries, rows_scanned = [], [], []
+    for round_ in range(ROUNDS + 1):
+        rows_before = get_rows_scanned()
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            response = client.get(url, params)
+            elapsed = time.perf_counter() - start
+        assert response.status_code == 200, response.data
+
+        if round_ == 0:  # cold caches
+            cold = elapsed
+            continue
+        timings.append(elapsed)
+        queries.append(len(context.captured_queries))
+        if rows_before is not None:
+            rows_scanned.append(get_rows_scanned() - rows_before)
+
+    result = {
+        "endpoint": endpoint,
+        "url": url,
+        "params": params,
+        "cold_ms": cold * 1000,
+        "p50_ms": percentile(timings, 50) * 1000,
+        "p95_ms": percentile(timings, 95) * 1000,
+        "p99_ms": percentile(timings, 99) * 1000,
+        "queries": max(queries),
+        "rows_scanned": max(rows_scanned) if rows_scanned else None,
+    }
+    results.append(result)
+    print(
+        f"\n{endpoint:<22} p50={result['p50_ms']:.1f}ms p95={result['p95_ms']:.1f}ms p99={result['p99_ms']:.1f}ms "
+        f"cold={result['cold_ms']:.1f}ms queries={result['queries']} rows={result['rows_scanned']}"
+    )
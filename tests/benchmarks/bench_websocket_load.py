@@ -0,0 +1,210 @@
+"""
+Concurrent messenger and notifications clients against `core.asgi.application` in one process.
+
+Run explicitly: pytest -s tests/benchmarks/bench_websocket_load.py
+
+Every client opens /messenger/ and runs authenticate -> connect_to_chats, then sends BENCH_MESSAGES messages to
+its chat companion and reads the chat. Every client also opens the notifications socket and follows the first
+BENCH_NOTIFY_AUTHORS clients, a post of each author is fanned out by `send_notifications_chunk` while the
+messenger traffic runs. Clients counts are set with BENCH_CLIENTS (comma separated). BENCH_CHANNEL_LAYER=redis
+uses CHANNELS_REDIS_HOST instead of the in-memory layer. Reported: connect latency of both sockets, message
+delivery latency, notify fan-out latency, event loop lag and traced memory per authenticated client.
+Notifications counters and digests need the configured Redis cache.
+"""
+
+import asyncio
+import os
+import random
+import statistics
+import time
+import tracemalloc
+import typing
+
+import pytest
+from channels.db import database_sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+
+from core.asgi import application
+from messenger.models import Chat, ChatMember
+from notifications.tasks import send_notifications_chunk
+from posts.models import Post
+from users.models import Follow
+
+User = get_user_model()
+
+CLIENTS_COUNTS = tuple(int(count) for count in os.environ.get("BENCH_CLIENTS", "50,200").split(","))
+MESSAGES = int(os.environ.get("BENCH_MESSAGES", 10))
+NOTIFY_AUTHORS = int(os.environ.get("BENCH_NOTIFY_AUTHORS", 5))
+SEND_INTERVAL = 0.05
+LOOP_LAG_INTERVAL = 0.01
+DEFAULT_TIMEOUT = 120
+
+CHANNEL_LAYERS = {
+    "memory": {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}},
+    "redis": {
+        "default": {
+            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "CONFIG": {"hosts": [os.environ.get("CHANNELS_REDIS_HOST", "redis://localhost:6379/69")]},
+        }
+    },
+}
+
+
+class Client(typing.NamedTuple):
+    user: User
+    token: str
+    chat: int
+    companion: int
+
+
+def create_clients(count: int) -> list[Client]:
+    users = User.objects.bulk_create(User(username=f"load{count}_{index}", email=None) for index in range(count))
+    tokens = Token.objects.bulk_create(Token(user=user, key=Token.generate_key()) for user in users)  # noqa
+    chats = Chat.objects.bulk_create(  # noqa
+        Chat(min_user=users[index], max_user=users[index + 1]) for index in range(0, count, 2)
+    )
+    ChatMember.objects.bulk_create(  # noqa
+        ChatMember(chat=chats[index // 2], user=user) for index, user in enumerate(users)
+    )
+    Follow.objects.bulk_create(  # noqa
+        Follow(follower=user, following=author) for author in users[:NOTIFY_AUTHORS] for user in users if user != author
+    )
+    return [
+        Client(user, token.key, chats[index // 2].id, users[index ^ 1].id)
+        for index, (user, token) in enumerate(zip(users, tokens))
+    ]
+
+
+def percentiles(timings: list[float]) -> str:
+    if len(timings) < 2:
+        return "n/a"
+    quantiles = statistics.quantiles(timings, n=100, method="inclusive")
+    return f"p50={quantiles[49] * 1000:.1f}ms p95={quantiles[94] * 1000:.1f}ms p99={quantiles[98] * 1000:.1f}ms"
+
+
+async def measure_loop_lag(lags: list[float], stopped: asyncio.Event) -> None:
+    while not stopped.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        lags.append(time.perf_counter() - start - LOOP_LAG_INTERVAL)
+
+
+async def connect(client: Client, path: str = "/messenger/") -> tuple[WebsocketCommunicator, float]:
+    communicator = WebsocketCommunicator(application, path)
+    start = time.perf_counter()
+    connected, _ = await communicator.connect(DEFAULT_TIMEOUT)
+    assert connected
+
+    await communicator.send_json_to({"type": "authenticate", "token": client.token, "user_id": client.user.id})
+    assert (await communicator.receive_json_from(DEFAULT_TIMEOUT))["authenticated"]
+    if path != "/messenger/":
+        return communicator, time.perf_counter() - start
+
+    await communicator.send_json_to({"type": "connect_to_chats"})
+    assert (await communicator.receive_json_from(DEFAULT_TIMEOUT))["type"] == "connect_to_chats"
+    return communicator, time.perf_counter() - start
+
+
+async def receive(communicator: WebsocketCommunicator, client: Client, deliveries: list[float]) -> None:
+    """
+    Reads frames until every message of the companion is received. A read_chat which does not move the watermark
+    is not broadcasted, so the read events are not waited for.
+    """
+
+    received = 0
+    while received < MESSAGES:
+        frame = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        if frame.get("type") == "on_message" and frame["payload"]["sender"]["id"] == client.companion:
+            deliveries.append(time.perf_counter() - float(frame["payload"]["body"]))
+            received += 1
+
+
+async def send(communicator: WebsocketCommunicator, client: Client, rng: random.Random) -> None:
+    for _ in range(MESSAGES):
+        await asyncio.sleep(rng.random() * SEND_INTERVAL * 2)
+        await communicator.send_json_to(
+            {
+                "type": "send_message",
+                "chat_id": client.chat,
+                "receiver": client.companion,
+                "body": repr(time.perf_counter()),
+            }
+        )
+    await communicator.send_json_to({"type": "read_chat", "id": client.chat})
+
+
+async def receive_notifications(
+    communicator: WebsocketCommunicator, expected: int, published: dict[int, float], fanouts: list[float]
+) -> None:
+    received = 0
+    while received < expected:
+        frame = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        if frame.get("type") == "notify":
+            fanouts.append(time.perf_counter() - published[frame["payload"]["post"]])
+            received += 1
+
+
+async def notify(authors: list[Client], published: dict[int, float]) -> None:
+    """Publishes one post of every author and fans it out to all followers in one chunk."""
+
+    posts = await database_sync_to_async(Post.objects.bulk_create)(Post(author=author.user) for author in authors)
+    for post in posts:
+        await asyncio.sleep(SEND_INTERVAL)
+        published[post.id] = time.perf_counter()
+        await database_sync_to_async(send_notifications_chunk)(post.id, 0, 2**63 - 1)
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize("clients_count", CLIENTS_COUNTS)
+async def test_websocket_load(clients_count: int) -> None:
+    layer = os.environ.get("BENCH_CHANNEL_LAYER", "memory")
+    with override_settings(
+        CHANNEL_LAYERS=CHANNEL_LAYERS[layer],
+    ):
+        clients = await database_sync_to_async(create_clients)(clients_count)
+        lags, stopped = [], asyncio.Event()
+        lag_task = asyncio.create_task(measure_loop_lag(lags, stopped))
+
+        tracemalloc.start()
+        memory_before = tracemalloc.get_traced_memory()[0]
+        connections = await asyncio.gather(*(connect(client) for client in clients))
+        notifications_connections = await asyncio.gather(*(connect(client, "/") for client in clients))
+        memory_per_client = (tracemalloc.get_traced_memory()[0] - memory_before) / clients_count
+        tracemalloc.stop()
+
+        authors = clients[:NOTIFY_AUTHORS]
+        deliveries, fanouts, published = [], [], {}
+        start = time.perf_counter()
+        rng = random.Random(clients_count)
+        await asyncio.gather(
+            *(receive(communicator, client, deliveries) for (communicator, _), client in zip(connections, clients)),
+            *(send(communicator, client, rng) for (communicator, _), client in zip(connections, clients)),
+            *(
+                receive_notifications(communicator, len(authors) - (client in authors), published, fanouts)
+                for (communicator, _), client in zip(notifications_connections, clients)
+            ),
+            notify(authors, published),
+        )
+        elapsed = time.perf_counter() - start
+
+        stopped.set()
+        await lag_task
+        await asyncio.gather(
+            *(communicator.disconnect() for communicator, _ in (*connections, *notifications_connections))
+        )
+
+    assert len(deliveries) == clients_count * MESSAGES
+    assert len(fanouts) == len(authors) * (clients_count - 1)
+    print(
+        f"\nclients={clients_count} layer={layer} database={settings.DATABASES['default']['ENGINE'].split('.')[-1]}"
+        f"\n  connect   messenger {percentiles([latency for _, latency in connections])}"
+        f"\n  connect   notifications {percentiles([latency for _, latency in notifications_connections])}"
+        f"\n  delivery  {percentiles(deliveries)} messages={len(deliveries)} rate={len(deliveries) / elapsed:.0f}/s"
+        f"\n  fan-out   {percentiles(fanouts)} notifications={len(fanouts)} authors={len(authors)}"
+        f"\n  loop lag  {percentiles(lags)} max={max(lags) * 1000:.1f}ms"
+        f"\n  memory    {memory_per_client / 1024:.1f}KiB per client (messenger and notifications sockets)"
+    )
@@ -0,0 +1,98 @@
+"""
+Encoded frame size and encode time of the WebSocket wire protocols for typical messenger payloads.
+
+Run explicitly: pytest -s tests/benchmarks/bench_wire_protocol.py
+"""
+
+import statistics
+import time
+
+import pytest
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from django.utils import timezone
+
+from common.protocol import JSON_PROTOCOL, MSGPACK_DEFLATE_PROTOCOL, MSGPACK_PROTOCOL, WireCodec
+from messenger.models import Chat, Message
+from messenger.serializers import ChatSerializer, MessageSerializer
+
+User = get_user_model()
+
+PROTOCOLS = (JSON_PROTOCOL, MSGPACK_PROTOCOL, MSGPACK_DEFLATE_PROTOCOL)
+ROUNDS = 200
+
+
+def build_users(count: int) -> list[User]:
+    return [
+        User(
+            id=index,
+            username=f"user{index}",
+            avatar=settings.DEFAULT_USER_AVATAR_PATH,
+            timezone=settings.DEFAULT_USER_TIMEZONE,
+        )
+        for index in range(1, count + 1)
+    ]
+
+
+def build_message(pk: int, chat: int, sender: User, receiver: User) -> Message:
+    now = timezone.now()
+    return Message(
+        id=pk,
+        chat_id=chat,
+        sender=sender,
+        receiver=receiver,
+        body=f"Message number {pk}, long enough to look like a regular chat message.",
+        time_added=now,
+        time_updated=now,
+        seq=pk,
+    )
+
+
+def build_chats_page() -> tuple[list, dict]:
+    user, *companions = build_users(settings.MESSENGER_CHATS_PAGE_SIZE + 1)
+    chats = []
+    for pk, companion in enumerate(companions, start=1):
+        chat = Chat(id=pk, seq=pk, is_read=bool(pk % 2))
+        chat.last_message = build_message(pk, pk, companion, user)
+        chat.unread_count = pk % 3
+        chat.last_read_message_id = pk - 1
+        chat.companion_pk = companion.id
+        chat.companion_username = companion.username
+        chat.companion_avatar = companion.avatar
+        chat.companion_last_read_message_id = pk
+        chat.companion_unread_count = 0
+        chats.append(chat)
+    return ChatSerializer(chats, many=True, context={"user": user}).data, {"type": "connect_to_chats"}
+
+
+def build_history_page() -> tuple[list, dict]:
+    user, companion = build_users(2)
+    messages = [
+        build_message(pk, 1, *((user, companion) if pk % 2 else (companion, user)))
+        for pk in range(settings.MESSENGER_HISTORY_PAGE_SIZE, 0, -1)
+    ]
+    watermarks = {(1, user.id): 40, (1, companion.id): 45}
+    context = {"user": user, "read_watermarks": watermarks}
+    return MessageSerializer(messages, many=True, context=context).data, {"type": "get_chat_history", "chat": 1}
+
+
+@pytest.mark.django_db
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+@pytest.mark.parametrize("build_payload", (build_chats_page, build_history_page))
+def test_wire_protocol_size(build_payload: callable) -> None:
+    payload, frame = build_payload()
+    frame["payload"] = payload
+
+    for protocol in PROTOCOLS:
+        timings = []
+        for _ in range(ROUNDS):
+            codec = WireCodec(protocol)
+            start = time.perf_counter()
+            encoded = next(iter(codec.encode(frame).values()))
+            timings.append(time.perf_counter() - start)
+
+        print(
+            f"\n{build_payload.__name__:<20} {protocol:<26} size={len(encoded):>7}B "
+            f"median={statistics.median(timings) * 1e6:.0f}us"
+        )
@@ -7,6 +7,7 @@ TESTS TOTAL TODO:
 import typing
 
 import pytest
+from celery import current_app
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 
@@ -15,6 +16,11 @@ from tests.factories import CommentFactory, PostFactory, UserFactory
 User = get_user_model()
 
 
+@pytest.fixture(scope="session", autouse=True)
+def celery_eager() -> None:
+    current_app.conf.task_always_eager = True
+
+
 @pytest.fixture(scope="session")
 def user_factory() -> typing.Type[UserFactory]:
     return UserFactory
@@ -0,0 +1,70 @@
+"""
+Query budgets of endpoints and consumer handlers.
+
+A budget limits queries of one call and names what the queries count must not depend on, e.g. page size
+or followers count. It is checked by measuring the call at two data sizes: the larger one must fit the
+budget and issue as many queries as the smaller one. Failures list the queries which got repeated.
+"""
+
+import collections
+import contextlib
+import re
+import typing
+
+import pytest
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from common.instrumentation import SQL_IN_PARAMS_PATTERN
+
+SQL_LIMIT_PATTERN = re.compile(r"\b(LIMIT|OFFSET) \d+")
+SMALL_SIZE = 2
+LARGE_SIZE = 6
+
+
+class QueryBudget(typing.NamedTuple):
+    max_queries: int
+    constant_in: str
+
+
+@contextlib.contextmanager
+def capture_queries() -> typing.Iterator[typing.List[str]]:
+    """
+    Captures queries of the default connection of the current thread. Consumers handlers run their
+    thread sensitive database code in this thread as well when they are called through `async_to_sync`.
+    """
+
+    queries = []
+
+    def execute_wrapper(
+        execute: typing.Callable, sql: str, params: typing.Optional[typing.Sequence], many: bool, context: dict
+    ) -> object:
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    with connections[DEFAULT_DB_ALIAS].execute_wrapper(execute_wrapper):
+        yield queries
+
+
+def assert_query_budget(budget: QueryBudget, measure: typing.Callable[[int], typing.List[str]]) -> None:
+    small, large = measure(SMALL_SIZE), measure(LARGE_SIZE)
+
+    problems = []
+    if len(large) > budget.max_queries:
+        problems.append(f"{len(large)} queries, the budget is {budget.max_queries}")
+    if len(large) != len(small):
+        problems.append(
+            f"{len(small)} queries at {budget.constant_in} {SMALL_SIZE}, {len(large)} at {LARGE_SIZE}, "
+            f"the count must be constant in {budget.constant_in}"
+        )
+    if not problems:
+        return
+
+    grown = collections.Counter(map(get_shape, large)) - collections.Counter(map(get_shape, small))
+    lines = [*problems, "", "Queries:", *(f"  {sql}" for sql in large)]
+    if grown:
+        lines += ["", "Repeated more with more data:", *(f"  +{count} {shape}" for shape, count in grown.items())]
+    pytest.fail("\n".join(lines), pytrace=False)
+
+
+def get_shape(sql: str) -> str:
+    return SQL_LIMIT_PATTERN.sub(r"\1 ...", SQL_IN_PARAMS_PATTERN.sub("(...)", sql))
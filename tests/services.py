@@ -54,7 +54,7 @@ class FollowTestService(RegisterObjectsMixin):
             case FollowTestMode.FOLLOWINGS_EACH_USER:
                 url = reverse_lazy(self.endpoint_list, kwargs={"pk": user.pk})
                 client.force_authenticate()
-                return url, self.register_users(client, 1)
+                return url, self.register_users(client, 1).get()
             case FollowTestMode.FOLLOWINGS:
                 return reverse_lazy(self.endpoint_list, kwargs={"pk": user.pk}), user
             case FollowTestMode.FOLLOWERS:
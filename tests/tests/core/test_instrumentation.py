@@ -0,0 +1,83 @@
+import json
+import logging
+import typing
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse_lazy
+from pytest_django.fixtures import SettingsWrapper
+from rest_framework import serializers
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from common.instrumentation import collect_metrics
+from tests.factories import UserFactory
+
+User = get_user_model()
+
+
+class UserFollowersSerializer(serializers.ModelSerializer):
+    followers = serializers.SerializerMethodField()
+
+    class Meta:
+        model = User
+        fields = "id", "followers"
+
+    def get_followers(self, instance: User) -> int:
+        return instance.followers.count()
+
+
+@pytest.mark.django_db
+class TestInstrumentation:
+    def test_server_timing(
+        self,
+        settings: SettingsWrapper,
+        api_client: typing.Type[APIClient],
+        user_factory: typing.Type[UserFactory],
+        caplog: pytest.LogCaptureFixture,
+    ) -> None:
+        settings.INSTRUMENTATION_SAMPLE_RATE = 1
+        client = api_client()
+        token = Token.objects.create(user=user_factory.create())  # noqa
+
+        with caplog.at_level(logging.INFO, logger="common.middleware"):
+            response = client.get(
+                reverse_lazy("notifications:notifications-list"), HTTP_AUTHORIZATION=f"Token {token.key}"
+            )
+
+        assert "Server-Timing" not in response
+        record = json.loads(caplog.records[-1].getMessage())
+        assert record["view"] == "notifications:notifications-list"
+        assert record["queries"] >= 1
+
+        token = Token.objects.create(user=user_factory.create(is_staff=True))  # noqa
+        response = client.get(reverse_lazy("notifications:notifications-list"), HTTP_AUTHORIZATION=f"Token {token.key}")
+        assert response["Server-Timing"].startswith("sql;dur=")
+
+    def test_sampling(
+        self, settings: SettingsWrapper, api_client: typing.Type[APIClient], user_factory: typing.Type[UserFactory]
+    ) -> None:
+        settings.INSTRUMENTATION_SAMPLE_RATE = 0
+        client = api_client()
+        client.force_authenticate(user_factory.create())
+
+        response = client.get(reverse_lazy("notifications:notifications-list"))
+        assert "Server-Timing" not in response
+
+    def test_n_plus_one(self, user_factory: typing.Type[UserFactory]) -> None:
+        users = user_factory.create_batch(5)
+        cache.set("instrumentation", 1)
+
+        with collect_metrics() as metrics:
+            UserFollowersSerializer(User.objects.filter(pk__in=[user.pk for user in users]), many=True).data  # noqa
+            cache.get("instrumentation")
+            cache.get_many(["instrumentation", "missed"])
+
+        (query,) = metrics.get_repeated_queries(5)
+        assert query["count"] == 5
+        assert query["serializer"] == "UserFollowersSerializer"
+        assert "get_followers" in query["caller"]
+        assert metrics.queries == 6
+        assert metrics.serializer_time > 0
+        assert (metrics.cache_hits, metrics.cache_misses) == (1, 1)
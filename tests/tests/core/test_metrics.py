@@ -0,0 +1,68 @@
+import pathlib
+
+import pytest
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.test import Client
+from django.urls import reverse_lazy
+from prometheus_client import REGISTRY
+from prometheus_client.mmap_dict import MmapedDict, mmap_key
+from rest_framework import status
+
+from common.metrics import get_metrics
+from messenger.tasks import remove_stale_uploads
+from notifications.consumers import NotificationConsumer
+
+DEFAULT_TIMEOUT = 30
+
+
+@pytest.mark.django_db
+class TestMetrics:
+    def test_http_and_celery_metrics(self, client: Client) -> None:
+        remove_stale_uploads.apply()
+        client.get(reverse_lazy("schema"))
+
+        response = client.get(reverse_lazy("metrics"))
+        assert response.status_code == status.HTTP_200_OK
+        content = response.content.decode()
+        assert 'exwonder_http_request_duration_seconds_count{method="GET",status="200",view="schema"}' in content
+        assert 'task="messenger.tasks.remove_stale_uploads"' in content
+
+    def test_metrics_forbidden(self, client: Client) -> None:
+        response = client.get(reverse_lazy("metrics"), REMOTE_ADDR="10.0.0.1")
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_metrics_of_services_are_merged(self, monkeypatch: pytest.MonkeyPatch, tmp_path: pathlib.Path) -> None:
+        for service, pid in ("gunicorn", 10), ("daphne", 20):
+            (tmp_path / service).mkdir()
+            values = MmapedDict(str(tmp_path / service / f"counter_{pid}.db"))
+            key = mmap_key("exwonder_slow_queries", "exwonder_slow_queries_total", ["origin"], ["feed"], "Slow.")
+            values.write_value(key, 2.0, 0.0)
+            values.close()
+        monkeypatch.setenv("METRICS_MULTIPROC_ROOT", str(tmp_path))
+
+        assert 'exwonder_slow_queries_total{origin="feed"} 4.0' in get_metrics().decode()
+
+    async def test_websocket_metrics(self) -> None:
+        connections = get_connections_count()
+        communicator = WebsocketCommunicator(NotificationConsumer.as_asgi(), "/")
+        connected, _ = await communicator.connect(DEFAULT_TIMEOUT)
+        assert connected
+        assert get_connections_count() == (connections or 0) + 1
+
+        await communicator.send_json_to({"type": "authenticate", "token": "invalid", "user_id": 1})
+        assert await communicator.receive_json_from(DEFAULT_TIMEOUT) == {"authenticated": False}
+        await communicator.send_json_to({"type": "unsupported"})
+        await get_channel_layer().group_send("metrics", {"type": "notify"})
+        await communicator.disconnect()
+
+        assert get_connections_count() == (connections or 0)
+        for type_ in "authenticate", "unknown":
+            assert REGISTRY.get_sample_value(
+                "exwonder_websocket_message_duration_seconds_count", {"consumer": "notifications", "type": type_}
+            )
+        assert REGISTRY.get_sample_value("exwonder_channel_layer_send_duration_seconds_count", {"method": "group_send"})
+
+
+def get_connections_count() -> float:
+    return REGISTRY.get_sample_value("exwonder_websocket_connections", {"consumer": "NotificationConsumer"})
@@ -0,0 +1,103 @@
+import json
+
+import pytest
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from pytest_django.fixtures import SettingsWrapper
+from rest_framework.authtoken.models import Token
+
+from core.consumers import MESSENGER_TOPIC, NOTIFICATIONS_TOPIC, MultiplexConsumer
+from messenger.models import Chat
+from tests.factories import UserFactory
+
+User = get_user_model()
+
+DEFAULT_TIMEOUT = 30
+
+
+@pytest.mark.django_db
+class TestMultiplexConsumer:
+    async def get_authenticated_communicator(self, user: User) -> WebsocketCommunicator:
+        token = await database_sync_to_async(Token.objects.create)(user=user)  # noqa
+        communicator = WebsocketCommunicator(MultiplexConsumer.as_asgi(), "ws/")
+        connected, _ = await communicator.connect(DEFAULT_TIMEOUT)
+        assert connected
+
+        await communicator.send_json_to({"type": "authenticate", "token": token.key, "user_id": user.id})
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert response == {"authenticated": True, "topic": MESSENGER_TOPIC}
+        return communicator
+
+    async def test_messenger_topic(self, user: User, companion: User) -> None:
+        chat = await database_sync_to_async(Chat.objects.create)()  # noqa
+        await database_sync_to_async(chat.members.add)(user, companion)
+        communicator = await self.get_authenticated_communicator(user)
+
+        await communicator.send_json_to(
+            {
+                "topic": MESSENGER_TOPIC,
+                "type": "send_message",
+                "chat_id": chat.id,
+                "receiver": companion.id,
+                "body": "Hi",
+            }
+        )
+        assert await communicator.receive_json_from(DEFAULT_TIMEOUT) == {"success": True, "topic": MESSENGER_TOPIC}
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert response["type"] == "on_message"
+        assert response["topic"] == MESSENGER_TOPIC
+
+    async def test_notifications_topic(self, user: User) -> None:
+        communicator = await self.get_authenticated_communicator(user)
+
+        await communicator.send_json_to({"topic": NOTIFICATIONS_TOPIC, "type": "get_unreaded_notifications"})
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert response == {
+            "type": "get_unreaded_notifications",
+            "payload": [],
+            "cursor": None,
+            "topic": NOTIFICATIONS_TOPIC,
+        }
+
+        await get_channel_layer().group_send(f"user_{user.id}_notifications", {"type": "notify", "payload": {"id": 1}})
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert response == {"type": "notify", "payload": {"id": 1}, "unread_count": None, "topic": NOTIFICATIONS_TOPIC}
+
+    async def test_outbound_overflow_resync_topics(self, settings: SettingsWrapper) -> None:
+        settings.WEBSOCKET_OUTBOUND_QUEUE_SIZE = 2
+        consumer = MultiplexConsumer()
+        sent = []
+        consumer.send = lambda text_data=None, bytes_data=None: sync_to_async(sent.append)(json.loads(text_data))
+
+        consumer.topic = MESSENGER_TOPIC
+        for pk in range(3):
+            await consumer.send_event({"type": "on_message", "payload": {"id": pk}})
+        consumer.topic = NOTIFICATIONS_TOPIC
+        await consumer.outbound_task
+        assert sent == [{"type": "resync", "topic": MESSENGER_TOPIC}]
+
+    @pytest.fixture(autouse=True)
+    def clear_cache(self) -> None:
+        cache.clear()
+
+    @pytest.fixture
+    async def user(self) -> User:
+        return await self.create_user()
+
+    @pytest.fixture
+    async def companion(self) -> User:
+        return await self.create_user()
+
+    async def create_user(self) -> User:
+        return await database_sync_to_async(User.objects.create_user)(
+            username=UserFactory.stub().username,
+            password="testpass",
+            email="",
+            avatar=settings.DEFAULT_USER_AVATAR_PATH,
+            timezone=settings.DEFAULT_USER_TIMEZONE,
+        )
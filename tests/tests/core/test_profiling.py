@@ -0,0 +1,78 @@
+import os
+import pathlib
+import typing
+
+import pytest
+from channels.db import database_sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.urls import reverse_lazy
+from pytest_django.fixtures import SettingsWrapper
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from messenger.tasks import remove_stale_uploads
+from notifications.consumers import NotificationConsumer
+from tests.factories import UserFactory
+
+DEFAULT_TIMEOUT = 30
+
+
+@pytest.fixture(autouse=True)
+def profiling_dir(settings: SettingsWrapper, tmp_path: pathlib.Path) -> str:
+    settings.PROFILING_DIR = str(tmp_path)
+    return settings.PROFILING_DIR
+
+
+@pytest.mark.django_db
+class TestProfiling:
+    def test_profile_request(self, api_client: typing.Type[APIClient], user_factory: typing.Type[UserFactory]) -> None:
+        staff, user = user_factory.create(is_staff=True), user_factory.create()
+        client = api_client()
+
+        token = Token.objects.create(user=user)  # noqa
+        response = client.get(
+            reverse_lazy("notifications:notifications-list"),
+            HTTP_AUTHORIZATION=f"Token {token.key}",
+            HTTP_X_PROFILE="1",
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert "X-Profile" not in response
+
+        token = Token.objects.create(user=staff)  # noqa
+        response = client.get(
+            reverse_lazy("notifications:notifications-list"),
+            HTTP_AUTHORIZATION=f"Token {token.key}",
+            HTTP_X_PROFILE="1",
+        )
+        url = response["X-Profile"]
+
+        client.force_authenticate(user)
+        assert client.get(url).status_code == status.HTTP_403_FORBIDDEN
+
+        client.force_authenticate(staff)
+        response = client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert all(
+            line.rsplit(" ", 1)[1].isdigit() for line in b"".join(response.streaming_content).decode().splitlines()
+        )
+        assert client.get(url.replace(".folded", ".txt")).status_code == status.HTTP_404_NOT_FOUND
+
+    def test_profile_task(self, profiling_dir: str) -> None:
+        remove_stale_uploads.apply(headers={"profile": True})
+        assert [name for name in os.listdir(profiling_dir) if "task-messenger.tasks.remove_stale_uploads" in name]
+
+    async def test_profile_websocket_message(self, user_factory: typing.Type[UserFactory], profiling_dir: str) -> None:
+        staff = await database_sync_to_async(user_factory.create)(is_staff=True)
+        token = await database_sync_to_async(Token.objects.create)(user=staff)  # noqa
+        communicator = WebsocketCommunicator(NotificationConsumer.as_asgi(), "/")
+        await communicator.connect(DEFAULT_TIMEOUT)
+        await communicator.send_json_to({"type": "authenticate", "token": token.key, "user_id": staff.id})
+        assert await communicator.receive_json_from(DEFAULT_TIMEOUT) == {"authenticated": True}
+
+        await communicator.send_json_to({"type": "get_unread_count", "profile": True})
+        assert await communicator.receive_json_from(DEFAULT_TIMEOUT) == {"type": "unread_count", "unread_count": 0}
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert response["type"] == "profile"
+        assert os.path.basename(response["url"].rstrip("/")) in os.listdir(profiling_dir)
+        await communicator.disconnect()
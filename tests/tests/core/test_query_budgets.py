@@ -0,0 +1,226 @@
+import typing
+
+import pytest
+from asgiref.sync import async_to_sync
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from messenger.consumers import MessengerConsumer
+from messenger.models import Chat, ChatMember, Message
+from notifications.consumers import NotificationConsumer
+from notifications.models import Notification
+from posts.models import Comment, CommentLike, Post, PostImage, PostLike, Saved, Tag
+from tests.factories import UserFactory
+from tests.query_budgets import QueryBudget, assert_query_budget, capture_queries
+from users.models import Follow
+
+User = get_user_model()
+
+DEFAULT_TIMEOUT = 30
+
+
+def create_users(size: int) -> typing.List[User]:
+    return [UserFactory.create() for _ in range(size)]
+
+
+def create_posts(authors: typing.Sequence[User], tag: typing.Optional[Tag] = None) -> typing.List[Post]:
+    """One post per author with an image, a tag, a like and a comment."""
+
+    tag = tag or Tag.objects.create(name=UserFactory.username.function()[:16])  # noqa
+    reader = UserFactory.create()
+    posts = []
+    for author in authors:
+        post = Post.objects.create(author=author)  # noqa
+        post.tags.add(tag)
+        PostImage.objects.create(post=post, image="posts_images/image.jpg")  # noqa
+        PostLike.objects.create(author=reader, post=post)  # noqa
+        Comment.objects.create(author=reader, post=post, comment="Nice photo, really.")  # noqa
+        posts.append(post)
+    return posts
+
+
+def create_chats(viewer: User, size: int) -> typing.List[Chat]:
+    chats = []
+    for companion in create_users(size):
+        chat = Chat.objects.create(min_user=viewer, max_user=companion)  # noqa
+        ChatMember.objects.bulk_create(ChatMember(chat=chat, user=user) for user in (viewer, companion))  # noqa
+        chat.last_message = Message.objects.create(chat=chat, sender=companion, receiver=viewer, body="Hello")  # noqa
+        chat.save()
+        chats.append(chat)
+    return chats
+
+
+def create_notifications(viewer: User, size: int) -> None:
+    for post in create_posts(create_users(size)):
+        Notification.objects.create(recipient=viewer, author=post.author, post=post)  # noqa
+
+
+def build_posts_top(top: str) -> typing.Callable:
+    def build(viewer: User, size: int) -> tuple:
+        create_posts(create_users(size))
+        return reverse("posts:posts-list"), {"top": top}
+
+    return build
+
+
+def build_posts_updates(viewer: User, size: int) -> tuple:
+    authors = create_users(size)
+    Follow.objects.bulk_create(Follow(follower=viewer, following=author) for author in authors)  # noqa
+    create_posts(authors)
+    return reverse("posts:posts-list"), {"top": "updates"}
+
+
+def build_posts_recommended(viewer: User, size: int) -> tuple:
+    tag = Tag.objects.create(name=f"budget{size}")  # noqa
+    liked, *_ = create_posts(create_users(1), tag)
+    PostLike.objects.create(author=viewer, post=liked)  # noqa
+    create_posts(create_users(size), tag)
+    return reverse("posts:posts-list"), {"top": "recommended"}
+
+
+def build_post_retrieve(viewer: User, size: int) -> tuple:
+    post, *_ = create_posts([UserFactory.create()])
+    for user in create_users(size):
+        PostLike.objects.create(author=user, post=post)  # noqa
+        Comment.objects.create(author=user, post=post, comment="Nice photo, really.")  # noqa
+    return reverse("posts:posts-detail", kwargs={"id": post.id}), {}
+
+
+def build_comments(viewer: User, size: int) -> tuple:
+    post, *_ = create_posts([UserFactory.create()])
+    for user in create_users(size):
+        comment = Comment.objects.create(author=user, post=post, comment="Nice photo, really.")  # noqa
+        CommentLike.objects.create(author=viewer, comment=comment)  # noqa
+    return reverse("posts:comments-list"), {"post_id": post.id}
+
+
+def build_saved(viewer: User, size: int) -> tuple:
+    Saved.objects.bulk_create(Saved(owner=viewer, post=post) for post in create_posts(create_users(size)))  # noqa
+    return reverse("posts:saved-list"), {}
+
+
+def build_followers(viewer: User, size: int) -> tuple:
+    Follow.objects.bulk_create(Follow(follower=user, following=viewer) for user in create_users(size))  # noqa
+    return reverse("users:followers-list"), {}
+
+
+def build_followings(viewer: User, size: int) -> tuple:
+    Follow.objects.bulk_create(Follow(follower=viewer, following=user) for user in create_users(size))  # noqa
+    return reverse("users:followings-user", kwargs={"pk": viewer.id}), {}
+
+
+def build_users_search(viewer: User, size: int) -> tuple:
+    for index in range(size):
+        UserFactory.create(username=f"budget{size}_{index}")
+    return reverse("users:account-list"), {"search": "budget"}
+
+
+def build_user_info(viewer: User, size: int) -> tuple:
+    user = UserFactory.create()
+    Follow.objects.bulk_create(Follow(follower=follower, following=user) for follower in create_users(size))  # noqa
+    create_posts([user] * size)
+    return reverse("users:full-user"), {"username": user.username, "fields": "all"}
+
+
+def build_notifications(viewer: User, size: int) -> tuple:
+    create_notifications(viewer, size)
+    return reverse("notifications:notifications-list"), {}
+
+
+def build_connect_to_chats(viewer: User, size: int) -> tuple:
+    create_chats(viewer, size)
+    return MessengerConsumer, {"type": "connect_to_chats"}
+
+
+def build_chat_history(viewer: User, size: int) -> tuple:
+    chat, *_ = create_chats(viewer, 1)
+    for _ in range(size):
+        Message.objects.create(chat=chat, sender=viewer, receiver=chat.max_user, body="Hello")  # noqa
+    return MessengerConsumer, {"type": "get_chat_history", "chat": chat.id}
+
+
+def build_unread_notifications(viewer: User, size: int) -> tuple:
+    create_notifications(viewer, size)
+    return NotificationConsumer, {"type": "get_unreaded_notifications"}
+
+
+ENDPOINTS_BUDGETS = {
+    "posts_top_likes": (QueryBudget(7, "posts count"), build_posts_top("likes")),
+    "posts_top_recent": (QueryBudget(7, "posts count"), build_posts_top("recent")),
+    "posts_top_updates": (QueryBudget(5, "followings posts count"), build_posts_updates),
+    "posts_top_recommended": (QueryBudget(6, "posts with liked tags count"), build_posts_recommended),
+    "post_retrieve": (QueryBudget(3, "likes and comments count"), build_post_retrieve),
+    "comments": (QueryBudget(3, "comments count"), build_comments),
+    "saved": (QueryBudget(4, "saved posts count"), build_saved),
+    "followers": (QueryBudget(3, "followers count"), build_followers),
+    "followings": (QueryBudget(4, "followings count"), build_followings),
+    "users_search": (QueryBudget(2, "found users count"), build_users_search),
+    "user_info": (QueryBudget(1, "followers and posts count"), build_user_info),
+    "notifications": (QueryBudget(2, "notifications count"), build_notifications),
+}
+
+HANDLERS_BUDGETS = {
+    "connect_to_chats": (QueryBudget(4, "chats count"), build_connect_to_chats),
+    "get_chat_history": (QueryBudget(5, "messages count"), build_chat_history),
+    "get_unreaded_notifications": (QueryBudget(2, "notifications count"), build_unread_notifications),
+}
+
+
+async def communicate(consumer: type, viewer: User, token: str, message: dict) -> None:
+    communicator = WebsocketCommunicator(consumer.as_asgi(), "/")
+    await communicator.connect(DEFAULT_TIMEOUT)
+    await communicator.send_json_to({"type": "authenticate", "token": token, "user_id": viewer.id})
+    await communicator.receive_json_from(DEFAULT_TIMEOUT)
+    await communicator.send_json_to(message)
+    await communicator.receive_json_from(DEFAULT_TIMEOUT)
+    await communicator.disconnect()
+
+
+@pytest.mark.django_db
+class TestQueryBudgets:
+    def test_query_budget_reports_repeated_queries(self) -> None:
+        def measure(size: int) -> typing.List[str]:
+            create_users(size)
+            with capture_queries() as queries:
+                for user in User.objects.all():
+                    user.posts.count()
+            return queries
+
+        with pytest.raises(pytest.fail.Exception, match=r"(?s)must be constant in users count.*\+\d+ SELECT COUNT"):
+            assert_query_budget(QueryBudget(100, "users count"), measure)
+
+    @pytest.mark.parametrize("endpoint", ENDPOINTS_BUDGETS)
+    def test_endpoint_query_budget(self, endpoint: str) -> None:
+        budget, build = ENDPOINTS_BUDGETS[endpoint]
+
+        def measure(size: int) -> typing.List[str]:
+            viewer = UserFactory.create()
+            url, params = build(viewer, size)
+            client = APIClient()
+            client.force_authenticate(viewer)
+            cache.clear()
+            with capture_queries() as queries:
+                assert client.get(url, params).status_code == 200
+            return queries
+
+        assert_query_budget(budget, measure)
+
+    @pytest.mark.django_db(transaction=True)
+    @pytest.mark.parametrize("handler", HANDLERS_BUDGETS)
+    def test_consumer_handler_query_budget(self, handler: str) -> None:
+        budget, build = HANDLERS_BUDGETS[handler]
+
+        def measure(size: int) -> typing.List[str]:
+            viewer = UserFactory.create()
+            token = Token.objects.create(user=viewer)  # noqa
+            consumer, message = build(viewer, size)
+            cache.clear()
+            with capture_queries() as queries:
+                async_to_sync(communicate)(consumer, viewer, token.key, message)
+            return queries
+
+        assert_query_budget(budget, measure)
@@ -0,0 +1,95 @@
+import json
+import os
+import pathlib
+import typing
+
+import pytest
+from django.db import connection, transaction
+from django.test import Client
+from django.urls import reverse_lazy
+from pytest_django.fixtures import SettingsWrapper
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from common.slow_queries import explain, get_logs, get_slow_queries, is_explainable
+from tests.factories import UserFactory
+
+
+@pytest.fixture(autouse=True)
+def slow_queries_log(settings: SettingsWrapper, tmp_path: pathlib.Path) -> None:
+    settings.SLOW_QUERIES_LOG_FILE = str(tmp_path / "slow-queries.log")
+    settings.SLOW_QUERY_EXPLAIN_SAMPLE_RATE = 1
+
+
+@pytest.mark.django_db
+class TestSlowQueries:
+    def test_slow_queries_log(
+        self, settings: SettingsWrapper, api_client: typing.Type[APIClient], user_factory: typing.Type[UserFactory]
+    ) -> None:
+        user = user_factory.create()
+        client = api_client()
+        client.force_authenticate(user)
+
+        settings.SLOW_QUERY_THRESHOLD = 0
+        client.get(reverse_lazy("notifications:notifications-list"))
+        settings.SLOW_QUERY_THRESHOLD = 60
+
+        query = next(query for query in get_slow_queries(100) if "notifications_notification" in query["sql"])
+        assert query["origin"] == "notifications:notifications-list"
+        assert str(user.id) in query["params"]
+        assert query["plan"]
+        assert any("notifications/services.py" in frame for frame in query["stack"])
+
+    def test_slow_queries_admin_page(
+        self, settings: SettingsWrapper, client: Client, user_factory: typing.Type[UserFactory]
+    ) -> None:
+        settings.SLOW_QUERY_THRESHOLD = 0
+        user_factory.create_batch(2)
+        settings.SLOW_QUERY_THRESHOLD = 60
+
+        client.force_login(user_factory.create())
+        assert client.get(reverse_lazy("admin-slow-queries")).status_code == status.HTTP_302_FOUND
+
+        client.force_login(user_factory.create(is_staff=True))
+        response = client.get(reverse_lazy("admin-slow-queries"))
+        assert response.status_code == status.HTTP_200_OK
+        assert b"exwonder_users" in response.content
+
+    def test_slow_queries_log_rotation(self, settings: SettingsWrapper, user_factory: typing.Type[UserFactory]) -> None:
+        dead_log = pathlib.Path(f"{settings.SLOW_QUERIES_LOG_FILE}.{2**30}")
+        dead_log.write_text(json.dumps({"time": "2000-01-01T00:00:00+00:00", "sql": "SELECT 1"}) + "\n")
+        settings.SLOW_QUERIES_LOG_MAX_BYTES, settings.SLOW_QUERIES_LOG_BACKUP_COUNT = 4096, 2
+
+        settings.SLOW_QUERY_THRESHOLD = 0
+        for _ in range(20):
+            user_factory.create()
+        settings.SLOW_QUERY_THRESHOLD = 60
+
+        assert not dead_log.exists()
+        (paths,) = get_logs().values()
+        assert len(paths) == 3
+        assert all(os.path.getsize(path) <= 2 * settings.SLOW_QUERIES_LOG_MAX_BYTES for path in paths)
+
+        queries = get_slow_queries(5)
+        assert len(queries) == 5
+        assert [query["time"] for query in queries] == sorted((query["time"] for query in queries), reverse=True)
+
+    def test_explain_is_rolled_back(self, user_factory: typing.Type[UserFactory]) -> None:
+        user = user_factory.create()
+        with transaction.atomic():
+            assert explain(connection, "SELECT * FROM unknown_table", ()).startswith("EXPLAIN failed")
+            assert not connection.needs_rollback
+            user.refresh_from_db()
+
+    @pytest.mark.parametrize(
+        "sql, explainable",
+        (
+            ('SELECT "id" FROM "posts" WHERE "id" = %s', True),
+            ('SELECT "id" FROM "notifications_notification" LIMIT 10 FOR UPDATE SKIP LOCKED', False),
+            ('SELECT "id" FROM "chats" WHERE "id" = %s FOR NO KEY UPDATE', False),
+            ('SELECT "id" FROM "posts" FOR SHARE', False),
+            ('UPDATE "posts" SET "pinned" = %s', False),
+        ),
+    )
+    def test_only_plain_selects_are_explained(self, sql: str, explainable: bool) -> None:
+        assert is_explainable(sql) == explainable
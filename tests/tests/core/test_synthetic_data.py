@@ -0,0 +1,63 @@
+import pathlib
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.models import Count, F
+from pytest_django.fixtures import SettingsWrapper
+
+from common.synthetic import USERNAME_PREFIX
+from messenger.models import Chat, ChatMember, Message
+from notifications.models import Notification
+from posts.models import Post, PostImage, PostLike
+from users.models import Follow
+
+User = get_user_model()
+
+OPTIONS = {"tags": 20, "posts": 4, "likes": 10, "chats": 3, "messages": 5, "notifications": 5, "followings": 8}
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings: SettingsWrapper, tmp_path: pathlib.Path) -> None:
+    settings.MEDIA_ROOT = str(tmp_path)
+
+
+def get_snapshot() -> dict:
+    return {
+        "follows": set(Follow.objects.values_list("follower__username", "following__username")),
+        "posts": set(Post.objects.values_list("author__username", "signature")),  # noqa
+        "likes": set(PostLike.objects.values_list("author__username", "post__signature")),  # noqa
+        "messages": set(Message.objects.values_list("sender__username", "body")),  # noqa
+    }
+
+
+@pytest.mark.django_db
+class TestSyntheticData:
+    def test_generate_synthetic_data(self) -> None:
+        call_command("generate_synthetic_data", 50, **OPTIONS)
+
+        users = User.objects.filter(username__startswith=USERNAME_PREFIX)
+        assert users.count() == 50
+        assert Post.objects.exists() and PostLike.objects.exists() and Notification.objects.exists()  # noqa
+        assert not Post.objects.filter(images__isnull=True).exists()  # noqa
+        assert PostImage.objects.values("image").distinct().count() <= 8  # noqa
+
+        chats = Chat.objects.filter(max_user__in=users, seq__gt=0).annotate(members_count=Count("members"))  # noqa
+        assert chats.exists()
+        assert all(chat.members_count == 2 and chat.last_message.seq == chat.seq for chat in chats)
+        assert not ChatMember.objects.filter(chat__in=chats).exclude(last_read_message__chat=F("chat")).exists()  # noqa
+
+        user = User.objects.create_user("after_synthetic", "", "avatar.jpg", "Europe/London")  # sequences are reset
+        assert user.id > users.last().id
+
+    def test_synthetic_data_is_deterministic(self) -> None:
+        call_command("generate_synthetic_data", 30, seed=7, **OPTIONS)
+        snapshot = get_snapshot()
+        User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+
+        call_command("generate_synthetic_data", 30, seed=7, **OPTIONS)
+        assert get_snapshot() == snapshot
+
+        User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+        call_command("generate_synthetic_data", 30, seed=8, **OPTIONS)
+        assert get_snapshot() != snapshot
@@ -1,15 +1,30 @@
+import asyncio
+import base64
+import json
+from datetime import timedelta
 from typing import NamedTuple
 
 import pytest
+from asgiref.sync import sync_to_async
 from channels.db import database_sync_to_async
 from channels.testing import WebsocketCommunicator
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils import timezone
+from pytest_django.fixtures import SettingsWrapper
 from rest_framework.authtoken.models import Token
 
+from common.protocol import JSON_PROTOCOL, MSGPACK_DEFLATE_PROTOCOL, WireCodec
 from messenger.consumers import MessengerConsumer
-from messenger.models import Chat, Message
+from messenger.models import Chat, ChatEvent, ChatMember, Message
+from messenger.services import apply_chat_events_retention, create_message, mark_message, read_chat
+from messenger.tasks import sweep_presence
+from messenger.uploads import CHUNK_HEADER
 from tests.factories import UserFactory
+from users import presence
+from users.models import Follow
+from users.presence import is_user_online
 
 User = get_user_model()
 
@@ -54,6 +69,26 @@ class TestMessengerConsumer:
         response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
         assert response["type"] == "chat_started"
 
+    async def test_start_chat_with_self(self, user1: UserData) -> None:
+        communicator = await self.get_authenticated_communicator(user1)
+        await communicator.send_json_to({"type": "start_chat", "receiver": user1.user.id})
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert response == {"type": "chat_started", "payload": {"error_get_user": user1.user.id}}
+        assert not await database_sync_to_async(Chat.objects.filter(members=user1.user).exists)()  # noqa
+
+    async def test_start_chat_reuses_members_pair(self, user1: UserData, user2: UserData) -> None:
+        communicator = await self.get_authenticated_communicator(user1)
+        await communicator.send_json_to({"type": "start_chat", "receiver": user2.user.id})
+        first = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+
+        companion = await self.get_authenticated_communicator(user2)
+        await companion.send_json_to({"type": "start_chat", "receiver": user1.user.username})
+        second = await companion.receive_json_from(DEFAULT_TIMEOUT)
+
+        assert first["payload"]["id"] == second["payload"]["id"]
+        chats = Chat.objects.filter(members=user1.user).filter(members=user2.user)  # noqa
+        assert await database_sync_to_async(chats.count)() == 1
+
     async def test_send_message(self, user1: User, user2: User):
         chat = await database_sync_to_async(Chat.objects.create)()  # noqa
         await database_sync_to_async(chat.members.add)(user1.user, user2.user)
@@ -64,6 +99,111 @@ class TestMessengerConsumer:
         response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
         assert response["success"]
 
+    async def test_on_message_localized_for_receiver(self, user1: UserData, user2: UserData) -> None:
+        user2.user.timezone = "Asia/Tokyo"
+        await database_sync_to_async(user2.user.save)()
+        chat = await database_sync_to_async(Chat.objects.create)()  # noqa
+        await database_sync_to_async(chat.members.add)(user1.user, user2.user)
+        sender = await self.get_authenticated_communicator(user1)
+        receiver = await self.get_authenticated_communicator(user2)
+
+        await sender.send_json_to({"type": "send_message", "chat_id": chat.id, "receiver": user2.user.id, "body": "Hi"})
+        assert (await sender.receive_json_from(DEFAULT_TIMEOUT))["success"]
+        sent = await sender.receive_json_from(DEFAULT_TIMEOUT)
+        received = await receiver.receive_json_from(DEFAULT_TIMEOUT)
+
+        assert sent["payload"]["time_added"]["timezone"] == settings.DEFAULT_USER_TIMEZONE
+        assert received["payload"]["time_added"]["timezone"] == "Asia/Tokyo"
+        assert received["payload"]["body"] == sent["payload"]["body"] == "Hi"
+
+    async def test_upload_chunk_over_limit(self, user1: UserData, settings: SettingsWrapper) -> None:
+        settings.MESSENGER_UPLOAD_CHUNK_SIZE = 4
+        communicator = await self.get_authenticated_communicator(user1)
+        await communicator.send_json_to({"type": "upload_start", "name": "notes.txt", "size": 10})
+        upload_id = (await communicator.receive_json_from(DEFAULT_TIMEOUT))["upload_id"]
+
+        await communicator.send_to(bytes_data=CHUNK_HEADER.pack(bytes.fromhex(upload_id), 0) + b"x" * 5)
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert response == {"type": "upload_error", "upload_id": upload_id}
+
+    async def test_upload_chunk_json(self, user1: UserData) -> None:
+        communicator = await self.get_authenticated_communicator(user1)
+        await communicator.send_json_to({"type": "upload_start", "name": "notes.txt", "size": 10})
+        upload_id = (await communicator.receive_json_from(DEFAULT_TIMEOUT))["upload_id"]
+
+        chunk = {
+            "type": "upload_chunk",
+            "upload_id": upload_id,
+            "offset": 0,
+            "data": base64.b64encode(b"x" * 4).decode(),
+        }
+        await communicator.send_json_to(chunk)
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert response == {"type": "upload_progress", "upload_id": upload_id, "offset": 4}
+
+        for invalid in ({"offset": None}, {"data": "not base64!"}, {"upload_id": None}):
+            await communicator.send_json_to({k: v for k, v in (chunk | invalid).items() if v is not None})
+            response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+            assert response["type"] == "upload_error"
+
+    async def test_upload_chunk_locked(self, user1: UserData) -> None:
+        communicator = await self.get_authenticated_communicator(user1)
+        await communicator.send_json_to({"type": "upload_start", "name": "notes.txt", "size": 10})
+        upload_id = (await communicator.receive_json_from(DEFAULT_TIMEOUT))["upload_id"]
+        frame = CHUNK_HEADER.pack(bytes.fromhex(upload_id), 0) + b"x" * 4
+
+        lock_key = f"{settings.MESSENGER_UPLOAD_LOCKS_CACHE_NAME}{settings.USER_RELATED_CACHE_NAME_SEP}{upload_id}"
+        await sync_to_async(cache.add)(lock_key, True)
+        await communicator.send_to(bytes_data=frame)
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert response == {"type": "upload_progress", "upload_id": upload_id, "offset": 0}
+
+        await sync_to_async(cache.delete)(lock_key)
+        await communicator.send_to(bytes_data=frame)
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert response == {"type": "upload_progress", "upload_id": upload_id, "offset": 4}
+
+    async def test_send_message_with_chunked_upload(self, user1: UserData, user2: UserData) -> None:
+        chat = await database_sync_to_async(Chat.objects.create)()  # noqa
+        await database_sync_to_async(chat.members.add)(user1.user, user2.user)
+        communicator = await self.get_authenticated_communicator(user1)
+        content = b"attachment content"
+
+        await communicator.send_json_to({"type": "upload_start", "name": "notes.txt", "size": len(content)})
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert response["type"] == "upload_started"
+        upload_id = response["upload_id"]
+
+        await communicator.send_to(bytes_data=CHUNK_HEADER.pack(bytes.fromhex(upload_id), 0) + content[:10])
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert response == {"type": "upload_progress", "upload_id": upload_id, "offset": 10}
+
+        await communicator.send_to(bytes_data=CHUNK_HEADER.pack(bytes.fromhex(upload_id), 0) + content[:10])
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert response["offset"] == 10
+
+        await communicator.send_json_to({"type": "upload_start", "upload_id": upload_id})
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert response["offset"] == 10
+
+        await communicator.send_to(bytes_data=CHUNK_HEADER.pack(bytes.fromhex(upload_id), 10) + content[10:] + b"!")
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert response == {"type": "upload_error", "upload_id": upload_id}
+
+        await communicator.send_to(bytes_data=CHUNK_HEADER.pack(bytes.fromhex(upload_id), 10) + content[10:])
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert response["type"] == "upload_complete"
+
+        await communicator.send_json_to(
+            {"type": "send_message", "chat_id": chat.id, "receiver": user2.user.id, "upload_id": upload_id}
+        )
+        assert (await communicator.receive_json_from(DEFAULT_TIMEOUT))["success"]
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert response["payload"]["attachment"]["name"].startswith("notes")
+
+        message = await database_sync_to_async(Message.objects.get)(pk=response["payload"]["id"])  # noqa
+        assert await sync_to_async(lambda: message.attachment.read())() == content
+
     async def test_get_chat_history(self, user1: UserData, user2: UserData):
         chat = await database_sync_to_async(Chat.objects.create)()  # noqa
         await database_sync_to_async(chat.members.add)(user1.user, user2.user)
@@ -75,6 +215,33 @@ class TestMessengerConsumer:
         response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
         assert response["type"] == "get_chat_history"
 
+    async def test_get_chat_history_pages(self, user1: UserData, user2: UserData) -> None:
+        chat = await database_sync_to_async(Chat.objects.create)()  # noqa
+        await database_sync_to_async(chat.members.add)(user1.user, user2.user)
+        for body in ("first", "second", "third"):
+            await database_sync_to_async(Message.objects.create)(  # noqa
+                chat=chat, sender=user1.user, receiver=user2.user, body=body
+            )
+        communicator = await self.get_authenticated_communicator(user1)
+
+        await communicator.send_json_to({"type": "get_chat_history", "chat": chat.id, "limit": 2})
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert [message["body"] for message in response["payload"]] == ["third", "second"]
+        assert response["has_more"]
+
+        await communicator.send_json_to(
+            {"type": "get_chat_history", "chat": chat.id, "limit": 2, "before": response["before"]}
+        )
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert [message["body"] for message in response["payload"]] == ["first"]
+        assert not response["has_more"]
+
+        await communicator.send_json_to(
+            {"type": "get_chat_history", "chat": chat.id, "limit": 2, "after": response["after"]}
+        )
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert [message["body"] for message in response["payload"]] == ["third", "second"]
+
     async def test_delete_message(self, user1: UserData, user2: UserData):
         chat = await database_sync_to_async(Chat.objects.create)()  # noqa
         await database_sync_to_async(chat.members.add)(user1.user, user2.user)
@@ -85,6 +252,15 @@ class TestMessengerConsumer:
         await communicator.send_json_to({"type": "delete_message", "id": message.id})
         response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
         assert response["success"]
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert response["type"] == "send_delete_message"
+        assert response["chat"]["user"]["id"] == user2.user.id
+
+        await communicator.send_json_to({"type": "delete_message", "id": message.id})
+        assert (await communicator.receive_json_from(DEFAULT_TIMEOUT))["success"]
+        assert await communicator.receive_nothing()
+        events = ChatEvent.objects.filter(chat=chat, type=ChatEvent.EventType.DELETE)  # noqa
+        assert await database_sync_to_async(events.count)() == 1
 
     async def test_edit_message(self, user1: UserData, user2: UserData):
         chat = await database_sync_to_async(Chat.objects.create)()  # noqa
@@ -98,13 +274,330 @@ class TestMessengerConsumer:
         assert response["success"]
 
     async def test_delete_chat(self, user1: UserData, user2: UserData):
-        chat = await database_sync_to_async(Chat.objects.create)()  # noqa
+        min_user, max_user = sorted((user1.user, user2.user), key=lambda user: user.id)
+        chat = await database_sync_to_async(Chat.objects.create)(min_user=min_user, max_user=max_user)  # noqa
         await database_sync_to_async(chat.members.add)(user1.user, user2.user)
         communicator = await self.get_authenticated_communicator(user1)
+        await communicator.send_json_to(
+            {"type": "send_message", "chat_id": chat.id, "receiver": user2.user.id, "body": "Hi"}
+        )
+        await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        await communicator.receive_json_from(DEFAULT_TIMEOUT)
         await communicator.send_json_to({"type": "delete_chat", "id": chat.id})
         response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
         assert response["success"]
 
+        companion = await self.get_authenticated_communicator(user2)
+        await companion.send_json_to({"type": "start_chat", "receiver": user1.user.id})
+        response = await companion.receive_json_from(DEFAULT_TIMEOUT)
+        assert response["payload"]["id"] == chat.id
+        assert response["payload"]["unread_count"] == 0
+        assert (await database_sync_to_async(Chat.objects.get)(pk=chat.id)).last_message_id is None  # noqa
+
+    async def test_connect_to_chats(self, user1: UserData, user2: UserData) -> None:
+        chat = await database_sync_to_async(Chat.objects.create)()  # noqa
+        await database_sync_to_async(chat.members.add)(user1.user, user2.user)
+        communicator = await self.get_authenticated_communicator(user1)
+        await communicator.send_json_to(
+            {"type": "send_message", "chat_id": chat.id, "receiver": user2.user.id, "body": "Hi"}
+        )
+        await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        await communicator.receive_json_from(DEFAULT_TIMEOUT)
+
+        await communicator.send_json_to({"type": "connect_to_chats", "limit": 1})
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert response["type"] == "connect_to_chats"
+        assert response["cursor"]
+        assert response["payload"][0]["user"]["id"] == user2.user.id
+        assert response["payload"][0]["last_message"]["body"] == "Hi"
+
+        await communicator.send_json_to({"type": "connect_to_chats", "limit": 1, "cursor": response["cursor"]})
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert response["payload"] == []
+
+    async def test_connect_to_chats_by_member_activity(self, user1: UserData, user2: UserData) -> None:
+        communicator = await self.get_authenticated_communicator(user1)
+        chats = []
+        for receiver in user2.user, await database_sync_to_async(UserFactory.create)():
+            await communicator.send_json_to({"type": "start_chat", "receiver": receiver.id})
+            chats.append((await communicator.receive_json_from(DEFAULT_TIMEOUT))["payload"]["id"])
+        await communicator.send_json_to(
+            {"type": "send_message", "chat_id": chats[0], "receiver": user2.user.id, "body": "Hi"}
+        )
+        await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        await communicator.receive_json_from(DEFAULT_TIMEOUT)
+
+        pages, cursor = [], None
+        for _ in chats:
+            await communicator.send_json_to({"type": "connect_to_chats", "limit": 1, "cursor": cursor})
+            response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+            pages.append(response["payload"][0]["id"])
+            cursor = response["cursor"]
+        assert pages == chats
+
+    async def test_read_chat_unread_count(self, user1: UserData, user2: UserData) -> None:
+        chat = await database_sync_to_async(Chat.objects.create)()  # noqa
+        await database_sync_to_async(chat.members.add)(user1.user, user2.user)
+        sender = await self.get_authenticated_communicator(user1)
+        for body in ("first", "second"):
+            await sender.send_json_to(
+                {"type": "send_message", "chat_id": chat.id, "receiver": user2.user.id, "body": body}
+            )
+            await sender.receive_json_from(DEFAULT_TIMEOUT)
+            await sender.receive_json_from(DEFAULT_TIMEOUT)
+
+        receiver = await self.get_authenticated_communicator(user2)
+        await receiver.send_json_to({"type": "connect_to_chats"})
+        response = await receiver.receive_json_from(DEFAULT_TIMEOUT)
+        assert response["payload"][0]["unread_count"] == 2
+        assert not response["payload"][0]["last_message"]["is_read"]
+
+        await receiver.send_json_to({"type": "read_chat", "id": chat.id})
+        response = await receiver.receive_json_from(DEFAULT_TIMEOUT)
+        assert response["type"] == "send_read_chat"
+        assert response["user"] == user2.user.id
+
+        await receiver.send_json_to({"type": "connect_to_chats"})
+        response = await receiver.receive_json_from(DEFAULT_TIMEOUT)
+        assert response["payload"][0]["unread_count"] == 0
+        assert response["payload"][0]["last_message"]["is_read"]
+
+        assert (await sender.receive_json_from(DEFAULT_TIMEOUT))["type"] == "send_read_chat"
+        await sender.send_json_to({"type": "get_chat_history", "chat": chat.id})
+        response = await sender.receive_json_from(DEFAULT_TIMEOUT)
+        assert all(message["is_read"] for message in response["payload"])
+
+    async def test_read_chat_keeps_watermark_after_delete(self, user1: UserData, user2: UserData) -> None:
+        chat = await database_sync_to_async(Chat.objects.create)()  # noqa
+        await database_sync_to_async(chat.members.add)(user1.user, user2.user)
+        first, last = [
+            await database_sync_to_async(create_message)(chat.id, user2.user.id, body, None, user1.user)
+            for body in ("first", "last")
+        ]
+        assert await database_sync_to_async(read_chat)(chat.id, user2.user)
+
+        await database_sync_to_async(mark_message)(last.id, is_delete=True)
+        assert await database_sync_to_async(read_chat)(chat.id, user2.user) is None
+        membership = await database_sync_to_async(ChatMember.objects.get)(chat=chat, user=user2.user)  # noqa
+        assert membership.last_read_message_id == last.id
+
+    async def test_sync(self, user1: UserData, user2: UserData) -> None:
+        chat = await database_sync_to_async(Chat.objects.create)()  # noqa
+        await database_sync_to_async(chat.members.add)(user1.user, user2.user)
+        communicator = await self.get_authenticated_communicator(user1)
+        for body in ("first", "second"):
+            await communicator.send_json_to(
+                {"type": "send_message", "chat_id": chat.id, "receiver": user2.user.id, "body": body}
+            )
+            await communicator.receive_json_from(DEFAULT_TIMEOUT)
+            await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        await communicator.send_json_to({"type": "read_chat", "id": chat.id})  # already read by the sender
+        companion = await self.get_authenticated_communicator(user2)
+        await companion.send_json_to({"type": "read_chat", "id": chat.id})
+        await companion.receive_json_from(DEFAULT_TIMEOUT)
+        assert (await communicator.receive_json_from(DEFAULT_TIMEOUT))["user"] == user2.user.id
+
+        await communicator.send_json_to({"type": "sync", "chats": {str(chat.id): 1}})
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert [(event["type"], event["seq"]) for event in response["events"]] == [("message", 2), ("read", 3)]
+        assert response["events"][0]["message"]["body"] == "second"
+        assert response["events"][1]["user"] == user2.user.id
+        assert response["events"][1]["message"] == response["events"][0]["message"]["id"]
+        assert not response["has_more"]
+
+        outsider = await database_sync_to_async(Chat.objects.create)()  # noqa
+        await communicator.send_json_to({"type": "sync", "chats": {str(outsider.id): 0, str(chat.id): 3}})
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert response["events"] == []
+
+    async def test_sync_redacts_deleted_messages(self, user1: UserData, user2: UserData) -> None:
+        chat = await database_sync_to_async(Chat.objects.create)()  # noqa
+        await database_sync_to_async(chat.members.add)(user1.user, user2.user)
+        communicator = await self.get_authenticated_communicator(user1)
+        await communicator.send_json_to(
+            {"type": "send_message", "chat_id": chat.id, "receiver": user2.user.id, "body": "secret"}
+        )
+        await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        message = await database_sync_to_async(Message.objects.get)(chat=chat)  # noqa
+        await database_sync_to_async(Message.objects.filter(pk=message.id).update)(is_delete=True)  # noqa
+
+        await communicator.send_json_to({"type": "sync", "chats": {str(chat.id): 0}})
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert response["events"] == [{"type": "message", "chat": chat.id, "seq": 1, "message": message.id}]
+
+    @pytest.mark.parametrize("chats", [{"chat": "1"}, {"1": "seq"}, ["1"], "1"])
+    async def test_sync_with_invalid_chats(self, user1: UserData, chats: object) -> None:
+        communicator = await self.get_authenticated_communicator(user1)
+        await communicator.send_json_to({"type": "sync", "chats": chats})
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert response == {"type": "sync_error", "chats": chats}
+
+        await communicator.send_json_to({"type": "sync", "chats": {}})
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert response == {"type": "sync", "events": [], "has_more": False, "resync": []}
+
+    async def test_sync_after_retention(self, user1: UserData, user2: UserData) -> None:
+        chat = await database_sync_to_async(Chat.objects.create)()  # noqa
+        await database_sync_to_async(chat.members.add)(user1.user, user2.user)
+        communicator = await self.get_authenticated_communicator(user1)
+        for body in ("first", "second"):
+            await communicator.send_json_to(
+                {"type": "send_message", "chat_id": chat.id, "receiver": user2.user.id, "body": body}
+            )
+            await communicator.receive_json_from(DEFAULT_TIMEOUT)
+            await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        expired = timezone.now() - timedelta(days=settings.MESSENGER_CHAT_EVENTS_RETENTION_DAYS + 1)
+        await database_sync_to_async(ChatEvent.objects.filter(chat=chat, seq=1).update)(time_added=expired)  # noqa
+        await database_sync_to_async(apply_chat_events_retention)()
+
+        await communicator.send_json_to({"type": "sync", "chats": {str(chat.id): 0}})
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert response["events"] == [] and response["resync"] == [chat.id]
+
+        await communicator.send_json_to({"type": "sync", "chats": {str(chat.id): 1}})
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert [event["seq"] for event in response["events"]] == [2] and response["resync"] == []
+
+    async def test_presence_with_multiple_connections(self, user1: UserData) -> None:
+        first_communicator = await self.get_authenticated_communicator(user1)
+        second_communicator = await self.get_authenticated_communicator(user1)
+        assert await sync_to_async(is_user_online)(user1.user.id)
+
+        await first_communicator.disconnect()
+        assert await sync_to_async(is_user_online)(user1.user.id)
+
+        await second_communicator.disconnect()
+        assert not await sync_to_async(is_user_online)(user1.user.id)
+
+    async def test_presence_without_redis(self, settings: SettingsWrapper) -> None:
+        settings.CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+        settings.PRESENCE_TTL = 1
+
+        assert await sync_to_async(presence.connect)(1, "first")
+        assert not await sync_to_async(presence.connect)(1, "second")
+        assert await sync_to_async(presence.connect)(2, "crashed")
+        assert not await sync_to_async(presence.disconnect)(1, "first")
+        assert await sync_to_async(presence.get_users_online_statuses)([1, 2, 3]) == {1: True, 2: True, 3: False}
+        assert await sync_to_async(presence.pop_expired_users)() == []
+
+        await asyncio.sleep(settings.PRESENCE_TTL * 1.5)
+        assert not await sync_to_async(is_user_online)(2)
+        assert sorted(await sync_to_async(presence.pop_expired_users)()) == [1, 2]
+        assert await sync_to_async(presence.pop_expired_users)() == []
+
+    async def test_subscribe_presence(self, user1: UserData, user2: UserData) -> None:
+        communicator = await self.get_authenticated_communicator(user1)
+        await communicator.send_json_to({"type": "subscribe_presence", "users": [user2.user.id]})
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert response == {"type": "presence", "users": {str(user2.user.id): False}}
+
+        await self.get_authenticated_communicator(user2)
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert response["type"] == "user_online"
+        assert response["user"]["id"] == user2.user.id
+
+    async def test_subscribe_presence_visibility(self, user1: UserData, user2: UserData) -> None:
+        anonymous = await self.get_communicator(user1.user)
+        await anonymous.send_json_to({"type": "subscribe_presence", "users": [user2.user.id]})
+        assert await anonymous.receive_nothing()
+
+        private = await database_sync_to_async(UserFactory.create)(is_private=True)
+        communicator = await self.get_authenticated_communicator(user1)
+        await communicator.send_json_to({"type": "subscribe_presence", "users": [user2.user.id, private.id]})
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert response == {"type": "presence", "users": {str(user2.user.id): False}}
+
+        await database_sync_to_async(Follow.objects.create)(follower=user1.user, following=private)  # noqa
+        await communicator.send_json_to({"type": "subscribe_presence", "users": [private.id]})
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert response == {"type": "presence", "users": {str(private.id): False}}
+
+    async def test_presence_is_kept_by_server_heartbeat(self, user1: UserData, settings: SettingsWrapper) -> None:
+        settings.PRESENCE_HEARTBEAT_INTERVAL, settings.PRESENCE_TTL = 0.4, 1
+        communicator = await self.get_communicator(user1.user)
+        await communicator.send_json_to({"type": "heartbeat"})  # ignored until authenticated
+        await communicator.send_json_to({"type": "authenticate", "token": user1.token, "user_id": user1.user.id})
+        assert (await communicator.receive_json_from(DEFAULT_TIMEOUT))["authenticated"]
+
+        await asyncio.sleep(settings.PRESENCE_TTL * 2)
+        assert await sync_to_async(is_user_online)(user1.user.id)
+
+        await communicator.disconnect()
+        assert not await sync_to_async(is_user_online)(user1.user.id)
+
+    async def test_presence_of_crashed_connection_expires(
+        self, user1: UserData, user2: UserData, settings: SettingsWrapper
+    ) -> None:
+        communicator = await self.get_authenticated_communicator(user1)
+        await communicator.send_json_to({"type": "subscribe_presence", "users": [user2.user.id]})
+        await communicator.receive_json_from(DEFAULT_TIMEOUT)
+
+        settings.PRESENCE_TTL = 1
+        await sync_to_async(presence.connect)(user2.user.id, "crashed")
+        assert await sync_to_async(presence.set_announced_status)(user2.user.id, True)
+        assert not await sync_to_async(presence.set_announced_status)(user2.user.id, True)
+        await sync_to_async(sweep_presence.apply)()
+        assert await communicator.receive_nothing()  # still online
+
+        await asyncio.sleep(settings.PRESENCE_TTL * 1.5)
+        assert not await sync_to_async(is_user_online)(user2.user.id)
+
+        await sync_to_async(sweep_presence.apply)()
+        response = await communicator.receive_json_from(DEFAULT_TIMEOUT)
+        assert response["type"] == "user_offline"
+        assert response["user"]["id"] == user2.user.id
+
+    async def test_msgpack_deflate_protocol(self, user1: UserData) -> None:
+        communicator = WebsocketCommunicator(
+            MessengerConsumer.as_asgi(), "messenger/", subprotocols=[MSGPACK_DEFLATE_PROTOCOL, JSON_PROTOCOL]
+        )
+        connected, subprotocol = await communicator.connect(DEFAULT_TIMEOUT)
+        assert connected
+        assert subprotocol == MSGPACK_DEFLATE_PROTOCOL
+
+        codec = WireCodec(MSGPACK_DEFLATE_PROTOCOL)
+        for _ in range(2):
+            await communicator.send_to(
+                **codec.encode({"type": "authenticate", "token": user1.token, "user_id": user1.user.id})
+            )
+            response = await communicator.receive_from(DEFAULT_TIMEOUT)
+            assert codec.decode(None, response) == {"authenticated": True}
+
+    async def test_outbound_queue(self, settings: SettingsWrapper) -> None:
+        settings.WEBSOCKET_OUTBOUND_QUEUE_SIZE = 2
+        consumer = MessengerConsumer()
+        sent = []
+        consumer.send = lambda text_data=None, bytes_data=None: sync_to_async(sent.append)(json.loads(text_data))
+
+        await consumer.send_event({"type": "user_online", "user": {"id": 1}}, coalesce_key="presence:1")
+        await consumer.send_event({"type": "user_offline", "user": {"id": 1}}, coalesce_key="presence:1")
+        await consumer.outbound_task
+        assert sent == [{"type": "user_offline", "user": {"id": 1}}]
+
+        await consumer.send_payload({"success": True})
+        for pk in range(3):
+            await consumer.send_event({"type": "on_message", "payload": {"id": pk}})
+        await consumer.outbound_task
+        assert sent[1:] == [{"success": True}, {"type": "resync"}]
+
+    async def test_outbound_rate(self, settings: SettingsWrapper) -> None:
+        settings.WEBSOCKET_OUTBOUND_BURST, settings.WEBSOCKET_OUTBOUND_RATE = 1, 20
+        consumer = MessengerConsumer()
+        sent = []
+        consumer.send = lambda text_data=None, bytes_data=None: sync_to_async(sent.append)(json.loads(text_data))
+
+        await consumer.send_payload({"type": "presence", "users": {}})
+        await consumer.send_event({"type": "user_online", "user": {"id": 1}}, coalesce_key="presence:1")
+        await asyncio.sleep(0)  # the reply takes the burst, the event waits for the allowance
+        await consumer.send_event({"type": "user_offline", "user": {"id": 1}}, coalesce_key="presence:1")
+        await consumer.outbound_task
+        assert sent == [{"type": "presence", "users": {}}, {"type": "user_offline", "user": {"id": 1}}]
+
+    @pytest.fixture(autouse=True)
+    def clear_cache(self) -> None:
+        cache.clear()
+
     @pytest.fixture(autouse=True)
     async def user1(self) -> UserData:
         user = await database_sync_to_async(User.objects.create_user)(
@@ -0,0 +1,257 @@
+import asyncio
+import io
+import typing
+from datetime import timedelta
+
+import pytest
+from asgiref.sync import async_to_sync
+from channels.layers import BaseChannelLayer, get_channel_layer
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.urls import reverse_lazy
+from django.utils import timezone
+from pytest_django import DjangoAssertNumQueries
+from pytest_django.fixtures import SettingsWrapper
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from notifications.models import ArchivedNotification, Notification
+from notifications.retention import apply_notifications_retention
+from notifications.services import (
+    create_notifications,
+    get_unread_notifications_count,
+    mark_all_notifications_read,
+    pop_notifications_digests,
+    schedule_notifications_digests,
+)
+from notifications.tasks import send_notifications
+from posts.models import Post
+from tests.factories import UserFactory
+from users.models import Follow
+
+User = get_user_model()
+
+RECEIVE_TIMEOUT = 5
+
+
+@pytest.fixture(autouse=True)
+def clear_cache() -> None:
+    cache.clear()
+
+
+async def receive(channel_layer: BaseChannelLayer, channel: str) -> dict:
+    return await asyncio.wait_for(channel_layer.receive(channel), RECEIVE_TIMEOUT)
+
+
+@pytest.mark.django_db
+class TestSendNotifications:
+    def test_send_notifications_in_chunks(
+        self, settings: SettingsWrapper, user_factory: typing.Type[UserFactory]
+    ) -> None:
+        settings.NOTIFICATIONS_FANOUT_CHUNK_SIZE = 2
+        author = user_factory.create()
+        followers = user_factory.create_batch(5)
+        Follow.objects.bulk_create(Follow(follower=follower, following=author) for follower in followers)  # noqa
+
+        channel_layer = get_channel_layer()
+        channel = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)(f"user_{followers[0].id}_notifications", channel)
+
+        post = Post.objects.create(author=author)  # noqa
+        send_notifications(post.id)
+
+        notifications = Notification.objects.filter(post=post)  # noqa
+        assert sorted(notifications.values_list("recipient_id", flat=True)) == sorted(user.id for user in followers)
+
+        message = async_to_sync(receive)(channel_layer, channel)
+        assert message["type"] == "notify"
+        assert message["payload"]["id"] == notifications.get(recipient=followers[0]).id
+        assert message["payload"]["receiver"]["id"] == author.id
+        assert not message["payload"]["is_read"]
+
+    def test_coalesce_notifications(self, user_factory: typing.Type[UserFactory]) -> None:
+        author = user_factory.create()
+        follower = user_factory.create()
+        Follow.objects.create(follower=follower, following=author)  # noqa
+
+        channel_layer = get_channel_layer()
+        channel = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)(f"user_{follower.id}_notifications", channel)
+
+        posts = [Post.objects.create(author=author) for _ in range(3)]  # noqa
+        for post in posts:
+            send_notifications(post.id)
+
+        notification = Notification.objects.get(recipient=follower)  # noqa
+        assert notification.author_id == author.id
+        assert notification.post_id == posts[-1].id
+        assert notification.posts_count == 3
+
+        for posts_count in range(1, 4):
+            message = async_to_sync(receive)(channel_layer, channel)
+            assert message["payload"]["id"] == notification.id
+            assert message["payload"]["posts_count"] == posts_count
+
+        notification.is_read = True
+        notification.save()
+        send_notifications(Post.objects.create(author=author).id)  # noqa
+        assert Notification.objects.filter(recipient=follower).count() == 2  # noqa
+
+    def test_coalesce_notifications_window(
+        self, settings: SettingsWrapper, user_factory: typing.Type[UserFactory]
+    ) -> None:
+        author, follower = user_factory.create_batch(2)
+        create_notifications(Post.objects.create(author=author), [follower.id])  # noqa
+        assert get_unread_notifications_count(follower.id) == 1
+
+        expired_at = timezone.now() - timedelta(seconds=settings.NOTIFICATIONS_COALESCE_WINDOW + 1)
+        Notification.objects.filter(recipient=follower).update(time_updated=expired_at)  # noqa
+        post = Post.objects.create(author=author)  # noqa
+        (created,), coalesced = create_notifications(post, [follower.id])
+
+        assert not coalesced
+        assert Notification.objects.filter(recipient=follower, is_read=True).get().time_updated == expired_at  # noqa
+        assert Notification.objects.get(recipient=follower, is_read=False).post == post  # noqa
+        assert created.posts_count == 1
+        assert get_unread_notifications_count(follower.id) == 1
+
+    def test_notifications_digest(self, user_factory: typing.Type[UserFactory]) -> None:
+        authors = user_factory.create_batch(2)
+        follower = user_factory.create(is_notifications_digest=True)
+
+        assert schedule_notifications_digests([follower.id], timezone.now()) == [follower.id]
+        for author in authors:
+            create_notifications(Post.objects.create(author=author), [follower.id])  # noqa
+            assert schedule_notifications_digests([follower.id], timezone.now()) == []
+
+        digests = pop_notifications_digests([follower.id])
+        assert sorted(notification.author_id for notification in digests[follower.id]) == sorted(
+            author.id for author in authors
+        )
+        assert pop_notifications_digests([follower.id]) == {}
+
+    def test_send_notifications_digest(self, user_factory: typing.Type[UserFactory]) -> None:
+        author = user_factory.create()
+        follower = user_factory.create(is_notifications_digest=True)
+        Follow.objects.create(follower=follower, following=author)  # noqa
+
+        channel_layer = get_channel_layer()
+        channel = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)(f"user_{follower.id}_notifications", channel)
+
+        send_notifications(Post.objects.create(author=author).id)  # noqa
+
+        message = async_to_sync(receive)(channel_layer, channel)
+        assert message["type"] == "notify_digest"
+        assert [notification["receiver"]["id"] for notification in message["payload"]] == [author.id]
+        assert message["unread_count"] == 1
+
+
+@pytest.mark.django_db
+class TestNotificationViewSet:
+    def test_unread_notifications_pages(
+        self,
+        api_client: typing.Type[APIClient],
+        user_factory: typing.Type[UserFactory],
+        django_assert_num_queries: DjangoAssertNumQueries,
+    ) -> None:
+        *authors, author, follower = user_factory.create_batch(4)
+        Follow.objects.bulk_create(Follow(follower=follower, following=user) for user in (*authors, author))  # noqa
+        for user in (*authors, author):
+            send_notifications(Post.objects.create(author=user).id)  # noqa
+
+        client = api_client()
+        client.force_authenticate(follower)
+        response = client.get(reverse_lazy("notifications:notifications-list"), {"limit": 2})
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data["results"]) == 2
+        assert response.data["unread_count"] == 3
+
+        response = client.get(reverse_lazy("notifications:notifications-list"), {"cursor": response.data["cursor"]})
+        assert len(response.data["results"]) == 1
+        assert response.data["cursor"] is None
+
+        with django_assert_num_queries(0):
+            assert get_unread_notifications_count(follower.id) == 3
+
+        notification = Notification.objects.get(recipient=follower, author=authors[0])  # noqa
+        response = client.post(reverse_lazy("notifications:notifications-read", kwargs={"pk": notification.pk}))
+        assert response.data == {"unread_count": 2}
+        response = client.post(reverse_lazy("notifications:notifications-read", kwargs={"pk": notification.pk}))
+        assert response.data == {"unread_count": 2}
+
+        send_notifications(Post.objects.create(author=authors[1]).id)  # noqa
+        response = client.get(reverse_lazy("notifications:notifications-unread-count"))
+        assert response.data == {"unread_count": 2}
+        response = client.get(reverse_lazy("notifications:notifications-list"), {"limit": 1})
+        assert response.data["results"][0]["posts_count"] == 2  # the updated notification comes first
+
+        other_author = user_factory.create()
+        Follow.objects.create(follower=follower, following=other_author)  # noqa
+        send_notifications(Post.objects.create(author=other_author).id)  # noqa
+        response = client.get(reverse_lazy("notifications:notifications-unread-count"))
+        assert response.data == {"unread_count": 3}
+
+        response = client.post(reverse_lazy("notifications:notifications-read-all"))
+        assert response.data == {"unread_count": 0}
+        assert not Notification.objects.filter(recipient=follower, is_read=False).exists()  # noqa
+
+    def test_unread_count_changed_while_counting(self, user_factory: typing.Type[UserFactory]) -> None:
+        author, follower = user_factory.create_batch(2)
+        create_notifications(Post.objects.create(author=author), [follower.id])  # noqa
+
+        def notify_while_counting(execute: typing.Callable, sql: str, *args) -> object:
+            result = execute(sql, *args)
+            if "COUNT" in sql:
+                create_notifications(Post.objects.create(author=user_factory.create()), [follower.id])  # noqa
+            return result
+
+        with connection.execute_wrapper(notify_while_counting):
+            assert get_unread_notifications_count(follower.id) == 1  # counted before the second notification
+
+        assert get_unread_notifications_count(follower.id) == 2
+        mark_all_notifications_read(follower.id)
+        assert get_unread_notifications_count(follower.id) == 0
+
+
+@pytest.mark.django_db
+class TestNotificationsRetention:
+    def test_archive_read_notifications(
+        self, settings: SettingsWrapper, user_factory: typing.Type[UserFactory]
+    ) -> None:
+        settings.NOTIFICATIONS_ARCHIVE_BATCH_SIZE = 2
+        author = user_factory.create()
+        followers = user_factory.create_batch(5)
+        Follow.objects.bulk_create(Follow(follower=follower, following=author) for follower in followers)  # noqa
+        send_notifications(Post.objects.create(author=author).id)  # noqa
+
+        old = timezone.now() - timedelta(days=settings.NOTIFICATIONS_RETENTION_DAYS + 1)
+        Notification.objects.filter(recipient__in=followers[:3]).update(is_read=True, time_updated=old)  # noqa
+        Notification.objects.filter(recipient=followers[3]).update(is_read=True)  # noqa
+        Notification.objects.filter(recipient=followers[4]).update(time_updated=old)  # noqa
+
+        assert apply_notifications_retention() == (3, 0)
+        assert (
+            set(ArchivedNotification.objects.values_list("recipient_id", flat=True))
+            == {  # noqa
+                follower.id for follower in followers[:3]
+            }
+        )
+        assert (
+            set(Notification.objects.values_list("recipient_id", flat=True))
+            == {  # noqa
+                follower.id for follower in followers[3:]
+            }
+        )
+
+        ArchivedNotification.objects.update(  # noqa
+            time_archived=timezone.now() - timedelta(days=settings.NOTIFICATIONS_ARCHIVE_RETENTION_DAYS + 1)
+        )
+        assert apply_notifications_retention() == (0, 3)
+        assert not ArchivedNotification.objects.exists()  # noqa
+
+        output = io.StringIO()
+        call_command("notifications_stats", stdout=output)
+        assert "unread       1" in output.getvalue()
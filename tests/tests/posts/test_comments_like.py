@@ -1,3 +1,5 @@
+import typing
+
 import pytest
 from django.contrib.auth import get_user_model
 from django.urls import reverse_lazy
@@ -5,7 +7,7 @@ from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.test import APIClient
 
-from posts.models import PostLike
+from posts.models import CommentLike, PostLike
 from tests import GenericTest
 
 User = get_user_model()
@@ -38,3 +40,20 @@ class TestLikesDelete(GenericTest):
     def assert_case_test(self, response: Response, *args) -> None:
         assert response.status_code == status.HTTP_204_NO_CONTENT
         assert PostLike.objects.filter().count() == 0  # noqa
+
+
+class TestLikesRepeat(GenericTest):
+    endpoint_list = "posts:comment-likes-list"
+
+    def test_likes_repeat(self, api_client: typing.Type[APIClient]) -> None:
+        super().make_test(api_client)
+
+    def case_test(self, client: APIClient, instance: User) -> Response:
+        user, comment_id = self.register_comment_like(client, instance)
+        client.force_authenticate(instance)
+        return client.post(reverse_lazy(self.endpoint_list), data={"comment_id": comment_id})
+
+    def assert_case_test(self, response: Response, *args) -> None:
+        like = CommentLike.objects.get()  # noqa
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data["id"] == like.id
@@ -1,3 +1,5 @@
+import typing
+
 import pytest
 from django.contrib.auth import get_user_model
 from django.urls import reverse_lazy
@@ -38,3 +40,20 @@ class TestLikesDelete(GenericTest):
     def assert_case_test(self, response: Response, *args) -> None:
         assert response.status_code == status.HTTP_204_NO_CONTENT
         assert PostLike.objects.filter().count() == 0  # noqa
+
+
+class TestLikesRepeat(GenericTest):
+    endpoint_list = "posts:likes-list"
+
+    def test_likes_repeat(self, api_client: typing.Type[APIClient]) -> None:
+        super().make_test(api_client)
+
+    def case_test(self, client: APIClient, instance: User) -> Response:
+        user, post_id = self.register_like(client, instance)
+        client.force_authenticate(instance)
+        return client.post(reverse_lazy(self.endpoint_list), data={"post_id": post_id})
+
+    def assert_case_test(self, response: Response, *args) -> None:
+        like = PostLike.objects.get()  # noqa
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data["id"] == like.id
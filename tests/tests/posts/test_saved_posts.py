@@ -1,9 +1,10 @@
 import json
+import typing
 
 import pytest
 from django.contrib.auth import get_user_model
 from django.urls import reverse_lazy
-from rest_framework import status
+from rest_framework import serializers, status
 from rest_framework.response import Response
 from rest_framework.test import APIClient
 
@@ -24,6 +25,24 @@ class TestSavedCreation(GenericTest):
         self.register_saved_post(client, instance)
 
 
+class TestSavedRepeat(GenericTest):
+    endpoint_list = "posts:saved-list"
+
+    def test_saved_repeat(self, api_client: typing.Type[APIClient]) -> None:
+        super().make_test(api_client)
+
+    def case_test(self, client: APIClient, instance: User) -> Response:
+        post = self.register_saved_post(client, instance)
+        client.force_authenticate(instance)
+        return client.post(reverse_lazy(self.endpoint_list), data={"post_id": post.id})
+
+    def assert_case_test(self, response: Response, *args) -> None:
+        saved = Saved.objects.get()  # noqa
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data["id"] == saved.id
+        assert response.data["time_added"] == serializers.DateTimeField().to_representation(saved.time_added)
+
+
 class TestSavedPosts(AssertContentKeysMixin, GenericTest):
     endpoint_list = "posts:saved-list"
 
@@ -24,6 +24,21 @@ class TestFollowingsCreation(IterableFollowingRelationsMixin, GenericTest):
         super().make_test(api_client)
 
 
+class TestFollowingsRepeat(IterableFollowingRelationsMixin, GenericTest):
+    endpoint_list = "users:followings-list"
+
+    def test_followings_repeat(self, api_client: typing.Type[APIClient]) -> None:
+        super().make_test(api_client)
+
+    def case_test(self, client: APIClient, instance: typing.Tuple) -> typing.Tuple[Response, User]:
+        client.force_authenticate(instance[0])
+        return client.post(reverse_lazy(self.endpoint_list), data={"following": instance[1].pk}), instance[0]
+
+    def assert_case_test(self, response: Response, *args) -> None:
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data["id"] == args[0].following.get().id
+
+
 class TestFollowingsDisfollow(IterableFollowingRelationsMixin, GenericTest):
     endpoint_list = "users:followings-list"
     endpoint_disfollow = "users:followings-disfollow"
@@ -2,6 +2,7 @@ from django.contrib import admin, messages
 from django.contrib.auth import get_user_model
 
 from users.models import ExwonderUser, Follow
+from users.presence import is_user_online
 
 User = get_user_model()
 
@@ -50,6 +51,10 @@ class ExwonderUserAdmin(admin.ModelAdmin):
     def description(self, user: User) -> str:
         return user.desc
 
+    @admin.display(description="Is user online", boolean=True)
+    def is_online(self, user: User) -> bool:
+        return is_user_online(user.pk)
+
     @admin.action(description="Give superuser permissions")
     def set_superuser(self, request, queryset):
         count = queryset.update(is_superuser=True)
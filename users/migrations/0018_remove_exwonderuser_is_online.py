@@ -0,0 +1,17 @@
+# Generated by Django 5.1.1 on 2026-10-19 01:37
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0017_exwonderuser_comments_private_status'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='exwonderuser',
+            name='is_online',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-19 02:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0018_remove_exwonderuser_is_online'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exwonderuser',
+            name='is_notifications_digest',
+            field=models.BooleanField(default=False, verbose_name='Is notifications delivered in digest'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.1 on 2026-10-19 03:22
+
+from django.db import migrations, models
+
+from common.operations import AddUniqueConstraintConcurrently, DeleteDuplicates
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('users', '0019_exwonderuser_is_notifications_digest'),
+    ]
+
+    operations = [
+        DeleteDuplicates(model_name='follow', fields=('follower', 'following')),
+        AddUniqueConstraintConcurrently(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('follower', 'following'), name='follows_unique'),
+        ),
+    ]
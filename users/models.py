@@ -71,6 +71,7 @@ class ExwonderUser(AbstractBaseUser, PermissionsMixin):
     penultimate_login = models.DateTimeField(verbose_name=_("Penultimate login"), blank=True, null=True)
     is_2fa_enabled = models.BooleanField(verbose_name=_("Is 2FA enabled"), default=False)
     is_private = models.BooleanField(verbose_name=_("Is account private"), default=False)
+    is_notifications_digest = models.BooleanField(verbose_name=_("Is notifications delivered in digest"), default=False)
     comments_private_status = models.CharField(
         choices=CommentsPrivateStatus.choices, max_length=10, default=CommentsPrivateStatus.EVERYONE
     )
@@ -79,7 +80,6 @@ class ExwonderUser(AbstractBaseUser, PermissionsMixin):
         _("Staff status"),
         default=False,
     )
-    is_online = models.BooleanField(_("Is user online"), default=False)
 
     USERNAME_FIELD = "username"
     objects = ExwonderUserManager()
@@ -106,6 +106,7 @@ class Follow(models.Model):
         ordering = ("-pk",)
         verbose_name = _("Follow")
         verbose_name_plural = _("Follows")
+        constraints = (models.UniqueConstraint(fields=("follower", "following"), name="follows_unique"),)
 
     def __str__(self):
         return f"{self.follower.pk} following for {self.following.pk}"  # noqa
@@ -0,0 +1,149 @@
+import time
+import typing
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.redis import RedisCache
+
+if typing.TYPE_CHECKING:
+    import redis
+
+
+def _presence_key(cache_name: str, user_id: int) -> str:
+    return f"{cache_name}{settings.USER_RELATED_CACHE_NAME_SEP}{user_id}"
+
+
+def get_presence_group_name(user_id: int) -> str:
+    return f"user_{user_id}_presence"
+
+
+def _connections_key(user_id: int) -> str:
+    return cache.make_key(_presence_key(settings.PRESENCE_CONNECTIONS_CACHE_NAME, user_id))
+
+
+def _users_key() -> str:
+    return cache.make_key(settings.PRESENCE_USERS_CACHE_NAME)
+
+
+def _get_redis_client() -> typing.Optional["redis.Redis"]:
+    """
+    Raw client of the Redis cache for sorted sets and pipelines. Other backends (e.g. locmem in tests and
+    benchmarks) get None, presence then keeps the same data in plain cache values without atomicity.
+    """
+
+    backend = caches[DEFAULT_CACHE_ALIAS]
+    return backend._cache.get_client(write=True) if isinstance(backend, RedisCache) else None  # noqa
+
+
+def _get_cached_connections(user_id: int, now: float) -> typing.Dict[str, float]:
+    connections = cache.get(_presence_key(settings.PRESENCE_CONNECTIONS_CACHE_NAME, user_id), {})
+    return {connection_id: expiry for connection_id, expiry in connections.items() if expiry > now}
+
+
+def _set_cached_connections(user_id: int, connections: typing.Dict[str, float]) -> None:
+    cache.set(_presence_key(settings.PRESENCE_CONNECTIONS_CACHE_NAME, user_id), connections, settings.PRESENCE_TTL)
+
+
+def connect(user_id: int, connection_id: str) -> bool:
+    """
+    Registers or refreshes a user connection for `PRESENCE_TTL`. Connections are kept in a sorted set by expiry,
+    so a connection of a crashed worker expires on its own, and the user is indexed by its latest expiry for
+    `pop_expired_users`. Returns True if the user had no live connections.
+    """
+
+    now, ttl = time.time(), settings.PRESENCE_TTL
+    client = _get_redis_client()
+    if client is None:
+        connections = _get_cached_connections(user_id, now)
+        _set_cached_connections(user_id, {**connections, connection_id: now + ttl})
+        users = cache.get(settings.PRESENCE_USERS_CACHE_NAME, {})
+        users[user_id] = max(users.get(user_id, 0), now + ttl)
+        cache.set(settings.PRESENCE_USERS_CACHE_NAME, users, None)
+        return not connections
+
+    key = _connections_key(user_id)
+    pipeline = client.pipeline()
+    pipeline.zremrangebyscore(key, "-inf", now)
+    pipeline.zcard(key)
+    pipeline.zadd(key, {connection_id: now + ttl})
+    pipeline.pexpire(key, int(ttl * 1000))
+    pipeline.zadd(_users_key(), {user_id: now + ttl}, gt=True)
+    _, connections, *_ = pipeline.execute()
+    return connections == 0
+
+
+def disconnect(user_id: int, connection_id: str) -> bool:
+    """Unregisters user connection. Returns True if the user has no live connections left."""
+
+    client = _get_redis_client()
+    if client is None:
+        connections = _get_cached_connections(user_id, time.time())
+        connections.pop(connection_id, None)
+        _set_cached_connections(user_id, connections)
+        return not connections
+
+    key = _connections_key(user_id)
+    pipeline = client.pipeline()
+    pipeline.zrem(key, connection_id)
+    pipeline.zcount(key, time.time(), "+inf")
+    _, connections = pipeline.execute()
+    return connections == 0
+
+
+def is_user_online(user_id: int) -> bool:
+    client = _get_redis_client()
+    if client is None:
+        return bool(_get_cached_connections(user_id, time.time()))
+    return bool(client.zcount(_connections_key(user_id), time.time(), "+inf"))
+
+
+def get_users_online_statuses(user_ids: typing.Iterable[int]) -> typing.Dict[int, bool]:
+    user_ids, now = list(set(user_ids)), time.time()
+    if not user_ids:
+        return {}
+
+    client = _get_redis_client()
+    if client is None:
+        keys = {_presence_key(settings.PRESENCE_CONNECTIONS_CACHE_NAME, user_id): user_id for user_id in user_ids}
+        cached = cache.get_many(keys)
+        return {user_id: any(expiry > now for expiry in cached.get(key, {}).values()) for key, user_id in keys.items()}
+
+    pipeline = client.pipeline(transaction=False)
+    for user_id in user_ids:
+        pipeline.zcount(_connections_key(user_id), now, "+inf")
+    return {user_id: bool(connections) for user_id, connections in zip(user_ids, pipeline.execute())}
+
+
+def pop_expired_users() -> typing.List[int]:
+    """
+    Removes and returns users whose latest connection expired, e.g. because their worker crashed before
+    disconnect. Every refresh moves the user expiry forward, so a single range over the users index finds them.
+    """
+
+    now, client = time.time(), _get_redis_client()
+    if client is None:
+        users = cache.get(settings.PRESENCE_USERS_CACHE_NAME, {})
+        expired = [user_id for user_id, expiry in users.items() if expiry <= now]
+        if expired:
+            live = {user_id: expiry for user_id, expiry in users.items() if expiry > now}
+            cache.set(settings.PRESENCE_USERS_CACHE_NAME, live, None)
+        return expired
+
+    pipeline = client.pipeline()
+    pipeline.zrangebyscore(_users_key(), "-inf", now)
+    pipeline.zremrangebyscore(_users_key(), "-inf", now)
+    expired, _ = pipeline.execute()
+    return [int(user_id) for user_id in expired]
+
+
+def set_announced_status(user_id: int, is_online: bool) -> bool:
+    """
+    Remembers the last presence status broadcasted to other users, so flapping connections
+    produce no broadcast. Returns True if the status was changed and must be broadcasted.
+    The key exists while the user is announced online, `add` and `delete` make the transition atomic.
+    """
+
+    key = _presence_key(settings.PRESENCE_ANNOUNCED_CACHE_NAME, user_id)
+    if is_online:
+        return cache.add(key, True, settings.PRESENCE_ANNOUNCED_CACHE_TIME)
+    return cache.delete(key)
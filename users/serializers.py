@@ -1,3 +1,4 @@
+import operator
 import typing
 import urllib.parse
 
@@ -5,10 +6,13 @@ import pytz
 from dj_rest_auth.serializers import PasswordResetSerializer as PasswordResetSerializerCore
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import models
 from rest_framework import serializers
 
+from common.services import create_or_get
 from users.forms import PasswordResetForm
 from users.models import Follow
+from users.presence import get_users_online_statuses, is_user_online
 from users.services import PathImageTypeEnum, get_upload_crop_path
 from users.tasks import make_center_crop
 
@@ -21,12 +25,37 @@ class UserAvatarField(serializers.ImageField):
         return urllib.parse.urljoin(media_url, get_upload_crop_path(str(value), PathImageTypeEnum.AVATAR))
 
 
-class UserDefaultSerializer(serializers.ModelSerializer):
+class PresenceListSerializer(serializers.ListSerializer):
+    def to_representation(self, data: typing.Union[models.manager.BaseManager, typing.Iterable[models.Model]]) -> list:
+        instances = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        user_ids = [user_id for instance in instances for user_id in self.child.get_presence_user_ids(instance)]
+        self.context.setdefault("presence", {}).update(get_users_online_statuses(user_ids))
+        return super().to_representation(instances)
+
+
+class PresenceSerializerMixin:
+    presence_user_fields: typing.Tuple[str, ...] = ()
+
+    def get_presence_user_ids(self, instance: models.Model) -> typing.List[int]:
+        return [operator.attrgetter(field)(instance) for field in self.presence_user_fields]
+
+
+class UserDefaultSerializer(PresenceSerializerMixin, serializers.ModelSerializer):
     avatar = UserAvatarField()
+    is_online = serializers.SerializerMethodField()
+
+    presence_user_fields = ("pk",)
 
     class Meta:
         model = User
         fields = "id", "username", "avatar", "is_online"
+        list_serializer_class = PresenceListSerializer
+
+    def get_is_online(self, instance: User) -> bool:
+        presence = self.context.get("presence", {})
+        if instance.pk not in presence:
+            presence[instance.pk] = is_user_online(instance.pk)
+        return presence[instance.pk]
 
 
 class UserCustomSerializer(serializers.ModelSerializer):
@@ -77,6 +106,7 @@ class UserDetailSerializer(serializers.ModelSerializer):
             "is_2fa_enabled",
             "is_private",
             "comments_private_status",
+            "is_notifications_digest",
         )
         extra_kwargs = {
             "password": {"write_only": True},
@@ -85,6 +115,7 @@ class UserDetailSerializer(serializers.ModelSerializer):
             "timezone": {"required": False},
             "is_private": {"required": False},
             "comments_private_status": {"required": False},
+            "is_notifications_digest": {"required": False},
         }
 
     def validate_timezone(self, value):
@@ -101,6 +132,7 @@ class UserDetailSerializer(serializers.ModelSerializer):
             avatar=validated_data.get("avatar", settings.DEFAULT_USER_AVATAR_PATH),
             timezone=validated_data.get("timezone", settings.DEFAULT_USER_TIMEZONE),
             is_private=validated_data.get("is_private", False),
+            is_notifications_digest=validated_data.get("is_notifications_digest", False),
         )
         user.set_password(validated_data["password"])
         user.save()
@@ -120,6 +152,9 @@ class UserDetailSerializer(serializers.ModelSerializer):
         instance.comments_private_status = validated_data.get(
             "comments_private_status", instance.comments_private_status
         )
+        instance.is_notifications_digest = validated_data.get(
+            "is_notifications_digest", instance.is_notifications_digest
+        )
 
         if not validated_data.get("email") or len(validated_data.get("email")) == 0:
             instance.email = email_before_update
@@ -154,39 +189,38 @@ class FollowingCreateSerializer(serializers.ModelSerializer):
         model = Follow
         fields = "id", "following"
 
-    def create(self, validated_data):
-        follower = validated_data["follower"]
-        following = validated_data["following"]
-
-        filter = Follow.objects.filter(follower=follower, following=following)  # noqa
+    def create(self, validated_data: dict) -> Follow:
+        return create_or_get(Follow(**validated_data), ("follower", "following"))
 
-        if not filter.exists():
-            return Follow.objects.create(follower=follower, following=following)  # noqa
-        return filter.first()
 
-
-class FollowerSerializer(serializers.ModelSerializer):
+class FollowerSerializer(PresenceSerializerMixin, serializers.ModelSerializer):
     follower = UserDefaultSerializer()
     posts_count = serializers.IntegerField()
     is_followed = serializers.BooleanField()
     followers_count = serializers.IntegerField()
     followings_count = serializers.IntegerField()
 
+    presence_user_fields = ("follower_id",)
+
     class Meta:
         model = Follow
         fields = "id", "follower", "posts_count", "is_followed", "followers_count", "followings_count"
+        list_serializer_class = PresenceListSerializer
 
 
-class FollowingSerializer(serializers.ModelSerializer):
+class FollowingSerializer(PresenceSerializerMixin, serializers.ModelSerializer):
     following = UserDefaultSerializer()
     posts_count = serializers.IntegerField()
     is_followed = serializers.BooleanField()
     followers_count = serializers.IntegerField()
     followings_count = serializers.IntegerField()
 
+    presence_user_fields = ("following_id",)
+
     class Meta:
         model = Follow
         fields = "id", "following", "posts_count", "is_followed", "followers_count", "followings_count"
+        list_serializer_class = PresenceListSerializer
 
 
 class TokenSerializer(serializers.Serializer):
@@ -76,3 +76,19 @@ def annotate_follows_queryset(
     queryset = queryset.annotate(**annotate)
 
     return queryset.order_by("-followers_count")
+
+
+def get_presence_visible_users(viewer_id: int, user_ids: typing.Iterable[int]) -> typing.Set[int]:
+    """Returns users whose presence the viewer may see: public accounts, followed ones and chat companions."""
+
+    from messenger.models import ChatMember
+
+    followed = Follow.objects.filter(follower_id=viewer_id, following_id=OuterRef("pk"))  # noqa
+    companion = ChatMember.objects.filter(  # noqa
+        user_id=OuterRef("pk"), chat__is_delete=False, chat__memberships__user_id=viewer_id
+    )
+    return set(
+        User.objects.filter(pk__in=user_ids)  # noqa
+        .filter(Q(is_private=False) | Exists(followed) | Exists(companion))
+        .values_list("pk", flat=True)
+    )